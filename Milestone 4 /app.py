@@ -1,7 +1,6 @@
 # app.py
-import os, sqlite3, json, atexit, time, csv, io
+import os, sqlite3, json, atexit, time, csv, tempfile, zlib
 from datetime import timedelta, datetime
-from collections import deque
 from functools import wraps
 
 import cv2
@@ -9,20 +8,29 @@ import numpy as np
 from dotenv import load_dotenv
 from flask import (
     Flask, g, request, render_template, redirect, url_for,
-    jsonify, make_response, abort, Response, send_file
+    jsonify, make_response, abort, Response, send_file, stream_with_context
 )
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity,
+    JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity,
     set_access_cookies, unset_jwt_cookies
 )
+from markupsafe import escape
 
-from services.video_stream import VideoStream
+from services.audit_log import AuditLog
+from services.log_archive import LogArchiver
+from services.db import QueueFull, SQLitePool
 from services.detector import Detector, unique_ids_in_zone
-
-# ---------------- YOLO Detector ----------------
-detector = Detector("yolov8n.pt", conf=0.50)
-detector.load()
+from services.downsample import lttb
+from services.pipeline import LivePipeline
+from services.ipc import HAS_UNIX_SOCKETS, RemotePipeline
+from services.live_hub import SnapshotTicker
+from services.log_search import ensure_log_indexes, prefix_needed, search_logs
+from services.login_guard import HashPool, HashPoolBusy, LoginThrottle
+from services.metrics_store import MetricsStore
+from services.report_jobs import ReportJobs
+from services.user_cache import UserCache
+from services.video_jobs import VideoJobs
+from services.zones import normalize_points, zones_from_rows, load_zones
 
 # -------------------- App setup --------------------
 load_dotenv()
@@ -45,21 +53,56 @@ REPORT_DIR = os.path.join(UPLOAD_DIR, "reports")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(REPORT_DIR, exist_ok=True)
 
-# --------- in-memory metrics buffer for exports ----------
-METRICS = deque(maxlen=6*60*6)  # ~3 hours if 1 point/sec
+# ---------------- Live pipeline (source + YOLO + counters + metrics) ----------------
+# INFERENCE_SOCKET set -> thin web tier: everything lives in inference_service.py
+#                         and is read over a Unix socket (safe with many workers).
+# otherwise            -> same pipeline in-process (single worker, `python app.py`).
+# Model load + warm-up happen on a background thread (see /readyz).
+# DETECTOR_AUTOLOAD=0 defers it until the first endpoint that needs it.
+# 1 Hz samples are persisted to metric_samples by whichever process samples;
+# exports read them back from SQLite, so history survives restarts.
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "").strip()
+if INFERENCE_SOCKET and not HAS_UNIX_SOCKETS:
+    INFERENCE_SOCKET = ""  # no AF_UNIX (Windows): run the pipeline in-process
+metrics_store = MetricsStore(DB_PATH, raw_retain_days=int(os.getenv("METRICS_RAW_RETENTION_DAYS", "30")))
+if INFERENCE_SOCKET:
+    pipeline = RemotePipeline(INFERENCE_SOCKET)
+else:
+    metrics_store.start_writer()
+    pipeline = LivePipeline(
+        Detector("yolov8n.pt", conf=0.50),
+        lambda: load_zones(DB_PATH),
+        warmup_runs=int(os.getenv("DETECTOR_WARMUP_RUNS", "2")),
+        on_sample=metrics_store.append,
+    )
+    if os.getenv("DETECTOR_AUTOLOAD", "1") == "1":
+        pipeline.start()
+
+def _detector_ready() -> bool:
+    """True when the model is usable; otherwise make sure the pipeline/warm-up is running."""
+    pipeline.start()
+    return pipeline.ensure_ready()
+
+def _warming_up():
+    resp = jsonify({"ok": False, "status": "warming_up", "message": "Model warming up, retry shortly"})
+    resp.headers["Retry-After"] = "2"
+    return resp, 503
 
 # -------------------- DB helpers --------------------
+# Long-lived connections (WAL, synchronous=NORMAL, mmap, page cache) handed to
+# one app context at a time; see services/db.py.
+db_pool = SQLitePool(DB_PATH, size=int(os.getenv("DB_POOL_SIZE", "16")))
+
 def get_db():
     if "db" not in g:
-        g.db = sqlite3.connect(DB_PATH, check_same_thread=False)
-        g.db.row_factory = sqlite3.Row
+        g.db = db_pool.acquire()
     return g.db
 
 @app.teardown_appcontext
 def close_db(_exc):
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        db_pool.release(db)
 
 def init_db():
     db = get_db()
@@ -113,44 +156,93 @@ def init_db():
             kind TEXT NOT NULL,               -- csv|pdf
             path TEXT NOT NULL,
             note TEXT,
+            zones TEXT,                       -- sorted zone set ('' = all)
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
     """)
+    # migrations for databases created before a column existed
+    if "zones" not in {r["name"] for r in db.execute("PRAGMA table_info(reports)")}:
+        db.execute("ALTER TABLE reports ADD COLUMN zones TEXT")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_reports_window ON reports(kind, ts_from, ts_to)")
+    global LOGS_FTS
+    LOGS_FTS = ensure_log_indexes(db)
     # defaults
     if not db.execute("SELECT 1 FROM settings WHERE key='alert_threshold'").fetchone():
         db.execute("INSERT INTO settings(key,value) VALUES('alert_threshold','20')")
     db.commit()
 
+LOGS_FTS = False  # set by init_db when SQLite has FTS5
 with app.app_context():
     init_db()
 
 # -------------------- Logging helper --------------------
+# Events are queued and inserted in batches by a background thread
+# (services/audit_log.py); cleanup() flushes them at exit.
+audit = AuditLog(DB_PATH).start()
+
+# Rows older than LOG_RETENTION_DAYS go to uploads/log_archive/logs-<day>.ndjson.gz
+# (services/log_archive.py); /api/logs searches them for older date ranges.
+LOG_ARCHIVE_DIR = os.path.join(UPLOAD_DIR, "log_archive")
+log_archiver = LogArchiver(DB_PATH, LOG_ARCHIVE_DIR, retain_days=int(os.getenv("LOG_RETENTION_DAYS", "30")))
+if log_archiver.retain_days > 0:
+    log_archiver.start()
+
 def log_event(level: str, action: str, meta: dict | None = None):
-    """Write an event to logs table. Safe/no-throw."""
+    """Queue an event for the logs table. Safe/no-throw, never waits on the DB."""
     try:
         actor = get_jwt_identity()
     except Exception:
         actor = None
     try:
-        db = get_db()
-        db.execute(
-            "INSERT INTO logs(level,actor_email,action,meta_json) VALUES(?,?,?,?)",
-            (str(level).upper(), actor, action, json.dumps(meta or {}))
-        )
-        db.commit()
+        audit.log(level, action, meta, actor=actor)
     except Exception:
         pass
 
 # -------------------- Auth helpers --------------------
+# Access tokens carry uid/role claims. The row behind them comes from a TTL/LRU
+# cache keyed by uid (services/user_cache.py): auth checks skip SQLite, and a
+# role change or deleted account still applies within USER_CACHE_TTL seconds
+# (immediately in the process that made the change).
+def _load_user(uid):
+    row = get_db().execute("SELECT id, name, email, role FROM users WHERE id = ?", (uid,)).fetchone()
+    return dict(row) if row else None
+
+user_cache = UserCache(_load_user, ttl=float(os.getenv("USER_CACHE_TTL", "30")))
+
+# Password hashing runs on a small low-priority pool (services/login_guard.py) so
+# a login burst can't take the CPU from /video and SSE; logins and sign-ups are
+# throttled per IP/email with growing lockouts after repeated failures.
+hashes = HashPool(workers=int(os.getenv("HASH_WORKERS", "1")),
+                  max_pending=int(os.getenv("HASH_MAX_PENDING", "8")))
+login_throttle = LoginThrottle(burst=10, rate=10 / 60)
+register_throttle = LoginThrottle(burst=5, rate=1 / 60)
+
+def _retry_later(seconds, message="Too many attempts, try again later", status=429):
+    resp = jsonify({"ok": False, "message": message, "retry_after": seconds})
+    resp.headers["Retry-After"] = str(seconds)
+    return resp, status
+
+def _token_claims(u) -> dict:
+    return {"uid": u["id"], "role": u["role"]}
+
 def current_user():
+    """The signed-in user's row (dict) or None; looked up once per request."""
+    if "current_user" in g:
+        return g.current_user
     email = get_jwt_identity()
+    uid = get_jwt().get("uid")
     if not email:
-        return None
-    db = get_db()
-    return db.execute(
-        "SELECT id, name, email, role FROM users WHERE email = ?",
-        (email,)
-    ).fetchone()
+        u = None
+    elif uid is not None:
+        u = user_cache.get(uid)
+        if u and u["email"] != email:
+            u = None  # token for an account whose id now belongs to someone else
+    else:
+        # token issued before the uid claim existed
+        row = get_db().execute("SELECT id, name, email, role FROM users WHERE email = ?", (email,)).fetchone()
+        u = dict(row) if row else None
+    g.current_user = u
+    return u
 
 def role_required(*roles):
     def wrapper(fn):
@@ -182,6 +274,20 @@ def _exp(_, __):
     if request.path.startswith("/api/"): return jsonify({"ok": False,"message":"Token expired"}),401
     return redirect(url_for("login_page"))
 
+# -------------------- Health --------------------
+@app.get("/healthz")
+def healthz():
+    # liveness: the web process is up (model may still be loading)
+    return jsonify({"ok": True, "audit_log": audit.stats(), "log_archive": log_archiver.stats(),
+                    "user_cache": user_cache.stats(), "login": {**hashes.stats(), **login_throttle.stats()}})
+
+@app.get("/readyz")
+def readyz():
+    # readiness: model loaded + warmed up
+    st = pipeline.status()
+    ready = st["state"] == "ready"
+    return jsonify({"ok": ready, "detector": st}), (200 if ready else 503)
+
 # -------------------- Pages --------------------
 @app.get("/")
 def home(): return redirect(url_for("login_page"))
@@ -229,30 +335,63 @@ def api_register():
 
     if not name or not email or not pw:
         return jsonify({"ok": False,"message":"All fields required"}),400
+    wait = register_throttle.hit("ip:" + (request.remote_addr or "-"))
+    if wait:
+        return _retry_later(wait)
+    try:
+        pwhash = hashes.generate(pw)
+    except HashPoolBusy:
+        return _retry_later(1, "Server busy, try again", 503)
 
     db = get_db()
     role = "admin" if db.execute("SELECT COUNT(*) AS c FROM users").fetchone()["c"]==0 else "viewer"
     try:
         db.execute("INSERT INTO users(name,email,password_hash,role) VALUES(?,?,?,?)",
-                   (name,email,generate_password_hash(pw),role)); db.commit()
+                   (name,email,pwhash,role)); db.commit()
     except sqlite3.IntegrityError:
         return jsonify({"ok": False,"message":"Email exists"}),409
 
     log_event("INFO", "user_register", {"email": email, "role": role})
     return jsonify({"ok": True,"message":"Registered"}),201
 
+@app.put("/api/users/<int:uid>/role")
+@role_required("admin")
+def api_user_role(uid):
+    role = (request.get_json() or {}).get("role")
+    if role not in ("admin", "viewer"):
+        return jsonify({"ok": False, "message": "role must be admin or viewer"}), 400
+    db = get_db()
+    cur = db.execute("UPDATE users SET role=? WHERE id=?", (role, uid)); db.commit()
+    if not cur.rowcount:
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    user_cache.invalidate(uid)
+    log_event("INFO", "user_role_change", {"id": uid, "role": role})
+    return jsonify({"ok": True})
+
 @app.post("/api/login")
 def api_login():
     data = request.get_json() or {}
     email = data.get("email",""); pw = data.get("password","")
 
+    ip_key, email_key = "ip:" + (request.remote_addr or "-"), "email:" + email.strip().lower()
+    wait = login_throttle.hit(ip_key, email_key)
+    if wait:
+        log_event("WARN", "login_throttled", {"email": email, "retry_after": wait})
+        return _retry_later(wait)
+
     db = get_db()
     u = db.execute("SELECT * FROM users WHERE email=?", (email,)).fetchone()
-    if not u or not check_password_hash(u["password_hash"],pw):
+    try:
+        ok = u is not None and hashes.check(u["password_hash"], pw)
+    except HashPoolBusy:
+        return _retry_later(1, "Server busy, try again", 503)
+    if not ok:
+        login_throttle.failure(ip_key, email_key)
         log_event("WARN", "login_failed", {"email": email})
         return jsonify({"ok":False,"message":"Invalid"}),401
+    login_throttle.success(email_key)  # not the IP: one good account mustn't reset a spray
 
-    token = create_access_token(identity=email)
+    token = create_access_token(identity=email, additional_claims=_token_claims(u))
     resp = make_response(jsonify({"ok":True,"message":"Logged in"}))
     set_access_cookies(resp,token)
     log_event("INFO", "login_success", {"email": email})
@@ -281,44 +420,27 @@ def api_me():
     })
 
 # ---------------- STREAM CONTROL ----------------
-_stream = None
-_source_mode = "none"
-_still_frame = None
-_source_path = None
-
-def stop_stream():
-    global _stream
-    if _stream:
-        try: _stream.stop()
-        except: pass
-        _stream = None
+# The source itself lives in the pipeline (in-process or inference service).
 
 @app.post("/api/camera/start")
 @jwt_required(locations=["cookies"])
 def start_cam():
-    global _stream,_source_mode,_still_frame,_source_path
-    stop_stream()
-    _still_frame = None
     cam = os.getenv("CAMERA_INDEX","0")
     src = int(cam) if cam.isdigit() else cam
-    _stream = VideoStream(src).start()
-    _source_mode = "webcam"; _source_path=None
+    pipeline.start_source(src, "webcam")
     log_event("INFO", "camera_start", {"source": src})
     return jsonify({"ok":True})
 
 @app.post("/api/camera/stop")
 @jwt_required(locations=["cookies"])
 def stop_cam():
-    global _source_mode,_still_frame,_source_path
-    stop_stream()
-    _still_frame=None; _source_mode="none"; _source_path=None
+    pipeline.stop_source()
     log_event("INFO", "camera_stop", {})
     return jsonify({"ok":True})
 
 @app.post("/api/upload/video")
 @jwt_required(locations=["cookies"])
 def upload_video():
-    global _stream,_still_frame,_source_mode,_source_path
     if "file" not in request.files: 
         return jsonify({"ok":False,"message":"file missing"}),400
     f = request.files["file"]
@@ -328,16 +450,13 @@ def upload_video():
         return jsonify({"ok":False,"message":"unsupported"}),400
     path = os.path.join(UPLOAD_DIR, f"vid_%s" % fname)
     f.save(path)
-    stop_stream()
-    _still_frame=None; _stream = VideoStream(path).start()
-    _source_mode="video"; _source_path=path
+    pipeline.start_source(path, "video", path)
     log_event("INFO", "upload_video", {"file": fname, "path": path})
     return jsonify({"ok":True})
 
 @app.post("/api/upload/image")
 @jwt_required(locations=["cookies"])
 def upload_image():
-    global _stream,_still_frame,_source_mode,_source_path
     if "file" not in request.files: 
         return jsonify({"ok":False,"message":"file missing"}),400
     data = request.files["file"].read()
@@ -345,130 +464,52 @@ def upload_image():
     im = cv2.imdecode(arr, cv2.IMREAD_COLOR)
     if im is None: 
         return jsonify({"ok":False,"message":"bad image"}),400
-    stop_stream()
-    _still_frame=im; _source_mode="image"; _source_path=None
+    pipeline.set_image(im)
     log_event("INFO", "upload_image", {"bytes": len(data)})
     return jsonify({"ok":True})
 
 # ---------------- ZONES HELPERS ----------------
-# --- add these helpers near your other utils ---
-def _normalize_points(pts_raw):
-    """Return list of {'x':int,'y':int} from either [{'x','y'}] or [[x,y]]."""
-    out = []
-    if not isinstance(pts_raw, list):
-        return out
-    for p in pts_raw:
-        if isinstance(p, dict) and 'x' in p and 'y' in p:
-            try:
-                out.append({'x': int(p['x']), 'y': int(p['y'])})
-            except:
-                pass
-        elif isinstance(p, (list, tuple)) and len(p) >= 2:
-            try:
-                out.append({'x': int(p[0]), 'y': int(p[1])})
-            except:
-                pass
-    return out
+_normalize_points = normalize_points
 
 def _zones_from_db():
     rows = get_db().execute("SELECT id,name,points FROM zones ORDER BY id").fetchall()
-    zones = []
-    for r in rows:
-        try:
-            raw = json.loads(r["points"])
-        except:
-            raw = []
-        zones.append({
-            "id": r["id"],
-            "name": r["name"],
-            "points": _normalize_points(raw)  # << always {x,y}
-        })
-    return zones
-
-# for line-cross logic
-_prev_centroids = {}
-_line_counts    = {}
-
-def _is_line_zone(z): return isinstance(z.get("points"), list) and len(z["points"]) == 2
-def _sign(a, b, p):
-    (x1,y1),(x2,y2) = a,b
-    (x,y) = p
-    return (x2-x1)*(y-y1) - (y2-y1)*(x-x1)
-
-# ---------------- LIVE STREAM (draw + count + fill METRICS) ----------------
-def mjpeg_generator():
-    blank = np.zeros((480,640,3),dtype=np.uint8)
-    global _prev_centroids
-
-    last_push = time.time()
+    return zones_from_rows(rows)
+
+# ---------------- LIVE STREAM (read-only view of the pipeline) ----------------
+def mjpeg_generator(raw: bool = False):
+    """
+    raw=False: boxes/IDs are drawn into the JPEG (legacy).
+    raw=True:  clean frames; boxes ride along in /api/live for the client canvas.
+    Detection, line counting and metrics happen in the pipeline loop, not here.
+    """
+    seq = 0
     while True:
-        frame=None
-        if _stream:
-            try: frame=_stream.read()
-            except: frame=None
-
-        if frame is None:
-            frame = _still_frame.copy() if _still_frame is not None else blank.copy()
-            if _still_frame is None:
-                cv2.putText(frame,"No source. Start camera or upload video/image.",
-                            (22,240),cv2.FONT_HERSHEY_SIMPLEX,0.55,(255,255,255),2)
-
+        _detector_ready()
         try:
-            frame = detector.process(frame)
-        except:
-            pass
-
-        # line-crossing update
-        try:
-            tracks = detector.get_tracks()
-            now_centroids = {}
-            for x1,y1,x2,y2,tid,conf in tracks:
-                cx = int((x1+x2)/2); cy = int((y1+y2)/2)
-                now_centroids[tid] = (cx, cy)
-
-            zones = _zones_from_db()
-            for z in zones:
-                if _is_line_zone(z):
-                    _line_counts.setdefault(z["id"], 0)
-            for z in zones:
-                if not _is_line_zone(z): 
-                    continue
-                a = (int(z["points"][0]["x"]), int(z["points"][0]["y"]))
-                b = (int(z["points"][1]["x"]), int(z["points"][1]["y"]))
-                for tid, now_c in now_centroids.items():
-                    prev_c = _prev_centroids.get(tid)
-                    if prev_c is None: continue
-                    s1 = _sign(a,b,prev_c)
-                    s2 = _sign(a,b,now_c)
-                    if s1 * s2 < 0:
-                        _line_counts[z["id"]] += 1
-            _prev_centroids = now_centroids
-        except:
-            pass
-
-        # push to METRICS once per second
-        try:
-            if time.time() - last_push >= 1.0:
-                snap = _current_live_snapshot()
-                METRICS.append(snap)
-                last_push = time.time()
-        except:
-            pass
-
-        ok,buf=cv2.imencode(".jpg",frame)
-        if not ok:
-            time.sleep(0.01); continue
-        yield(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"+buf.tobytes()+b"\r\n")
-        time.sleep(0.01)
+            seq, jpeg = pipeline.wait_frame(seq, raw=raw, timeout=1.0)
+        except Exception:
+            jpeg = None
+        if not jpeg:
+            time.sleep(0.1); continue
+        yield(b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"+jpeg+b"\r\n")
 
 @app.get("/video")
 @jwt_required(locations=["cookies"])
-def video(): 
-    return Response(mjpeg_generator(), mimetype="multipart/x-mixed-replace; boundary=frame")
+def video():
+    # ?raw=1 -> un-annotated frames (dashboard draws boxes from SSE)
+    raw = request.args.get("raw", "0") in ("1", "true", "yes")
+    return Response(mjpeg_generator(raw=raw), mimetype="multipart/x-mixed-replace; boundary=frame")
 
 @atexit.register
 def cleanup(): 
-    stop_stream()
+    pipeline.stop()
+    metrics_store.stop()  # flush buffered samples
+    report_jobs.shutdown()
+    audit.stop()          # flush queued log events
+    video_jobs.stop()
+    hashes.shutdown()
+    log_archiver.stop()
+    db_pool.close_all()
 
 # ---------------- ZONES API (CRUD) ----------------
 def valid_points(pts):
@@ -492,6 +533,7 @@ def zone_create():
         return jsonify({"ok": False, "message": "Invalid zone"}), 400
     get_db().execute("INSERT INTO zones(name,points) VALUES(?,?)", (name, json.dumps(pts)))
     get_db().commit()
+    pipeline.invalidate_zones()
     log_event("INFO", "zone_create", {"name": name, "points_len": len(pts)})
     return jsonify({"ok": True})
 
@@ -510,6 +552,7 @@ def zone_update(id):
 
     db.execute("UPDATE zones SET name=?, points=? WHERE id=?", (name, json.dumps(pts), id))
     db.commit()
+    pipeline.invalidate_zones()
     log_event("INFO", "zone_update", {"id": id, "name": name, "points_len": len(pts)})
     return jsonify({"ok": True})
 
@@ -520,6 +563,7 @@ def zone_delete(id):
     if not db.execute("SELECT id FROM zones WHERE id=?",(id,)).fetchone():
         return jsonify({"ok":False,"message":"Not found"}),404
     db.execute("DELETE FROM zones WHERE id=?", (id,)); db.commit()
+    pipeline.invalidate_zones()
     log_event("INFO", "zone_delete", {"id": id})
     return jsonify({"ok":True})
 
@@ -527,6 +571,8 @@ def zone_delete(id):
 @app.post("/api/count/image")
 @jwt_required(locations=["cookies"])
 def count_image_api():
+    if not _detector_ready():
+        return _warming_up()
     if "file" not in request.files:
         return jsonify({"ok": False, "message": "file missing"}), 400
     raw = request.files["file"].read()
@@ -535,8 +581,7 @@ def count_image_api():
     if img is None:
         return jsonify({"ok": False, "message": "bad image"}), 400
 
-    _ = detector.process(img.copy())
-    tracks = detector.get_tracks()
+    tracks = pipeline.detect_image(img)
 
     zones = _zones_from_db()
     per_zone = {}
@@ -552,9 +597,47 @@ def count_image_api():
     log_event("INFO", "count_image", {"total": report["total"]})
     return jsonify(report)
 
+# Uploaded videos are counted as jobs (services/video_jobs.py) on their own
+# detector, never the live one. In-process mode runs the worker here; with
+# INFERENCE_SOCKET, inference_service.py claims the jobs from SQLite (and can
+# split long videos over processes, VIDEO_SEGMENTS; this module is too heavy
+# to re-import in spawned children, so in-process jobs stay sequential).
+def _video_done(job):
+    res = job.get("result") or {}
+    log_event("INFO" if job["state"] == "done" else "WARN", "count_video",
+              {"id": job["id"], "state": job["state"], "frames": job["frames_done"],
+               "total": res.get("total"), "path": res.get("path"), "error": job["error"]})
+
+video_jobs = VideoJobs(DB_PATH, lambda: Detector("yolov8n.pt", conf=0.50), on_done=_video_done,
+                       max_pending=int(os.getenv("VIDEO_JOBS_MAX_PENDING", "8")))
+if not INFERENCE_SOCKET:
+    video_jobs.start()
+
+def _video_job_json(job):
+    job = dict(job)
+    job["status_url"] = url_for("count_video_job", job_id=job["id"])
+    job["cancel_url"] = url_for("count_video_cancel", job_id=job["id"])
+    job["stream_url"] = url_for("count_video_stream", job_id=job["id"])
+    return job
+
+def _video_ndjson(job_id):
+    """One JSON object per line as the job runs: progress, each finished second, then the result."""
+    def gen():
+        for ev in video_jobs.events(job_id):
+            yield json.dumps(ev) + "\n"
+    resp = Response(gen(), mimetype="application/x-ndjson")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # let a proxy pass lines through as they come
+    return resp
+
 @app.post("/api/count/video")
 @jwt_required(locations=["cookies"])
 def count_video_api():
+    """
+    Save the upload and queue it; 202 + job. Poll status_url for progress
+    and (partial) result, or read stream_url. ?stream=1 answers with that
+    NDJSON stream directly.
+    """
     if "file" not in request.files:
         return jsonify({"ok": False, "message": "file missing"}), 400
     f = request.files["file"]
@@ -562,52 +645,141 @@ def count_video_api():
     ext = os.path.splitext(fname)[1].lower()
     if ext not in [".mp4",".avi",".mkv",".mov"]:
         return jsonify({"ok": False, "message": "unsupported video"}), 400
-    path = os.path.join(UPLOAD_DIR, f"count_{fname}")
+    # unique name: a second upload of the same file must not overwrite one being counted
+    path = os.path.join(UPLOAD_DIR, f"count_{int(time.time())}_{os.urandom(3).hex()}_{fname}")
     f.save(path)
 
-    cap = cv2.VideoCapture(path)
-    if not cap.isOpened():
-        return jsonify({"ok": False, "message": "cannot open video"}), 400
-
-    zones = _zones_from_db()
-    last_tracks = []
-
-    while True:
-        ok, frame = cap.read()
-        if not ok: break
-        _ = detector.process(frame)
-        last_tracks = detector.get_tracks()
-    cap.release()
+    try:
+        job = video_jobs.submit(path, _zones_from_db())
+    except QueueFull:
+        os.remove(path)
+        return _retry_later(10, "Too many videos in progress, retry shortly")
+    log_event("INFO", "count_video_submit", {"id": job["id"], "file": fname})
+    if request.args.get("stream", "0") in ("1", "true", "yes"):
+        resp = _video_ndjson(job["id"])
+        resp.headers["Location"] = url_for("count_video_job", job_id=job["id"])
+        return resp
+    resp = jsonify({"ok": True, "job": _video_job_json(job)})
+    resp.headers["Location"] = url_for("count_video_job", job_id=job["id"])
+    return resp, 202
+
+@app.get("/api/count/video/jobs/<job_id>")
+@jwt_required(locations=["cookies"])
+def count_video_job(job_id):
+    """state, frames_done/frames_total, progress, fps, eta_s, result (partial while running)."""
+    job = video_jobs.get(job_id)
+    if not job:
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    return jsonify({"ok": True, "job": _video_job_json(job)})
 
-    per_zone = {z["name"]: 0 for z in zones}
-    for z in zones:
-        per_zone[z["name"]] = unique_ids_in_zone(z["points"], last_tracks)
+@app.get("/api/count/video/jobs/<job_id>/stream")
+@jwt_required(locations=["cookies"])
+def count_video_stream(job_id):
+    if not video_jobs.get(job_id):
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    return _video_ndjson(job_id)
 
-    report = {
-        "mode": "video",
-        "path": path,
-        "total": len(last_tracks),
-        "per_zone": per_zone,
-        "tracks": [{"id": t[4], "bbox": [t[0],t[1],t[2],t[3]]} for t in last_tracks]
-    }
-    log_event("INFO", "count_video", {"total": report["total"], "file": fname})
-    return jsonify(report)
+@app.post("/api/count/video/jobs/<job_id>/cancel")
+@jwt_required(locations=["cookies"])
+def count_video_cancel(job_id):
+    job = video_jobs.cancel(job_id)
+    if not job:
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    log_event("INFO", "count_video_cancel", {"id": job_id, "state": job["state"]})
+    return jsonify({"ok": True, "job": _video_job_json(job)})
 
 @app.get("/api/count/live")
 @jwt_required(locations=["cookies"])
 def live_counts():
-    tracks = detector.get_tracks()
-    zones = _zones_from_db()
+    return jsonify(pipeline.live_counts())
 
-    per_zone = {}
-    for z in zones:
-        if len(z["points"]) >= 3:
-            per_zone[z["name"]] = unique_ids_in_zone(z["points"], tracks)
-        else:
-            per_zone[z["name"]] = _line_counts.get(z["id"], 0)
+@app.get("/api/heatmap")
+@jwt_required(locations=["cookies"])
+def api_heatmap():
+    """
+    Decayed occupancy heatmap of the live camera.
+      ?window=60|900|3600  seconds (nearest kept window >= requested)
+      ?format=png (colorized, transparent where empty) | u8 (raw grid, row-major)
+    """
+    try:
+        window = int(request.args.get("window") or 900)
+    except ValueError:
+        return jsonify({"ok": False, "message": "window must be an integer"}), 400
+    if not 1 <= window <= 24*3600:
+        return jsonify({"ok": False, "message": "window must be 1..86400 seconds"}), 400
+    fmt = (request.args.get("format") or "png").lower()
+    if fmt == "u8":
+        w, h, raw, peak = pipeline.heatmap_u8(window)
+        resp = make_response(raw)
+        resp.headers["Content-Type"] = "application/octet-stream"
+        resp.headers["X-Grid-Width"] = str(w)
+        resp.headers["X-Grid-Height"] = str(h)
+        resp.headers["X-Peak-Person-Seconds"] = f"{peak:.3f}"
+    else:
+        resp = make_response(pipeline.heatmap_png(window))
+        resp.headers["Content-Type"] = "image/png"
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
 
-    stats = { "total": len(tracks), "per_zone": per_zone, "source": _source_mode }
-    return jsonify(stats)
+@app.get("/api/history")
+@jwt_required(locations=["cookies"])
+def api_history():
+    """
+    Counts history from the persisted store.
+      ?from=&to=  epoch seconds (default: last hour)
+      ?step=      bucket seconds (default/minimum: window / 2000)
+      ?zone=      zone name (default: total people)
+    Each point: t (bucket start), n, min, max, avg, last.
+    gaps: [{from, to, reason}] where nothing was counted (no source, stale, ...).
+    """
+    try:
+        ts_to = int(request.args.get("to") or time.time())
+        ts_from = int(request.args.get("from") or ts_to - 3600)
+        step = int(request.args.get("step") or 0)
+    except ValueError:
+        return jsonify({"ok": False, "message": "from/to/step must be integers"}), 400
+    if ts_from >= ts_to:
+        return jsonify({"ok": False, "message": "from must be before to"}), 400
+    hist = metrics_store.history(ts_from, ts_to, step, zone=request.args.get("zone") or None)
+    return jsonify({"ok": True, **hist, "gaps": metrics_store.gaps(ts_from, ts_to)})
+
+LTTB_MAX_ROWS = 50_000  # raw (1 s) tier up to this many seconds, rollups beyond
+
+@app.get("/api/history/lttb")
+@jwt_required(locations=["cookies"])
+def api_history_lttb():
+    """
+    Counts history downsampled to ?points= (default 500, max 5000) with LTTB,
+    for charts. ?from=&to= epoch seconds (default: last 2 hours), ?zone=.
+    Returns points as [t, value] pairs. Recent raw windows come from the
+    live pipeline's in-memory ring ("source": "memory"), the rest from
+    the store.
+    """
+    try:
+        ts_to = int(request.args.get("to") or time.time())
+        ts_from = int(request.args.get("from") or ts_to - 2*3600)
+        n_out = min(max(int(request.args.get("points") or 500), 3), 5000)
+    except ValueError:
+        return jsonify({"ok": False, "message": "from/to/points must be integers"}), 400
+    if ts_from >= ts_to:
+        return jsonify({"ok": False, "message": "from must be before to"}), 400
+    zone = request.args.get("zone") or None
+    # a raw-tier window the live ring still covers is read from memory
+    mem = None
+    if ts_to - ts_from <= LTTB_MAX_ROWS:
+        try:
+            mem = pipeline.metrics_series(ts_from, ts_to, zone)
+        except (ConnectionError, OSError):
+            mem = None
+    if mem is not None:
+        (t, v), tier = mem, 1
+    else:
+        t, v, tier = metrics_store.series(ts_from, ts_to, zone=zone, max_rows=LTTB_MAX_ROWS)
+    xs, ys = lttb(t, v, n_out)
+    points = [[int(a), round(float(b), 2)] for a, b in zip(xs, ys)]
+    return jsonify({"ok": True, "from": ts_from, "to": ts_to, "zone": zone, "tier": tier,
+                    "source": "memory" if mem is not None else "store",
+                    "source_points": int(len(t)), "points": points})
 
 # ---------------- Settings (persist alert threshold) ----------------
 @app.get("/api/settings")
@@ -631,38 +803,32 @@ def set_settings():
     return jsonify({"ok": True})
 
 # ---------------- SSE live stream ----------------
-from flask import stream_with_context
-def _current_live_snapshot():
-    tracks = detector.get_tracks()
-    zones = _zones_from_db()
-    total = len(tracks)
+def _current_live_snapshot(with_boxes: bool = False):
+    _detector_ready()
+    return pipeline.snapshot(with_boxes=with_boxes)
 
-    per_zone = {}
-    for z in zones:
-        if len(z["points"]) >= 3:
-            per_zone[z["name"]] = unique_ids_in_zone(z["points"], tracks)
-        else:
-            per_zone[z["name"]] = _line_counts.get(z["id"], 0)
-
-    centers = []
-    st = detector.get_state()
-    fw, fh = max(1, st.frame_w), max(1, st.frame_h)
-    for x1,y1,x2,y2,tid,conf in tracks:
-        cx = (x1 + x2) / 2.0
-        cy = (y1 + y2) / 2.0
-        centers.append({"x": float(cx)/fw, "y": float(cy)/fh})
+# one ticker for the live camera: snapshot + JSON once per tick, shared by all subscribers.
+# Events are deltas with a keyframe every 20 ticks (10 s); ~2 min kept for resume.
+live_ticker = SnapshotTicker(lambda: _current_live_snapshot(with_boxes=True), interval=0.5,
+                             keyframe_every=20, history=240)
 
-    return { "total_people": total, "zones": per_zone, "centers": centers, "timestamp": int(time.time()) }
+def _last_event_id(raw):
+    try:
+        return int(raw) if raw not in (None, "") else None
+    except ValueError:
+        return None
 
 @app.get("/api/live")
 @jwt_required(locations=["cookies"])
 def api_live():
-    @stream_with_context
+    # EventSource resends the last `id:` as Last-Event-ID when it reconnects
+    last_id = _last_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_id"))
+
     def gen():
+        seq, data = live_ticker.catch_up(last_id)
         while True:
-            payload = _current_live_snapshot()
-            yield "data: " + json.dumps(payload, separators=(",",":")) + "\n\n"
-            time.sleep(0.5)
+            yield data or b": waiting\n\n"
+            seq, data = live_ticker.wait_next(seq)
     resp = Response(gen(), mimetype="text/event-stream")
     resp.headers["Cache-Control"] = "no-cache"
     resp.headers["Connection"] = "keep-alive"
@@ -737,57 +903,114 @@ def api_camera_start_by_id():
         return jsonify({"ok": False, "message": "Camera not found"}), 404
     # start stream with RTSP (or fallback to webcam if empty)
     src = row["rtsp_url"] or os.getenv("CAMERA_INDEX", "0")
-    global _stream,_source_mode,_still_frame,_source_path
-    stop_stream()
-    _still_frame = None
-    _stream = VideoStream(src).start()
-    _source_mode = "rtsp" if row["rtsp_url"] else "webcam"
-    _source_path = row["rtsp_url"]
+    pipeline.start_source(src, "rtsp" if row["rtsp_url"] else "webcam", row["rtsp_url"])
     log_event("INFO", "camera_start_by_id", {"id": cam_id, "src": src})
     return jsonify({"ok": True})
 
 @app.post("/api/camera/stop_by_id")
 @role_required("admin")
 def api_camera_stop_by_id():
-    stop_stream()
+    pipeline.stop_source()
     log_event("INFO", "camera_stop_by_id", {})
     return jsonify({"ok": True})
 
+# ---- Keyset pagination ----
+def _page_args(default_limit: int, max_limit: int):
+    """?limit=&before_id=&after_id= -> (limit, before_id, after_id); ValueError on junk."""
+    try:
+        limit = min(max(int(request.args.get("limit") or default_limit), 1), max_limit)
+        before_id = request.args.get("before_id", type=int)
+        after_id = request.args.get("after_id", type=int)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    for k in ("before_id", "after_id"):
+        if request.args.get(k) and request.args.get(k, type=int) is None:
+            raise ValueError(f"{k} must be an integer")
+    if before_id is not None and after_id is not None:
+        raise ValueError("pass before_id or after_id, not both")
+    return limit, before_id, after_id
+
+def _page(rows, limit: int, forward: bool):
+    """
+    rows: up to limit+1 rows in walk order (newest first, or oldest first
+    for after_id). Returns the page newest first with the cursors to
+    continue: next_before_id for older rows (null once exhausted),
+    next_after_id for newer ones (also what a live tail polls with).
+    """
+    items = [dict(r) for r in rows[:limit]]
+    more = len(rows) > limit
+    if forward:
+        items.reverse()
+    return {
+        "ok": True,
+        "items": items,
+        "next_before_id": items[-1]["id"] if items and (more or forward) else None,
+        "next_after_id": items[0]["id"] if items else request.args.get("after_id", type=int),
+        "has_more": more,
+    }
+
 # ---- Logs API (read-only) ----
 @app.get("/api/logs")
 @role_required("admin")
 def api_logs():
+    """
+    Newest first. ?q= ?level= ?from= ?to= filters, ?limit= (max 1000),
+    ?before_id= / ?after_id= keyset cursors (see _page for the response).
+    A ?from= older than the retention window continues into the archives.
+    The response's "match" (exact|prefix) is the text match mode; pass it
+    back as ?match= with the cursors to pin it (it is re-derived otherwise).
+    """
     q = (request.args.get("q") or "").strip()
     level = (request.args.get("level") or "").strip().upper()
     date_from = (request.args.get("from") or "").strip()
     date_to = (request.args.get("to") or "").strip()
-    limit = int(request.args.get("limit", "100"))
-
-    sql = "SELECT id, ts, level, actor_email, action, meta_json FROM logs WHERE 1=1"
-    params = []
-    if level:
-        sql += " AND level=?"; params.append(level)
-    if q:
-        sql += " AND (action LIKE ? OR meta_json LIKE ? OR actor_email LIKE ?)"
-        params += [f"%{q}%", f"%{q}%", f"%{q}%"]
-    if date_from:
-        sql += " AND ts >= ?"; params.append(date_from)
-    if date_to:
-        sql += " AND ts <= ?"; params.append(date_to)
-    sql += " ORDER BY id DESC LIMIT ?"; params.append(limit)
+    try:
+        limit, before_id, after_id = _page_args(100, 1000)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
 
-    rows = get_db().execute(sql, tuple(params)).fetchall()
-    out = [dict(r) for r in rows]
-    return jsonify(out)
+    match = (request.args.get("match") or "").strip().lower()
+    if match not in ("", "exact", "prefix"):
+        return jsonify({"ok": False, "message": "match must be exact or prefix"}), 400
+
+    # q: FTS5 word/prefix search over action, actor and meta (see services/log_search.py);
+    # the mode comes from the query's first page, so it is the same on every page
+    db = get_db()
+    prefix = (match == "prefix") if match else prefix_needed(db, q, level, date_from, date_to,
+                                                               limit + 1, fts=LOGS_FTS)
+    rows = search_logs(db, q, level, date_from, date_to, limit + 1, fts=LOGS_FTS,
+                       before_id=before_id, after_id=after_id, prefix=prefix)
+    if date_from:
+        # archived days are older than every hot row: after them when walking
+        # back, before them when walking forward
+        if after_id is not None:
+            rows = log_archiver.search(db, q, level, date_from, date_to, limit + 1, after_id=after_id) + rows
+        elif len(rows) <= limit:
+            cursor = rows[-1]["id"] if rows else before_id
+            rows = rows + log_archiver.search(db, q, level, date_from, date_to, limit + 1 - len(rows),
+                                              before_id=cursor)
+    page = _page(rows, limit, after_id is not None)
+    page["match"] = "prefix" if prefix else "exact"
+    return jsonify(page)
 
 # ---- Reports API ----
 @app.get("/api/reports")
 @role_required("admin")
 def api_reports_list():
-    rows = get_db().execute(
-        "SELECT id, ts_from, ts_to, kind, path, note, created_at FROM reports ORDER BY id DESC"
-    ).fetchall()
-    return jsonify([dict(r) for r in rows])
+    """Newest first, ?limit= (default 50, max 500), ?before_id= / ?after_id= cursors."""
+    try:
+        limit, before_id, after_id = _page_args(50, 500)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    sql = "SELECT id, ts_from, ts_to, kind, path, note, zones, created_at FROM reports"
+    if after_id is not None:
+        sql += " WHERE id>? ORDER BY id ASC LIMIT ?"; params = (after_id, limit + 1)
+    elif before_id is not None:
+        sql += " WHERE id<? ORDER BY id DESC LIMIT ?"; params = (before_id, limit + 1)
+    else:
+        sql += " ORDER BY id DESC LIMIT ?"; params = (limit + 1,)
+    rows = get_db().execute(sql, params).fetchall()
+    return jsonify(_page(rows, limit, after_id is not None))
 
 @app.get("/api/reports/<int:rid>")
 @role_required("admin")
@@ -817,100 +1040,292 @@ def api_reports_delete(rid):
     return jsonify({"ok": True})
 
 # ---------------- Exports (CSV / PDF) ----------------
-@app.get("/api/export/csv")
-@jwt_required(locations=["cookies"])
-def export_csv():
-    minutes = int(request.args.get("minutes", "15"))
-    cutoff = int(time.time()) - minutes*60
-
-    rows = [m for m in list(METRICS) if m["timestamp"] >= cutoff]
-    zone_names = sorted({n for m in rows for n in (m.get("zones") or {}).keys()})
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["timestamp","time","total"] + zone_names)
+def _export_window(src=None, align: int = 1):
+    """
+    (ts_from, ts_to, note) from from=&to= (epoch secs) or minutes= (default 15).
+    `align` snaps relative windows to a grid so repeated clicks share a key.
+    ValueError (message fit for a 400) on bad input.
+    """
+    src = request.args if src is None else src
+    now = int(time.time())
+    try:
+        if src.get("from"):
+            ts_from = int(src["from"])
+            ts_to = int(src.get("to") or now)
+        else:
+            minutes = int(src.get("minutes") or 15)
+    except (TypeError, ValueError):
+        raise ValueError("from/to/minutes must be integers")
+    if src.get("from"):
+        if ts_from >= ts_to:
+            raise ValueError("from must be before to")
+        fmt = lambda t: datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M")
+        return ts_from, ts_to, f"{fmt(ts_from)} – {fmt(ts_to)}"
+    if minutes <= 0:
+        raise ValueError("minutes must be positive")
+    now -= now % align
+    return now - minutes*60, now, f"Last {minutes} minutes"
+
+class _Echo:
+    # csv.writer target that hands the formatted line straight back
+    def write(self, line):
+        return line
+
+def _csv_chunks(rows, zone_names, flush_bytes=64*1024):
+    """CSV text in ~64 KB chunks, one pass over `rows` (an iterator)."""
+    writer = csv.writer(_Echo())
+    buf = [writer.writerow(["timestamp","time","total"] + zone_names)]
+    size = len(buf[0])
     for m in rows:
         ts = m["timestamp"]
         timestr = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
         z = m.get("zones") or {}
-        writer.writerow([ts, timestr, m.get("total_people",0)] + [ z.get(name,0) for name in zone_names ])
-    csv_data = output.getvalue()
+        line = writer.writerow([ts, timestr, m.get("total_people",0)] + [ z.get(name,0) for name in zone_names ])
+        buf.append(line); size += len(line)
+        if size >= flush_bytes:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
 
-    # persist to /uploads/reports
-    ts_to = int(time.time()); ts_from = ts_to - minutes*60
-    fname = f"crowdcount_{ts_from}_{ts_to}.csv"
-    fpath = os.path.join(REPORT_DIR, fname)
-    with open(fpath, "w", newline="", encoding="utf-8") as fh:
-        fh.write(csv_data)
-
-    db = get_db()
-    db.execute(
-        "INSERT INTO reports(ts_from, ts_to, kind, path, note) VALUES(?,?,?,?,?)",
-        (ts_from, ts_to, "csv", fpath, f"Last {minutes} minutes")
-    )
-    db.commit()
-
-    log_event("INFO", "export_csv", {"minutes": minutes, "rows": len(rows), "path": fpath})
-    return send_file(fpath, as_attachment=True, download_name=fname, mimetype="text/csv")
-
-@app.get("/api/export/pdf")
+@app.get("/api/export/csv")
 @jwt_required(locations=["cookies"])
-def export_pdf():
-    minutes = int(request.args.get("minutes", "15"))
-    cutoff = int(time.time()) - minutes*60
-    rows = [m for m in list(METRICS) if m["timestamp"] >= cutoff]
-    ts_to = int(time.time()); ts_from = ts_to - minutes*60
-    fname = f"crowdcount_{ts_from}_{ts_to}.pdf"
-    fpath = os.path.join(REPORT_DIR, fname)
-
+def export_csv():
+    """
+    Streams the CSV while teeing the same bytes to REPORT_DIR; the report row
+    is recorded once the file is complete. ?gzip=1 -> .csv.gz
+    """
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.pdfgen import canvas as pdfcanvas
-        from reportlab.lib.units import cm
-
-        c = pdfcanvas.Canvas(fpath, pagesize=A4)
-        w, h = A4
-        c.setTitle("CrowdCount Report")
-
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(2*cm, h-2*cm, "CrowdCount – Summary Report")
-
-        c.setFont("Helvetica", 10)
-        c.drawString(2*cm, h-2.8*cm, f"Window: last {minutes} minutes")
-        c.drawString(2*cm, h-3.3*cm, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-
-        totals = [m.get("total_people",0) for m in rows]
-        avg = round(sum(totals)/len(totals),2) if totals else 0
-        peak = max(totals) if totals else 0
-        c.drawString(2*cm, h-4.3*cm, f"Average people: {avg}")
-        c.drawString(2*cm, h-4.8*cm, f"Peak people: {peak}")
-
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(2*cm, h-6*cm, "Time")
-        c.drawString(6*cm, h-6*cm, "Total")
-        y = h-6.5*cm
-        c.setFont("Helvetica", 10)
-        for m in rows[:30]:
-            c.drawString(2*cm, y, datetime.fromtimestamp(m["timestamp"]).strftime("%H:%M:%S"))
-            c.drawString(6*cm, y, str(m.get("total_people",0)))
-            y -= 0.5*cm
-            if y < 2*cm:
-                c.showPage(); y = h-2*cm
-
-        c.showPage(); c.save()
+        ts_from, ts_to, note = _export_window()
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    gz = request.args.get("gzip", "0") in ("1", "true", "yes")
+
+    # header needs every zone up front: read it from the hourly rollup
+    zone_names = metrics_store.zone_names(ts_from, ts_to)
+    ext = ".csv" + (".gz" if gz else "")
+    fname = f"crowdcount_{ts_from}_{ts_to}{ext}"
+    # unique on disk: two exports of the same window must not share a file
+    fpath = os.path.join(REPORT_DIR, f"crowdcount_{ts_from}_{ts_to}_{os.urandom(3).hex()}{ext}")
+
+    def generate():
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31) if gz else None  # wbits=31 -> gzip container
+        nrows = 0
+        def counted():
+            nonlocal nrows
+            for m in metrics_store.iter_query(ts_from, ts_to):
+                nrows += 1
+                yield m
+        fd, tmp = tempfile.mkstemp(dir=REPORT_DIR, prefix=".export_", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for text in _csv_chunks(counted(), zone_names):
+                    data = text.encode("utf-8")
+                    if comp:
+                        data = comp.compress(data)
+                        if not data:
+                            continue
+                    fh.write(data)
+                    yield data
+                if comp:
+                    tail = comp.flush()
+                    fh.write(tail)
+                    yield tail
+            os.replace(tmp, fpath)
+        finally:
+            # client went away mid-stream (GeneratorExit) or the query failed
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
         db = get_db()
         db.execute(
             "INSERT INTO reports(ts_from, ts_to, kind, path, note) VALUES(?,?,?,?,?)",
-            (ts_from, ts_to, "pdf", fpath, f"Last {minutes} minutes")
+            (ts_from, ts_to, "csv", fpath, note)
         )
         db.commit()
+        log_event("INFO", "export_csv", {"from": ts_from, "to": ts_to, "rows": nrows, "path": fpath, "gzip": gz})
+
+    resp = Response(stream_with_context(generate()), mimetype="application/gzip" if gz else "text/csv")
+    resp.headers["Content-Disposition"] = f'attachment; filename="{fname}"'
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def _render_pdf(fpath, ts_from, ts_to, zones, note, progress):
+    """Summary PDF (totals + per-zone avg/peak); runs on a report worker."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas as pdfcanvas
+    from reportlab.lib.units import cm
+
+    expected = max(1, ts_to - ts_from)  # ~1 sample/sec
+    n, tot_sum, tot_peak, first = 0, 0, 0, []
+    zsum, zpeak = {z: 0 for z in zones}, {z: 0 for z in zones}
+    for m in metrics_store.iter_query(ts_from, ts_to):
+        n += 1
+        t = m.get("total_people",0)
+        tot_sum += t; tot_peak = max(tot_peak, t)
+        zc = m.get("zones") or {}
+        for z in zones:
+            v = zc.get(z, 0)
+            zsum[z] += v; zpeak[z] = max(zpeak[z], v)
+        if len(first) < 30:
+            first.append(m)
+        if n % 1000 == 0:
+            progress(n / expected)
+
+    c = pdfcanvas.Canvas(fpath + ".part", pagesize=A4)
+    w, h = A4
+    c.setTitle("CrowdCount Report")
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(2*cm, h-2*cm, "CrowdCount – Summary Report")
+
+    c.setFont("Helvetica", 10)
+    c.drawString(2*cm, h-2.8*cm, f"Window: {note}")
+    c.drawString(2*cm, h-3.3*cm, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    avg = round(tot_sum/n,2) if n else 0
+    c.drawString(2*cm, h-4.3*cm, f"Average people: {avg}")
+    c.drawString(2*cm, h-4.8*cm, f"Peak people: {tot_peak}")
+    y = h-5.3*cm
+    for z in zones:
+        c.drawString(2*cm, y, f"{z}: average {round(zsum[z]/n,2) if n else 0}, peak {zpeak[z]}")
+        y -= 0.5*cm
+
+    y -= 0.7*cm
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(2*cm, y, "Time")
+    c.drawString(6*cm, y, "Total")
+    y -= 0.5*cm
+    c.setFont("Helvetica", 10)
+    for m in first:
+        c.drawString(2*cm, y, datetime.fromtimestamp(m["timestamp"]).strftime("%H:%M:%S"))
+        c.drawString(6*cm, y, str(m.get("total_people",0)))
+        y -= 0.5*cm
+        if y < 2*cm:
+            c.showPage(); y = h-2*cm
+
+    c.showPage(); c.save()
+    os.replace(fpath + ".part", fpath)
+    return n
+
+def _render_csv(fpath, ts_from, ts_to, zones, note, progress):
+    zone_names = zones or metrics_store.zone_names(ts_from, ts_to)
+    expected = max(1, ts_to - ts_from)
+    n = 0
+    def counted():
+        nonlocal n
+        for m in metrics_store.iter_query(ts_from, ts_to):
+            n += 1
+            if n % 1000 == 0:
+                progress(n / expected)
+            yield m
+    with open(fpath + ".part", "w", newline="", encoding="utf-8") as fh:
+        for text in _csv_chunks(counted(), zone_names):
+            fh.write(text)
+    os.replace(fpath + ".part", fpath)
+    return n
+
+def _report_done(job):
+    with app.app_context():
+        level = "INFO" if job["state"] == "done" else "ERROR"
+        log_event(level, f"report_job_{job['state']}", {k: job.get(k) for k in
+                  ("id", "kind", "from", "to", "zones", "report_id", "rows", "path", "error")})
+
+# Bounded pool: at most REPORT_WORKERS renders at once, REPORT_MAX_PENDING queued.
+report_jobs = ReportJobs(
+    DB_PATH, REPORT_DIR,
+    {"pdf": ("pdf", _render_pdf), "csv": ("csv", _render_csv)},
+    max_workers=int(os.getenv("REPORT_WORKERS", "2")),
+    max_pending=int(os.getenv("REPORT_MAX_PENDING", "16")),
+    on_done=_report_done,
+)
 
-        log_event("INFO", "export_pdf", {"minutes": minutes, "rows": len(rows), "path": fpath})
-        return send_file(fpath, as_attachment=True, download_name=fname, mimetype="application/pdf")
-    except Exception as e:
-        log_event("WARN", "export_pdf_failed_fallback_csv", {"minutes": minutes, "error": str(e)})
-        return redirect(url_for("export_csv", minutes=minutes))
+def _job_json(job):
+    job = dict(job)
+    job["status_url"] = url_for("report_job_status", job_id=job["id"])
+    if job["state"] == "done":
+        job["download_url"] = url_for("report_job_download", job_id=job["id"])
+    return job
+
+@app.post("/api/reports/jobs")
+@jwt_required(locations=["cookies"])
+def report_job_submit():
+    """
+    Enqueue a report: JSON or query {kind: pdf|csv, minutes | from,to, zones: [..]}.
+    202 + job when queued; 200 + job (cached) when an identical report exists.
+    """
+    src = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
+    kind = (src.get("kind") or "pdf").lower()
+    zones = src.get("zones") or []
+    if isinstance(zones, str):
+        zones = zones.split(",")
+    try:
+        ts_from, ts_to, note = _export_window(src, align=10)
+        job, created = report_jobs.submit(kind, ts_from, ts_to, zones, note)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    except QueueFull:
+        resp = jsonify({"ok": False, "message": "Too many reports in progress, retry shortly"})
+        resp.headers["Retry-After"] = "5"
+        return resp, 429
+    log_event("INFO", "report_job_submit", {"id": job["id"], "kind": kind, "from": ts_from, "to": ts_to,
+                                            "zones": job["zones"], "created": created})
+    resp = jsonify({"ok": True, "job": _job_json(job)})
+    if created:
+        resp.headers["Location"] = url_for("report_job_status", job_id=job["id"])
+        return resp, 202
+    return resp
+
+@app.get("/api/reports/jobs/<job_id>")
+@jwt_required(locations=["cookies"])
+def report_job_status(job_id):
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    return jsonify({"ok": True, "job": _job_json(job)})
+
+@app.get("/api/reports/jobs/<job_id>/download")
+@jwt_required(locations=["cookies"])
+def report_job_download(job_id):
+    job = report_jobs.get(job_id)
+    if not job or job["state"] != "done":
+        return jsonify({"ok": False, "message": "Not ready"}), 404
+    row = get_db().execute("SELECT path, kind FROM reports WHERE id=?", (job["report_id"],)).fetchone()
+    if not row or not os.path.exists(row["path"]):
+        return jsonify({"ok": False, "message": "Not found"}), 404
+    mimetype = "application/pdf" if row["kind"] == "pdf" else "text/csv"
+    return send_file(row["path"], as_attachment=True, download_name=os.path.basename(row["path"]), mimetype=mimetype)
+
+@app.get("/api/export/pdf")
+@jwt_required(locations=["cookies"])
+def export_pdf():
+    """
+    Kept for old links and bookmarks, which expect the file: queues the PDF
+    like POST /api/reports/jobs, redirects to it once it exists, and until
+    then answers 202 with a page that reloads itself (window pinned with
+    from/to so every reload asks for the same report).
+    """
+    zones = request.args.get("zones") or ""
+    try:
+        ts_from, ts_to, note = _export_window(align=10)
+        job, _created = report_jobs.submit("pdf", ts_from, ts_to, zones.split(","), note)
+    except ValueError as e:
+        return jsonify({"ok": False, "message": str(e)}), 400
+    except QueueFull:
+        return _retry_later(5, "Too many reports in progress, retry shortly")
+    if job["state"] == "done":
+        return redirect(url_for("report_job_download", job_id=job["id"]))
+    if job["state"] == "error":
+        return make_response(f"<!doctype html><title>Report failed</title>"
+                             f"<p>The report could not be generated: {escape(job['error'] or '')}</p>", 500)
+    again = url_for("export_pdf", **{"from": ts_from, "to": ts_to}, **({"zones": zones} if zones else {}))
+    resp = make_response(
+        f'<!doctype html><meta http-equiv="refresh" content="2;url={escape(again)}">'
+        f"<title>Preparing report</title>"
+        f"<p>Preparing the PDF report ({int((job['progress'] or 0) * 100)}%); "
+        f"this page reloads until it is ready.</p>", 202)
+    resp.headers["Retry-After"] = "2"
+    return resp
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+# asgi.py
+"""
+ASGI entry point: long-lived streams on asyncio, everything else on Flask.
+
+/video (MJPEG) and /api/live (SSE) are served by FastAPI coroutines fed by a
+single pump per stream (services/async_fanout.py), so an open dashboard tab
+costs a coroutine instead of pinning a WSGI worker thread. All other routes
+are the unchanged Flask app mounted behind a2wsgi's WSGIMiddleware.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import os
+
+import jwt as pyjwt
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+
+from app import app as flask_app, pipeline, live_ticker, _detector_ready, _last_event_id
+from services.async_fanout import AsyncBroadcaster
+
+app = FastAPI(title="CrowdCount streams", docs_url=None, redoc_url=None, openapi_url=None)
+
+
+# ---------------- Auth (same JWT cookie as Flask) ----------------
+def _cookie_identity(request: Request):
+    """Validate the flask_jwt_extended access cookie; return identity or None."""
+    token = request.cookies.get(flask_app.config.get("JWT_ACCESS_COOKIE_NAME", "access_token_cookie"))
+    if not token:
+        return None
+    try:
+        claims = pyjwt.decode(
+            token,
+            flask_app.config["JWT_SECRET_KEY"],
+            algorithms=[flask_app.config.get("JWT_ALGORITHM", "HS256")],
+        )
+    except pyjwt.PyJWTError:
+        return None
+    if claims.get("type") != "access":
+        return None
+    return claims.get(flask_app.config.get("JWT_IDENTITY_CLAIM", "sub"))
+
+
+def _unauthorized(request: Request):
+    # mirror Flask's JWT loaders: JSON for /api/*, redirect for pages
+    if request.url.path.startswith("/api/"):
+        return JSONResponse({"ok": False, "message": "Unauthorized"}, status_code=401)
+    return RedirectResponse("/login", status_code=302)
+
+
+# ---------------- Broadcasters (one pump per stream variant) ----------------
+def _frame_after(raw: bool):
+    def _next(seq: int):
+        _detector_ready()
+        return pipeline.wait_frame(seq, raw=raw, timeout=1.0)
+    return _next
+
+_video = {False: AsyncBroadcaster(_frame_after(False)), True: AsyncBroadcaster(_frame_after(True))}
+# used as a wake-up signal only: each subscriber pulls its own backlog from the ticker
+_live = AsyncBroadcaster(lambda seq: live_ticker.wait_next(seq))
+
+
+# ---------------- Streaming routes ----------------
+@app.get("/video")
+async def video(request: Request):
+    if not _cookie_identity(request):
+        return _unauthorized(request)
+    raw = request.query_params.get("raw", "0") in ("1", "true", "yes")
+
+    async def gen():
+        async for _seq, jpeg in _video[raw].subscribe():
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+    return StreamingResponse(gen(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+
+@app.get("/api/live")
+async def api_live(request: Request):
+    if not _cookie_identity(request):
+        return _unauthorized(request)
+    last_id = _last_event_id(request.headers.get("Last-Event-ID") or request.query_params.get("last_id"))
+
+    async def gen():
+        # keyframe or resume backlog, then every delta after it (never skipped)
+        seq, data = live_ticker.catch_up(last_id)
+        yield data or b": waiting\n\n"
+        async for _tick, _ in _live.subscribe(after_seq=seq):
+            seq, data = live_ticker.catch_up(seq)
+            if data:
+                yield data
+
+    headers = {"Cache-Control": "no-cache", "Connection": "keep-alive"}
+    return StreamingResponse(gen(), media_type="text/event-stream", headers=headers)
+
+
+@app.get("/api/streams/stats")
+async def stream_stats(request: Request):
+    if not _cookie_identity(request):
+        return _unauthorized(request)
+    return {
+        "video": _video[False].subscribers,
+        "video_raw": _video[True].subscribers,
+        "live": _live.subscribers,
+    }
+
+
+# ---------------- Everything else: Flask ----------------
+app.mount("/", WSGIMiddleware(flask_app))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,74 @@
+# bench_db.py
+"""
+Requests/sec benchmark for DB-bound endpoints (default: /api/zones, /api/logs).
+
+Runs C client threads with keep-alive connections against a running server
+for a fixed duration and reports throughput and latency per endpoint. The
+account must be an admin for /api/logs. Only the standard library is used.
+
+    gunicorn -w 1 --threads 16 -b 127.0.0.1:5000 app:app &
+    python bench_db.py --base http://127.0.0.1:5000 --email a@x --password p -c 16 -d 10
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+from loadtest_streams import login_cookie
+
+
+def worker(host, port, path, cookie, deadline, lat, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while time.perf_counter() < deadline:
+        t = time.perf_counter()
+        try:
+            conn.request("GET", path, headers={"Cookie": cookie})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errors.append(resp.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        lat.append(time.perf_counter() - t)
+    conn.close()
+
+
+def bench(base, path, cookie, concurrency, duration):
+    u = urlparse(base)
+    lat, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(u.hostname, u.port or 80, path, cookie, deadline, lat, errors))
+               for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    p = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000 if lat else 0.0
+    print(f"{path:<28} {len(lat)/elapsed:8.1f} req/s   p50 {p(0.50):6.1f} ms   "
+          f"p95 {p(0.95):6.1f} ms   mean {statistics.mean(lat)*1000 if lat else 0:6.1f} ms   errors {len(errors)}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base", default="http://127.0.0.1:5000")
+    ap.add_argument("--email", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("-c", "--concurrency", type=int, default=16)
+    ap.add_argument("-d", "--duration", type=float, default=10.0)
+    ap.add_argument("paths", nargs="*", default=["/api/zones", "/api/logs?limit=100"])
+    args = ap.parse_args()
+
+    cookie = login_cookie(args.base, args.email, args.password)
+    for path in args.paths:
+        bench(args.base, path, cookie, args.concurrency, args.duration)
+
+
+if __name__ == "__main__":
+    main()
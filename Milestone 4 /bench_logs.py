@@ -0,0 +1,113 @@
+# bench_logs.py
+"""
+/api/logs search benchmark on a synthetic logs table (default 10M rows).
+
+Builds the table in a scratch SQLite file (reused on later runs), then
+times each filter combination with the old query (LIKE + ORDER BY id) and
+with services/log_search.search_logs (FTS5 + (level, ts)/(ts) indexes).
+
+    python bench_logs.py --db /tmp/logs_bench.db --rows 10000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+
+from services.log_search import ensure_log_indexes, search_logs
+
+ACTIONS = ["login_success", "login_failed", "camera_start", "camera_stop", "zone_create", "zone_update",
+           "zone_delete", "count_image", "count_video", "export_csv", "report_job_done", "upload_video"]
+LEVELS = ["INFO"] * 90 + ["WARN"] * 8 + ["ERROR"] * 2
+
+
+def build(path: str, rows: int, chunk: int = 200_000):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("""CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+        level TEXT NOT NULL, actor_email TEXT, action TEXT NOT NULL, meta_json TEXT)""")
+    have = conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    rnd = random.Random(42)
+    t_end = int(time.time())
+    span = 365 * 86400  # a year of events, evenly spread
+    t0 = time.time()
+    for start in range(have, rows, chunk):
+        batch = []
+        for i in range(start, min(rows, start + chunk)):
+            ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t_end - span + i * span // rows))
+            user = f"user{rnd.randrange(5000)}@example.com"
+            action = rnd.choice(ACTIONS)
+            meta = {"cam": rnd.randrange(64), "rows": rnd.randrange(10000)}
+            if action.startswith("camera") and rnd.random() < 0.001:
+                meta["src"] = f"rtsp://10.0.{rnd.randrange(256)}.{rnd.randrange(256)}/stream"
+            batch.append((ts, rnd.choice(LEVELS), user, action, json.dumps(meta)))
+        conn.executemany("INSERT INTO logs(ts,level,actor_email,action,meta_json) VALUES(?,?,?,?,?)", batch)
+        conn.commit()
+        print(f"  inserted {min(rows, start + chunk):,} rows ({time.time() - t0:.0f}s)", flush=True)
+    t0 = time.time()
+    ensure_log_indexes(conn)
+    conn.commit()
+    print(f"  indexes + FTS ready ({time.time() - t0:.0f}s)", flush=True)
+    return conn
+
+
+def old_query(q, level, date_from, date_to, limit):
+    sql = "SELECT id, ts, level, actor_email, action, meta_json FROM logs WHERE 1=1"
+    params = []
+    if level:
+        sql += " AND level=?"; params.append(level)
+    if q:
+        sql += " AND (action LIKE ? OR meta_json LIKE ? OR actor_email LIKE ?)"
+        params += [f"%{q}%", f"%{q}%", f"%{q}%"]
+    if date_from:
+        sql += " AND ts >= ?"; params.append(date_from)
+    if date_to:
+        sql += " AND ts <= ?"; params.append(date_to)
+    sql += " ORDER BY id DESC LIMIT ?"; params.append(limit)
+    return sql, params
+
+
+def timed(run, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        n = len(run())
+        best = min(best, time.perf_counter() - t)
+    return best * 1000, n
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db", default="/tmp/logs_bench.db")
+    ap.add_argument("--rows", type=int, default=10_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"building {args.rows:,} rows in {args.db}" if not os.path.exists(args.db) else f"using {args.db}")
+    conn = build(args.db, args.rows)
+    day = time.strftime("%Y-%m-%d", time.gmtime(time.time() - 30 * 86400))
+    cases = [
+        ("latest 100", dict()),
+        ("level=ERROR", dict(level="ERROR")),
+        ("one day", dict(date_from=day + " 00:00:00", date_to=day + " 23:59:59")),
+        ("ERROR + one day", dict(level="ERROR", date_from=day + " 00:00:00", date_to=day + " 23:59:59")),
+        ("q=user42@example.com", dict(q="user42@example.com")),
+        ("q=rtsp (rare)", dict(q="rtsp")),
+        ("q=zone_delete + WARN", dict(q="zone_delete", level="WARN")),
+        ("q=zone_del (prefix)", dict(q="zone_del")),
+        ("q=nosuchthing", dict(q="nosuchthing")),
+    ]
+    print(f"\n{'case':<24} {'old (ms)':>10} {'new (ms)':>10}  rows")
+    for name, f in cases:
+        f = {"q": "", "level": "", "date_from": "", "date_to": "", "limit": 100, **f}
+        sql, params = old_query(**f)
+        old_ms, n_old = timed(lambda: conn.execute(sql, params).fetchall(), args.repeat)
+        new_ms, n_new = timed(lambda: search_logs(conn, **f), args.repeat)
+        print(f"{name:<24} {old_ms:10.1f} {new_ms:10.1f}  {n_old}/{n_new}")
+
+
+if __name__ == "__main__":
+    main()
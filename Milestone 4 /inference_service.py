@@ -0,0 +1,70 @@
+# inference_service.py
+"""
+Standalone inference worker.
+
+Owns the camera/video source, the YOLO detector, line counters and the
+metrics buffer, and serves them to web workers over a local Unix socket.
+Also runs the uploaded-video counting jobs the web tier queues in SQLite.
+With it running, the Flask app is a thin reader and can be scaled out:
+
+    python inference_service.py --socket /tmp/crowdcount.sock
+    INFERENCE_SOCKET=/tmp/crowdcount.sock gunicorn -w 4 --threads 8 app:app
+
+Without INFERENCE_SOCKET, app.py runs the same pipeline in-process.
+"""
+import argparse
+import functools
+import os
+import signal
+
+from dotenv import load_dotenv
+
+from services.detector import Detector
+from services.ipc import PipelineServer
+from services.metrics_store import MetricsStore
+from services.pipeline import LivePipeline
+from services.video_jobs import VideoJobs
+from services.zones import load_zones
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="CrowdCount inference service")
+    ap.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET", "/tmp/crowdcount.sock"))
+    ap.add_argument("--db", default=os.path.join(APP_DIR, "app.db"))
+    ap.add_argument("--model", default="yolov8n.pt")
+    ap.add_argument("--conf", type=float, default=0.50)
+    ap.add_argument("--warmup-runs", type=int, default=int(os.getenv("DETECTOR_WARMUP_RUNS", "2")))
+    args = ap.parse_args()
+
+    detector = Detector(args.model, conf=args.conf)
+    store = MetricsStore(args.db, raw_retain_days=int(os.getenv("METRICS_RAW_RETENTION_DAYS", "30"))).start_writer()
+    pipeline = LivePipeline(detector, lambda: load_zones(args.db), warmup_runs=args.warmup_runs,
+                            on_sample=store.append).start()
+    # a partial, not a lambda: the segment pool's spawned workers unpickle it
+    video_jobs = VideoJobs(args.db, functools.partial(Detector, args.model, conf=args.conf),
+                           segments=int(os.getenv("VIDEO_SEGMENTS", str(min(4, os.cpu_count() or 1))))).start()
+    server = PipelineServer(args.socket, pipeline)
+
+    def _shutdown(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _shutdown)
+
+    print(f"[inference] serving on {args.socket} (db={args.db})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pipeline.stop()
+        video_jobs.stop()
+        store.stop()
+        try: os.unlink(args.socket)
+        except OSError: pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# loadtest_streams.py
+"""
+Concurrent-viewer load test for the long-lived endpoints.
+
+Opens N simultaneous /api/live (SSE) or /video (MJPEG) connections, holds
+them open, and reports how many receive data within the deadline and how
+long the first event took. Only the standard library is used.
+
+Reproduce (from this folder; the client needs ~2 fds per viewer, so raise
+`ulimit -n` above 2 x N):
+
+    # a user to log in as
+    python -c "import app; app.app.test_client().post('/api/register', json={'name': 'a', 'email': 'a@x', 'password': 'p'})"
+
+    # before: every stream pins a WSGI thread (pip install gunicorn)
+    gunicorn -w 1 -k gthread --threads 64 -b 127.0.0.1:5000 app:app &
+    python loadtest_streams.py --base http://127.0.0.1:5000 --email a@x --password p -n 2000 --hold 8
+
+    # after: streams are coroutines, the rest is Flask behind a2wsgi
+    uvicorn asgi:app --port 8000 &
+    python loadtest_streams.py --base http://127.0.0.1:8000 --email a@x --password p -n 2000 --hold 8
+
+Measured (1 CPU, Python 3.11, /api/live, 2000 viewers held 8 s, YOLO
+replaced by a no-op detector so only the serving layer is loaded):
+
+    gunicorn gthread 1 x 64 threads   64/2000 served   first event p95 534 ms
+    uvicorn asgi:app                2000/2000 served   first event p95 5152 ms
+
+The p95 after is the time to accept and authenticate 2000 connections on one
+core, not per-event latency; once connected every viewer gets each tick.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+
+def login_cookie(base: str, email: str, password: str) -> str:
+    req = urllib.request.Request(
+        base + "/api/login",
+        data=json.dumps({"email": email, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        for k, v in resp.getheaders():
+            if k.lower() == "set-cookie" and v.startswith("access_token_cookie="):
+                return v.split(";", 1)[0]
+    raise SystemExit("login failed: no access_token_cookie")
+
+
+async def viewer(host: str, port: int, path: str, cookie: str, marker: bytes, hold: float, t0: float):
+    """Return seconds until first payload, or None if nothing arrived."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        return None
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nCookie: {cookie}\r\n"
+        f"Accept: */*\r\n\r\n".encode()
+    )
+    first = None
+    buf = b""
+    deadline = t0 + hold
+    try:
+        while time.perf_counter() < deadline:
+            chunk = await asyncio.wait_for(reader.read(65536), timeout=max(0.01, deadline - time.perf_counter()))
+            if not chunk:
+                break
+            if first is None:
+                buf += chunk
+                if marker in buf:
+                    first = time.perf_counter() - t0
+                    buf = b""
+    except (asyncio.TimeoutError, OSError):
+        pass
+    finally:
+        writer.close()
+    return first
+
+
+async def run(args):
+    u = urlparse(args.base)
+    cookie = login_cookie(args.base, args.email, args.password)
+    path, marker = ("/api/live", b"data: ") if args.endpoint == "live" else ("/video?raw=1", b"\xff\xd8")
+
+    t0 = time.perf_counter()
+    tasks = [viewer(u.hostname, u.port or 80, path, cookie, marker, args.hold, t0) for _ in range(args.n)]
+    res = await asyncio.gather(*tasks)
+
+    got = sorted(r for r in res if r is not None)
+    print(f"endpoint={path} viewers={args.n} hold={args.hold}s")
+    print(f"  served: {len(got)}/{args.n} ({100.0 * len(got) / max(1, args.n):.1f}%)")
+    if got:
+        p95 = got[min(len(got) - 1, int(len(got) * 0.95))]
+        print(f"  first event: p50={statistics.median(got)*1000:.0f} ms  p95={p95*1000:.0f} ms  max={got[-1]*1000:.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent viewer load test")
+    ap.add_argument("--base", default="http://127.0.0.1:5000")
+    ap.add_argument("--email", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("--endpoint", choices=["live", "video"], default="live")
+    ap.add_argument("-n", type=int, default=200, help="concurrent viewers")
+    ap.add_argument("--hold", type=float, default=10.0, help="seconds to keep each connection open")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# services/async_fanout.py
+import asyncio
+from typing import Callable, Optional, Tuple
+
+# blocking "give me the item after seq" function, e.g. pipeline.wait_frame / ticker.wait_next
+BlockingNext = Callable[[int], Tuple[int, Optional[bytes]]]
+
+
+class AsyncBroadcaster:
+    """
+    Bridges one blocking producer into asyncio for any number of subscribers.
+
+    A single pump task calls `blocking_next` in a worker thread and publishes
+    each new (seq, bytes); subscribers only await an asyncio.Event, so an idle
+    connection costs a coroutine, not a thread. The pump runs only while at
+    least one subscriber is attached.
+
+    Use:
+        bc = AsyncBroadcaster(lambda seq: pipeline.wait_frame(seq, raw=True))
+        async for seq, data in bc.subscribe():
+            yield data
+    """
+    def __init__(self, blocking_next: BlockingNext):
+        self._next = blocking_next
+        self._seq = 0
+        self._data: Optional[bytes] = None
+        self._event: Optional[asyncio.Event] = None
+        self._subscribers = 0
+        self._pump: Optional[asyncio.Task] = None
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    async def _run_pump(self):
+        seq = self._seq
+        while self._subscribers > 0:
+            try:
+                seq, data = await asyncio.to_thread(self._next, seq)
+            except Exception:
+                await asyncio.sleep(0.2)
+                continue
+            if data is None or seq == self._seq:
+                continue
+            self._seq, self._data = seq, data
+            ev, self._event = self._event, asyncio.Event()
+            ev.set()
+        self._pump = None
+
+    async def subscribe(self, after_seq: int = 0):
+        """
+        Async generator of (seq, payload) for items after `after_seq`. A slow
+        subscriber skips to the latest item; callers that must not miss any
+        (e.g. delta streams) use seq to fetch the backlog themselves.
+        """
+        if self._event is None:
+            self._event = asyncio.Event()
+        self._subscribers += 1
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._run_pump())
+        try:
+            seen = after_seq
+            while True:
+                if self._seq == seen or self._data is None:
+                    await self._event.wait()
+                    continue
+                seen = self._seq
+                yield seen, self._data
+        finally:
+            self._subscribers -= 1
@@ -0,0 +1,48 @@
+# services/audit_log.py
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from services.db import BatchWriter
+
+
+class AuditLog:
+    """
+    Fire-and-forget writer for the `logs` table.
+
+    log() stamps the event and hands it to a BatchWriter: a background
+    thread inserts whatever is waiting in one transaction every
+    `flush_interval` seconds (sooner once `batch_size` are queued). A full
+    queue drops the event and counts it rather than stalling the request.
+
+    Use:
+        audit = AuditLog(DB_PATH).start()
+        audit.log("INFO", "login", {"email": ...}, actor="a@x")
+        audit.stop()       # flushes everything queued (atexit)
+        audit.stats()      # {"pending", "written", "dropped"}
+    """
+    def __init__(self, db_path: str, *, flush_interval: float = 0.5,
+                 batch_size: int = 500, max_pending: int = 50_000):
+        self.db_path = db_path
+        self._writer = BatchWriter(db_path, self._write, name="audit-log", flush_interval=flush_interval,
+                                   batch_size=batch_size, max_pending=max_pending)
+
+    def start(self):
+        self._writer.start()
+        return self
+
+    def stop(self):
+        self._writer.stop()
+
+    def log(self, level: str, action: str, meta: Optional[Dict] = None, actor: Optional[str] = None):
+        # ts in the same format/zone as the column default (CURRENT_TIMESTAMP, UTC)
+        self._writer.put((time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()), str(level).upper(), actor,
+                          action, json.dumps(meta or {})))
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, rows: List[tuple]):
+        conn.executemany("INSERT INTO logs(ts,level,actor_email,action,meta_json) VALUES(?,?,?,?,?)", rows)
+
+    def stats(self) -> Dict:
+        return self._writer.stats()
@@ -0,0 +1,212 @@
+# services/db.py
+import os
+import queue
+import sqlite3
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Applied to every pooled connection. journal_mode=WAL is persistent on the
+# file; the rest are per-connection.
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    "journal_mode": "WAL",          # readers never block the writer (SSE, exports vs log writes)
+    "synchronous": "NORMAL",        # fsync at checkpoints only; safe with WAL
+    "busy_timeout": 5000,           # ms to wait on a locked db instead of failing
+    "mmap_size": 256 * 1024 * 1024, # read pages through the OS page cache
+    "cache_size": -16000,           # 16 MB page cache per connection (negative = KiB)
+    "temp_store": "MEMORY",
+}
+
+
+class QueueFull(Exception):
+    """A SQLite-backed job queue (reports, videos) already has max_pending jobs waiting."""
+
+
+class SQLitePool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Reusing a connection keeps its page cache warm and its prepared
+    statements (sqlite3's per-connection statement cache) across requests,
+    instead of paying connect + pragma + parse on every app context.
+
+    Use:
+        pool = SQLitePool(DB_PATH, size=16)
+        conn = pool.acquire()
+        try: conn.execute(...)
+        finally: pool.release(conn)
+
+    Connections are not shared across fork: a pool touched in a parent
+    process starts empty in the child.
+    """
+    def __init__(self, path: str, size: int = 16, *, timeout: float = 10.0,
+                 cached_statements: int = 256, pragmas: Optional[Dict[str, object]] = None):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        for k, v in self.pragmas.items():
+            conn.execute(f"PRAGMA {k}={v}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no SQLite connection free after {self.timeout}s (pool size {self.size})")
+
+    def release(self, conn: sqlite3.Connection):
+        if self._pid != os.getpid():
+            return  # belongs to the parent's pool
+        try:
+            if conn.in_transaction:
+                conn.rollback()  # never hand an open transaction to the next request
+        except sqlite3.Error:
+            with self._lock:
+                self._created -= 1
+            try: conn.close()
+            except sqlite3.Error: pass
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+            try: conn.close()
+            except sqlite3.Error: pass
+
+
+class BatchWriter:
+    """
+    Background thread that inserts queued rows into SQLite in batches.
+
+    put() never blocks: a full queue drops the row and counts it. The
+    thread wakes every `flush_interval` seconds (sooner once `batch_size`
+    rows are waiting) and passes up to `max_batch` rows at a time to
+    `write(conn, rows)`, one transaction each; a failed transaction counts
+    its rows as dropped. `idle(conn)`, if given, runs on the same
+    connection after every flush, for housekeeping that must not race the
+    writes (its sqlite3 errors are ignored; it runs again next flush).
+
+    Use:
+        w = BatchWriter(DB_PATH, lambda conn, rows: conn.executemany(SQL, rows),
+                        name="audit-log").start()
+        w.put(row)
+        w.stop()       # flushes everything queued
+        w.stats()      # {"pending", "written", "dropped"}
+    """
+    def __init__(self, path: str, write: Callable[[sqlite3.Connection, List[tuple]], None], *,
+                 name: str = "sqlite-writer", flush_interval: float = 1.0, batch_size: int = 200,
+                 max_batch: Optional[int] = None, max_pending: int = 100_000,
+                 idle: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.path = path
+        self.write = write
+        self.name = name
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_batch = max_batch or batch_size
+        self.idle = idle
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread after flushing everything queued."""
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    def put(self, row: tuple):
+        try:
+            self._q.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, limit: int) -> List[tuple]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL, far fewer fsyncs
+        try:
+            while True:
+                if self._q.qsize() < self.batch_size:
+                    self._stop.wait(self.flush_interval)
+                stopping = self._stop.is_set()
+                while True:
+                    batch = self._drain(self.max_batch)
+                    if not batch:
+                        break
+                    try:
+                        with conn:
+                            self.write(conn, batch)
+                        self.written += len(batch)
+                    except sqlite3.Error:
+                        self.dropped += len(batch)
+                if stopping:
+                    return
+                if self.idle is not None:
+                    try:
+                        self.idle(conn)
+                    except sqlite3.Error:
+                        pass
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        return {"pending": self._q.qsize(), "written": self.written, "dropped": self.dropped}
@@ -1,7 +1,8 @@
 # services/detector.py
 import threading
+import time
 from dataclasses import dataclass
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Set
 
 import cv2
 import numpy as np
@@ -97,8 +98,10 @@ class Detector:
     Use:
         det = Detector()
         det.load()  # loads YOLO model (yolov8n.pt by default)
-        annotated = det.process(frame)  # returns frame with boxes+ids drawn
-        tracks = det.get_tracks()
+        # or: det.load_async() + det.is_ready() / det.status() for warm-up in background
+        tracks = det.detect_and_track(frame)  # pure: frame is not modified
+        annotated = draw_tracks(frame, tracks)  # optional renderer
+        annotated = det.process(frame)  # both steps (legacy)
     """
     def __init__(self, model_path: str = "yolov8n.pt", conf: float = 0.5):
         self.model_path = model_path
@@ -108,9 +111,84 @@ class Detector:
         self._state = DetectorState(tracks=[], frame_w=640, frame_h=480)
         self._lock = threading.Lock()
 
+        # model lifecycle (see load_async)
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._load_error: Optional[str] = None
+        self._load_ms: Optional[float] = None
+        self._warmup_ms: List[float] = []
+        self._load_thread: Optional[threading.Thread] = None
+        self._load_failed_at = 0.0
+
     def load(self):
-        if self._model is None:
-            self._model = YOLO(self.model_path)
+        with self._load_lock:
+            if self._model is None:
+                t0 = time.perf_counter()
+                self._model = YOLO(self.model_path)
+                self._load_ms = (time.perf_counter() - t0) * 1000.0
+
+    def warmup(self, runs: int = 2, size: Tuple[int, int] = (640, 480)):
+        """
+        Run a few dummy inferences so the first real frame does not pay
+        the lazy init / JIT cost. Tracker state is left untouched.
+        """
+        self.load()
+        w, h = size
+        dummy = np.zeros((h, w, 3), dtype=np.uint8)
+        for _ in range(max(1, runs)):
+            t0 = time.perf_counter()
+            self._detect_people(dummy)
+            self._warmup_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    def load_async(self, warmup_runs: int = 2) -> threading.Thread:
+        """
+        Load + warm up on a daemon thread; is_ready() flips when done.
+        Safe to call repeatedly: returns the running/finished thread.
+        After a failure, a new attempt is made at most every 30 s.
+        """
+        def _run():
+            try:
+                self.load()
+                self.warmup(runs=warmup_runs)
+                self._ready.set()
+            except Exception as e:
+                self._load_failed_at = time.time()
+                self._load_error = str(e)
+
+        with self._load_lock:
+            t = self._load_thread
+            if t is not None:
+                if t.is_alive() or self._ready.is_set():
+                    return t
+                if self._load_error and time.time() - self._load_failed_at < 30:
+                    return t
+            self._load_error = None
+            t = threading.Thread(target=_run, name="detector-warmup", daemon=True)
+            self._load_thread = t
+            t.start()
+            return t
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def status(self) -> Dict:
+        """Readiness info for health endpoints."""
+        if self._ready.is_set():
+            state = "ready"
+        elif self._load_error:
+            state = "error"
+        else:
+            state = "warming_up"
+        return {
+            "state": state,
+            "model": self.model_path,
+            "load_ms": round(self._load_ms, 1) if self._load_ms is not None else None,
+            "warmup_ms": [round(x, 1) for x in self._warmup_ms],
+            "error": self._load_error,
+        }
 
     def set_conf(self, conf: float):
         self.conf = float(conf)
@@ -127,10 +205,10 @@ class Detector:
                 dets.append((x1, y1, x2, y2, float(cf)))
         return dets
 
-    def process(self, frame) -> np.ndarray:
+    def detect_and_track(self, frame) -> List[Track]:
         """
-        Run detection+tracking; draw boxes and IDs on the frame;
-        update internal state; return annotated frame.
+        Run detection+tracking and update internal state.
+        Does not touch the pixels of `frame`; returns the current tracks.
         """
         if self._model is None:
             self.load()
@@ -139,16 +217,24 @@ class Detector:
         dets = self._detect_people(frame)
         tracks = self._tracker.update(dets)
 
-        # draw
-        for x1, y1, x2, y2, tid, conf in tracks:
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-            cv2.putText(frame, f"ID {tid}", (x1, max(0, y1 - 6)),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
-
         with self._lock:
             self._state = DetectorState(tracks=list(tracks), frame_w=w, frame_h=h)
 
-        return frame
+        return tracks
+
+    def process(self, frame) -> np.ndarray:
+        """
+        Run detection+tracking; draw boxes and IDs on the frame;
+        update internal state; return annotated frame.
+        """
+        tracks = self.detect_and_track(frame)
+        return draw_tracks(frame, tracks)
+
+    def reset_tracker(self):
+        """Start track IDs over (e.g. a new video file); the model stays loaded."""
+        with self._lock:
+            self._tracker = SimpleTracker(iou_thresh=0.35, max_age=12)
+            self._state = DetectorState(tracks=[], frame_w=640, frame_h=480)
 
     def get_tracks(self) -> List[Track]:
         with self._lock:
@@ -159,6 +245,30 @@ class Detector:
             return self._state
 
 
+# --------- Rendering ---------
+def draw_tracks(frame, tracks: List[Track]) -> np.ndarray:
+    """Draw boxes and IDs in place; returns the same frame."""
+    for x1, y1, x2, y2, tid, conf in tracks:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"ID {tid}", (x1, max(0, y1 - 6)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    return frame
+
+
+def tracks_to_boxes(tracks: List[Track], frame_w: int, frame_h: int) -> List[Dict]:
+    """
+    Normalized boxes for client-side overlays:
+      [{id, x1, y1, x2, y2}, ...] with coords in 0..1
+    """
+    fw, fh = max(1, frame_w), max(1, frame_h)
+    return [
+        {"id": tid,
+         "x1": round(x1 / fw, 4), "y1": round(y1 / fh, 4),
+         "x2": round(x2 / fw, 4), "y2": round(y2 / fh, 4)}
+        for x1, y1, x2, y2, tid, conf in tracks
+    ]
+
+
 # --------- Zone counting helpers (polygon) ---------
 def _point_in_polygon(px: float, py: float, poly: List[Dict[str, float]]) -> bool:
     """
@@ -181,9 +291,9 @@ def _point_in_polygon(px: float, py: float, poly: List[Dict[str, float]]) -> boo
     return inside
 
 
-def unique_ids_in_zone(zone_points: List[Dict[str, float]], tracks: List[Track]) -> int:
+def ids_in_zone(zone_points: List[Dict[str, float]], tracks: List[Track]) -> Set[int]:
     """
-    Count unique track IDs whose bbox center lies inside the polygon zone.
+    Track IDs whose bbox center lies inside the polygon zone.
     """
     tids = set()
     for x1, y1, x2, y2, tid, conf in tracks:
@@ -191,4 +301,11 @@ def unique_ids_in_zone(zone_points: List[Dict[str, float]], tracks: List[Track])
         cy = (y1 + y2) / 2.0
         if _point_in_polygon(cx, cy, zone_points):
             tids.add(tid)
-    return len(tids)
+    return tids
+
+
+def unique_ids_in_zone(zone_points: List[Dict[str, float]], tracks: List[Track]) -> int:
+    """
+    Count unique track IDs whose bbox center lies inside the polygon zone.
+    """
+    return len(ids_in_zone(zone_points, tracks))
@@ -0,0 +1,96 @@
+# services/heatmap.py
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class DecayedHeatmap:
+    """
+    Exponentially decayed 2D occupancy histogram, one grid per window.
+
+    Each update adds `dt` seconds of presence at every centroid's cell, after
+    decaying the grid by exp(-dt / window). A grid therefore approximates
+    "person-seconds in the last ~window seconds" and reading any window is
+    O(grid), never a replay of raw centers.
+
+    Use:
+        hm = DecayedHeatmap(grid=(64, 48), windows=(60, 900, 3600))
+        hm.update([(0.4, 0.7), (0.5, 0.2)])       # normalized centroids (0..1)
+        w, h, u8, peak = hm.as_uint8(900)          # 0..255, scaled to peak
+        png = hm.as_png(900)                       # colorized, alpha = intensity
+    """
+    def __init__(self, grid: Tuple[int, int] = (64, 48), windows: Iterable[int] = (60, 900, 3600)):
+        self.grid_w, self.grid_h = grid
+        self.windows = tuple(sorted(int(w) for w in windows))
+        self._grids: Dict[int, np.ndarray] = {
+            w: np.zeros((self.grid_h, self.grid_w), dtype=np.float32) for w in self.windows
+        }
+        self._decayed_at: Optional[float] = None  # grids are current as of this time
+        self._updated_at: Optional[float] = None  # last time presence was credited
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            for g in self._grids.values():
+                g.fill(0.0)
+            self._decayed_at = None
+            self._updated_at = None
+
+    def _decay(self, now: float):
+        # caller holds self._lock
+        dt = 0.0 if self._decayed_at is None else now - self._decayed_at
+        if dt > 0:
+            for w, g in self._grids.items():
+                g *= math.exp(-dt / w)
+        if self._decayed_at is None or dt > 0:
+            self._decayed_at = now
+
+    def update(self, centers: Iterable[Tuple[float, float]], now: Optional[float] = None):
+        """Decay to `now` and add the current centroids (normalized x, y)."""
+        now = time.monotonic() if now is None else now
+        pts = np.asarray(list(centers), dtype=np.float32).reshape(-1, 2)
+        with self._lock:
+            self._decay(now)
+            # presence since the previous update; capped so a stalled source doesn't spike
+            weight = 0.0 if self._updated_at is None else min(max(0.0, now - self._updated_at), 1.0)
+            self._updated_at = now
+            if weight <= 0 or len(pts) == 0:
+                return
+            ix = np.clip((pts[:, 0] * self.grid_w).astype(np.int32), 0, self.grid_w - 1)
+            iy = np.clip((pts[:, 1] * self.grid_h).astype(np.int32), 0, self.grid_h - 1)
+            for g in self._grids.values():
+                np.add.at(g, (iy, ix), weight)
+
+    def _pick(self, window: int) -> int:
+        # smallest configured window >= requested (else the largest)
+        for w in self.windows:
+            if w >= window:
+                return w
+        return self.windows[-1]
+
+    def grid(self, window: int, now: Optional[float] = None) -> np.ndarray:
+        """Copy of the decayed grid (person-seconds per cell) as of `now`."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._decay(now)
+            return self._grids[self._pick(window)].copy()
+
+    def as_uint8(self, window: int) -> Tuple[int, int, bytes, float]:
+        g = self.grid(window)
+        peak = float(g.max())
+        if peak > 0:
+            g = cv2.GaussianBlur(g, (0, 0), 1.0)
+            g = np.clip(g * (255.0 / max(float(g.max()), 1e-6)), 0, 255)
+        return self.grid_w, self.grid_h, g.astype(np.uint8).tobytes(), peak
+
+    def as_png(self, window: int) -> bytes:
+        w, h, raw, _peak = self.as_uint8(window)
+        u8 = np.frombuffer(raw, dtype=np.uint8).reshape(h, w)
+        bgr = cv2.applyColorMap(u8, cv2.COLORMAP_JET)
+        bgra = np.dstack([bgr, u8])  # transparent where nobody has been
+        ok, buf = cv2.imencode(".png", bgra)
+        return buf.tobytes() if ok else b""
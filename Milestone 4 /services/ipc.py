@@ -0,0 +1,255 @@
+# services/ipc.py
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# ---------------- Wire format ----------------
+# Every message (both directions) is:
+#   [4B header_len][4B blob_len][header JSON utf-8][blob bytes]
+# header = {"op": ..., "args": {...}}           (request)
+#        = {"ok": bool, "result": ..., "error"} (response)
+# blob carries binary payloads (JPEG/PNG) without base64 overhead.
+_HDR = struct.Struct("!II")
+
+# AF_UNIX is missing on Windows: the module still imports, the server and
+# client refuse to start, and app.py runs the pipeline in-process instead.
+HAS_UNIX_SOCKETS = hasattr(socket, "AF_UNIX")
+_UnixStreamServer = getattr(socketserver, "UnixStreamServer", socketserver.BaseServer)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("socket closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def send_msg(sock: socket.socket, header: Dict, blob: bytes = b""):
+    h = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    sock.sendall(_HDR.pack(len(h), len(blob)) + h + blob)
+
+
+def recv_msg(sock: socket.socket) -> Tuple[Dict, bytes]:
+    hlen, blen = _HDR.unpack(_recv_exact(sock, _HDR.size))
+    header = json.loads(_recv_exact(sock, hlen).decode("utf-8"))
+    blob = _recv_exact(sock, blen) if blen else b""
+    return header, blob
+
+
+def _tracks_out(tracks) -> Optional[List]:
+    return None if tracks is None else [list(t) for t in tracks]
+
+
+def _tracks_in(tracks) -> Optional[List]:
+    return None if tracks is None else [tuple(t) for t in tracks]
+
+
+def _decode_image(blob: bytes) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+
+
+def _encode_image(img: np.ndarray) -> bytes:
+    ok, buf = cv2.imencode(".png", img)
+    if not ok:
+        raise ValueError("cannot encode image")
+    return buf.tobytes()
+
+
+# ---------------- Server (inference side) ----------------
+class PipelineServer(socketserver.ThreadingMixIn, _UnixStreamServer):
+    """
+    Exposes a LivePipeline on a Unix socket. One thread per client
+    connection; each connection carries any number of request/response pairs.
+    """
+    daemon_threads = True
+
+    def __init__(self, path: str, pipeline):
+        if not HAS_UNIX_SOCKETS:
+            raise OSError("Unix domain sockets are not available on this platform")
+        self.pipeline = pipeline
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _PipelineHandler)
+        os.chmod(path, 0o660)
+
+
+class _PipelineHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                header, blob = recv_msg(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                result, out_blob = self._dispatch(header.get("op"), header.get("args") or {}, blob)
+                send_msg(self.request, {"ok": True, "result": result}, out_blob)
+            except Exception as e:
+                try:
+                    send_msg(self.request, {"ok": False, "error": str(e)})
+                except OSError:
+                    return
+
+    def _dispatch(self, op: str, args: Dict, blob: bytes):
+        p = self.server.pipeline
+        if op == "wait_frame":
+            seq, data = p.wait_frame(int(args.get("after_seq", 0)), bool(args.get("raw")),
+                                     float(args.get("timeout", 1.0)))
+            return seq, data or b""
+        if op == "snapshot":
+            return p.snapshot(with_boxes=bool(args.get("with_boxes"))), b""
+        if op == "live_counts":
+            return p.live_counts(), b""
+        if op == "metrics_series":
+            tv = p.metrics_series(int(args["ts_from"]), args.get("ts_to"), args.get("zone"))
+            if tv is None:
+                return None, b""
+            return len(tv[0]), tv[0].astype("<i8").tobytes() + tv[1].astype("<f8").tobytes()
+        if op == "heatmap_png":
+            return True, p.heatmap_png(int(args["window"]))
+        if op == "heatmap_u8":
+            w, h, raw, peak = p.heatmap_u8(int(args["window"]))
+            return {"w": w, "h": h, "peak": peak}, raw
+        if op == "ensure_ready":
+            return p.ensure_ready(), b""
+        if op == "is_ready":
+            return p.is_ready(), b""
+        if op == "status":
+            return p.status(), b""
+        if op == "start_source":
+            p.start_source(args["src"], args["mode"], args.get("path"))
+            return True, b""
+        if op == "stop_source":
+            p.stop_source()
+            return True, b""
+        if op == "set_image":
+            img = _decode_image(blob)
+            if img is None:
+                raise ValueError("bad image")
+            p.set_image(img)
+            return True, b""
+        if op == "invalidate_zones":
+            p.invalidate_zones()
+            return True, b""
+        if op == "detect_image":
+            img = _decode_image(blob)
+            if img is None:
+                raise ValueError("bad image")
+            return _tracks_out(p.detect_image(img)), b""
+        raise ValueError(f"unknown op: {op}")
+
+
+# ---------------- Client (web side) ----------------
+class RemotePipeline:
+    """
+    Drop-in stand-in for LivePipeline that forwards calls to an inference
+    service over its Unix socket. One persistent connection per thread.
+    """
+    def __init__(self, path: str):
+        if not HAS_UNIX_SOCKETS:
+            raise OSError("Unix domain sockets are not available on this platform")
+        self.path = path
+        self._local = threading.local()
+
+    def _sock(self) -> socket.socket:
+        s = getattr(self._local, "sock", None)
+        if s is None:
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.connect(self.path)
+            self._local.sock = s
+        return s
+
+    def _drop(self):
+        s = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if s is not None:
+            try: s.close()
+            except OSError: pass
+
+    def _call(self, op: str, blob: bytes = b"", **args):
+        # one retry on a fresh connection (service restarted / idle socket closed)
+        for attempt in (0, 1):
+            try:
+                s = self._sock()
+                send_msg(s, {"op": op, "args": args}, blob)
+                header, out_blob = recv_msg(s)
+                break
+            except (ConnectionError, OSError):
+                self._drop()
+                if attempt:
+                    raise
+        if not header.get("ok"):
+            raise RuntimeError(header.get("error") or f"{op} failed")
+        return header.get("result"), out_blob
+
+    # lifecycle is owned by the service process
+    def start(self):
+        return self
+
+    def stop(self):
+        self._drop()
+
+    # readiness (service down == not ready)
+    def is_ready(self) -> bool:
+        try: return bool(self._call("is_ready")[0])
+        except (ConnectionError, OSError): return False
+
+    def ensure_ready(self) -> bool:
+        try: return bool(self._call("ensure_ready")[0])
+        except (ConnectionError, OSError): return False
+
+    def status(self) -> Dict:
+        try: return self._call("status")[0]
+        except (ConnectionError, OSError) as e:
+            return {"state": "unavailable", "error": str(e), "socket": self.path}
+
+    # source control
+    def start_source(self, src, mode: str, path: Optional[str] = None):
+        self._call("start_source", src=src, mode=mode, path=path)
+
+    def set_image(self, img: np.ndarray):
+        self._call("set_image", _encode_image(img))
+
+    def stop_source(self):
+        self._call("stop_source")
+
+    def invalidate_zones(self):
+        self._call("invalidate_zones")
+
+    # readers
+    def wait_frame(self, after_seq: int, raw: bool = False, timeout: float = 1.0):
+        seq, blob = self._call("wait_frame", after_seq=after_seq, raw=raw, timeout=timeout)
+        return seq, (blob or None)
+
+    def snapshot(self, with_boxes: bool = False) -> Dict:
+        return self._call("snapshot", with_boxes=with_boxes)[0]
+
+    def live_counts(self) -> Dict:
+        return self._call("live_counts")[0]
+
+    def metrics_series(self, ts_from: int, ts_to: Optional[int] = None,
+                       zone: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        n, blob = self._call("metrics_series", ts_from=ts_from, ts_to=ts_to, zone=zone)
+        if n is None:
+            return None
+        return np.frombuffer(blob, "<i8", n), np.frombuffer(blob, "<f8", n, offset=8 * n)
+
+    def heatmap_png(self, window: int) -> bytes:
+        return self._call("heatmap_png", window=window)[1]
+
+    def heatmap_u8(self, window: int):
+        meta, raw = self._call("heatmap_u8", window=window)
+        return meta["w"], meta["h"], raw, meta["peak"]
+
+    # one-off counting
+    def detect_image(self, img: np.ndarray):
+        return _tracks_in(self._call("detect_image", _encode_image(img))[0])
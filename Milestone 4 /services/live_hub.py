@@ -0,0 +1,173 @@
+# services/live_hub.py
+import json
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+
+# ---------------- Delta encoding ----------------
+# Every SSE event carries `id: <seq>` and one JSON object:
+#   keyframe: {"t":"k", "timestamp", "total_people", "zones":{name:n}, "centers":[...], "boxes":[...], "status"?}
+#   delta:    {"t":"d", "timestamp", + only what changed since the previous tick:
+#              "total_people", "zones":{name:n}, "zones_del":[name],
+#              "boxes":{id:[x1,y1,x2,y2]}, "boxes_del":[id], "status"}
+# Values are absolute (never increments), so replaying a delta is harmless.
+# Centers are not sent in deltas; clients derive them from the box midpoints.
+
+def _box_map(snap: Dict) -> Dict[str, list]:
+    return {str(b["id"]): [b["x1"], b["y1"], b["x2"], b["y2"]] for b in snap.get("boxes") or []}
+
+
+def make_keyframe(snap: Dict) -> Dict:
+    out = {"t": "k"}
+    out.update(snap)
+    return out
+
+
+def make_delta(prev: Dict, cur: Dict) -> Dict:
+    out = {"t": "d", "timestamp": cur.get("timestamp")}
+    if cur.get("total_people") != prev.get("total_people"):
+        out["total_people"] = cur.get("total_people")
+
+    pz, cz = prev.get("zones") or {}, cur.get("zones") or {}
+    changed = {k: v for k, v in cz.items() if pz.get(k) != v}
+    removed = [k for k in pz if k not in cz]
+    if changed: out["zones"] = changed
+    if removed: out["zones_del"] = removed
+
+    pb, cb = _box_map(prev), _box_map(cur)
+    upd = {k: v for k, v in cb.items() if pb.get(k) != v}
+    gone = [int(k) for k in pb if k not in cb]
+    if upd: out["boxes"] = upd
+    if gone: out["boxes_del"] = gone
+
+    ps, cs = prev.get("status", "ready"), cur.get("status", "ready")
+    if ps != cs:
+        out["status"] = cs
+    return out
+
+
+def sse_frame(seq: int, payload: Dict) -> bytes:
+    return (f"id: {seq}\ndata: " + json.dumps(payload, separators=(",", ":")) + "\n\n").encode("utf-8")
+
+
+class SnapshotTicker:
+    """
+    Computes a live snapshot once per tick and serializes it once to an SSE
+    frame; every subscriber gets the same bytes. Per-tick cost does not grow
+    with the number of connected dashboards.
+
+    Frames are deltas against the previous tick with a keyframe every
+    `keyframe_every` ticks. The last `history` frames are kept so a client
+    reconnecting with Last-Event-ID resumes from where it left off; if it is
+    too far behind it gets a fresh keyframe instead.
+
+    Use:
+        seq, data = ticker.catch_up(last_event_id)   # keyframe or backlog
+        while True:
+            yield data
+            seq, data = ticker.wait_next(seq)        # every frame after seq
+
+    The thread starts with the first waiter and parks itself after
+    `idle_stop` seconds without any, so an unwatched camera costs nothing.
+    """
+    def __init__(
+        self,
+        producer: Callable[[], Dict],
+        interval: float = 0.5,
+        idle_stop: float = 30.0,
+        *,
+        keyframe_every: int = 20,
+        history: int = 240,
+    ):
+        self._producer = producer
+        self.interval = interval
+        self.idle_stop = idle_stop
+        self.keyframe_every = max(1, keyframe_every)
+
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._state: Optional[Dict] = None          # snapshot at self._seq
+        self._history: deque = deque(maxlen=max(1, history))  # (seq, frame bytes)
+        self._key_cache: Tuple[int, bytes] = (0, b"")
+        self._since_key = 0
+        self._last_wait = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_running(self):
+        # caller holds self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="snapshot-ticker", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        next_tick = time.monotonic()
+        while True:
+            with self._cond:
+                if time.monotonic() - self._last_wait > self.idle_stop:
+                    self._thread = None
+                    return
+            try:
+                snap = self._producer()
+            except Exception:
+                snap = None
+            if snap is not None:
+                self._advance(snap)
+
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()  # fell behind: don't burst
+
+    def _advance(self, snap: Dict):
+        with self._cond:
+            seq = self._seq + 1
+            if self._state is None or self._since_key + 1 >= self.keyframe_every:
+                frame = sse_frame(seq, make_keyframe(snap))
+                self._key_cache = (seq, frame)
+                self._since_key = 0
+            else:
+                frame = sse_frame(seq, make_delta(self._state, snap))
+                self._since_key += 1
+            self._seq, self._state = seq, snap
+            self._history.append((seq, frame))
+            self._cond.notify_all()
+
+    def _frames_after(self, after_seq: Optional[int]) -> bytes:
+        # caller holds self._cond
+        if self._state is None:
+            return b""
+        if after_seq is not None and after_seq == self._seq:
+            return b""
+        oldest = self._history[0][0] if self._history else self._seq + 1
+        if after_seq is not None and oldest <= after_seq + 1 <= self._seq:
+            return b"".join(f for s, f in self._history if s > after_seq)
+        # unknown / too old / from a previous server run: start over from a keyframe
+        if self._key_cache[0] != self._seq:
+            self._key_cache = (self._seq, sse_frame(self._seq, make_keyframe(self._state)))
+        return self._key_cache[1]
+
+    def catch_up(self, last_id: Optional[int] = None) -> Tuple[int, bytes]:
+        """Frames a (re)connecting client needs to be current: backlog after `last_id`, else a keyframe."""
+        with self._cond:
+            self._last_wait = time.monotonic()
+            self._ensure_running()
+            return self._seq, self._frames_after(last_id)
+
+    def wait_next(self, after_seq: int, timeout: float = 5.0) -> Tuple[int, bytes]:
+        """
+        Block until there is a tick newer than `after_seq`; return (seq, every
+        frame after `after_seq`). Empty bytes on timeout.
+        """
+        with self._cond:
+            self._last_wait = time.monotonic()
+            self._ensure_running()
+            self._cond.wait_for(lambda: self._seq != after_seq, timeout)
+            return self._seq, self._frames_after(after_seq)
+
+    def latest(self) -> Optional[Dict]:
+        with self._cond:
+            return self._state
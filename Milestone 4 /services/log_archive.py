@@ -0,0 +1,229 @@
+# services/log_archive.py
+import datetime as dt
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from services.log_search import LOG_COLUMNS
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock; fine for the single-process dev server
+    fcntl = None
+
+
+class LogArchiver:
+    """
+    Retention for the `logs` table: rows older than `retain_days` (whole UTC
+    days) move to one gzip NDJSON file per day under `archive_dir` and are
+    deleted from the hot table.
+
+    A day is written first (copied + appended into a temp file, then
+    renamed, so a crash never leaves a torn archive) and recorded in
+    log_archives with its id range; only then are its rows deleted, in
+    `batch_size` transactions with a short pause between them so the
+    audit writer and readers never wait long on the lock. A re-run skips
+    rows already archived (id <= max_id) and only finishes the deletes.
+
+    Use:
+        archiver = LogArchiver(DB_PATH, ARCHIVE_DIR, retain_days=30).start()
+        archiver.run_once()           # archive now (the thread does this every `interval`)
+        rows = archiver.search(conn, q="login", date_from="2024-01-01", limit=100)
+        archiver.stop()
+    """
+    def __init__(self, db_path: str, archive_dir: str, *, retain_days: int = 30,
+                 interval: float = 3600.0, batch_size: int = 1000, pause: float = 0.05):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.retain_days = retain_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.archived = 0
+        self.deleted = 0
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+        os.makedirs(archive_dir, exist_ok=True)
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS log_archives(
+                    day TEXT PRIMARY KEY,          -- 'YYYY-MM-DD' (UTC, as logs.ts)
+                    path TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    min_id INTEGER NOT NULL,
+                    max_id INTEGER NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="log-archiver", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    def _run(self):
+        while not self._stop.wait(min(60.0, self.interval) if self.last_run is None else self.interval):
+            self.run_once()
+
+    # ---------------- archiving ----------------
+    def cutoff(self) -> str:
+        """logs.ts bound: rows strictly before this are archived."""
+        day = dt.datetime.now(dt.timezone.utc).date() - dt.timedelta(days=self.retain_days)
+        return day.strftime("%Y-%m-%d 00:00:00")
+
+    def run_once(self) -> int:
+        """Archive + delete every whole day older than the cutoff. Returns rows archived."""
+        lock = open(os.path.join(self.archive_dir, ".lock"), "w")
+        try:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0  # another worker process is on it
+            conn = self._connect()
+            try:
+                n, last_day = 0, None
+                cutoff = self.cutoff()
+                while not self._stop.is_set():
+                    row = conn.execute("SELECT ts FROM logs INDEXED BY idx_logs_ts WHERE ts < ? "
+                                       "ORDER BY ts LIMIT 1", (cutoff,)).fetchone()
+                    day = str(row["ts"])[:10] if row else None
+                    if day is None or day == last_day:
+                        break  # done (or a ts that doesn't parse as a day: leave it)
+                    n += self._archive_day(conn, day)
+                    last_day = day
+                self.last_error = None
+                return n
+            except (sqlite3.Error, OSError) as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                return 0
+            finally:
+                self.last_run = time.time()
+                conn.close()
+        finally:
+            lock.close()
+
+    def _archive_day(self, conn: sqlite3.Connection, day: str) -> int:
+        lo = day + " 00:00:00"
+        hi = (dt.date.fromisoformat(day) + dt.timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
+        prev = conn.execute("SELECT path, rows, min_id, max_id FROM log_archives WHERE day=?",
+                            (day,)).fetchone()
+        done_id = prev["max_id"] if prev else 0
+        cur = conn.execute(f"SELECT {LOG_COLUMNS} FROM logs INDEXED BY idx_logs_ts "
+                           f"WHERE ts >= ? AND ts < ? AND id > ? ORDER BY id", (lo, hi, done_id))
+        n, first = 0, None
+        r = cur.fetchone()
+        if r is not None:
+            first = r["id"]
+            path = os.path.join(self.archive_dir, f"logs-{day}.ndjson.gz")
+            tmp = path + ".part"
+            with open(tmp, "wb") as out:
+                if prev and os.path.exists(path):
+                    with open(path, "rb") as old:
+                        shutil.copyfileobj(old, out)  # gzip members concatenate
+                with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+                    while r is not None:
+                        gz.write((json.dumps(dict(r), default=str) + "\n").encode())
+                        n, done_id = n + 1, r["id"]
+                        r = cur.fetchone()
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, path)
+            with conn:
+                conn.execute("""
+                    INSERT INTO log_archives(day, path, rows, min_id, max_id) VALUES(?,?,?,?,?)
+                    ON CONFLICT(day) DO UPDATE SET
+                        rows = rows + excluded.rows, max_id = excluded.max_id,
+                        min_id = MIN(min_id, excluded.min_id), updated_at = CURRENT_TIMESTAMP
+                """, (day, path, n, first, done_id))
+            self.archived += n
+
+        # small transactions so log writers get the lock between batches
+        while not self._stop.is_set():
+            with conn:
+                cur = conn.execute("DELETE FROM logs WHERE id IN (SELECT id FROM logs INDEXED BY idx_logs_ts "
+                                   "WHERE ts >= ? AND ts < ? AND id <= ? LIMIT ?)",
+                                   (lo, hi, done_id, self.batch_size))
+            self.deleted += cur.rowcount
+            if cur.rowcount < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return n
+
+    # ---------------- search ----------------
+    def search(self, conn: sqlite3.Connection, q: str = "", level: str = "", date_from: str = "",
+               date_to: str = "", limit: int = 100, before_id: Optional[int] = None,
+               after_id: Optional[int] = None) -> List[Dict]:
+        """
+        Same filters/cursors as log_search.search_logs, over archived days
+        in [date_from, date_to]; date_from is required (an open range would
+        decompress every archive). Rows come back in walk order: newest
+        first, or oldest first with after_id. Text search is a
+        case-insensitive substring match of every term on
+        action/actor_email/meta_json.
+        """
+        if not date_from:
+            return []
+        lo, hi = date_from.replace("T", " "), (date_to or "9999").replace("T", " ")
+        forward = after_id is not None
+        sql = "SELECT path FROM log_archives WHERE day >= ? AND day <= ?"
+        params: List = [lo[:10], hi[:10]]
+        if forward:
+            sql += " AND max_id > ? ORDER BY day ASC"; params.append(after_id)
+        elif before_id is not None:
+            sql += " AND min_id < ? ORDER BY day DESC"; params.append(before_id)
+        else:
+            sql += " ORDER BY day DESC"
+        terms = [t.lower() for t in q.split()]
+        out: List[Dict] = []
+        for a in conn.execute(sql, params).fetchall():
+            if not os.path.exists(a["path"]):
+                continue
+            day_rows = {}
+            with gzip.open(a["path"], "rt") as f:
+                for line in f:
+                    r = json.loads(line)
+                    if (forward and r["id"] <= after_id) or (before_id is not None and r["id"] >= before_id):
+                        continue
+                    if (level and r["level"] != level) or not (lo <= r["ts"] <= hi):
+                        continue
+                    if terms:
+                        text = " ".join(str(r.get(c) or "") for c in ("action", "actor_email", "meta_json")).lower()
+                        if not all(t in text for t in terms):
+                            continue
+                    day_rows[r["id"]] = r  # a re-run may have archived a row twice
+            out += sorted(day_rows.values(), key=lambda r: (r["ts"], r["id"]), reverse=not forward)
+            if len(out) >= limit:
+                break
+        return out[:limit]
+
+    def stats(self) -> Dict:
+        return {"retain_days": self.retain_days, "archived": self.archived, "deleted": self.deleted,
+                "last_run": self.last_run, "last_error": self.last_error}
@@ -0,0 +1,147 @@
+# services/log_search.py
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+LOG_COLUMNS = "id, ts, level, actor_email, action, meta_json"
+
+
+def ensure_log_indexes(conn: sqlite3.Connection) -> bool:
+    """
+    Indexes for /api/logs: (level, ts), (ts), and an external-content FTS5
+    table over action/actor_email/meta_json kept in sync by triggers.
+    Returns False (indexes only) when this SQLite build lacks FTS5.
+    """
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON logs(level, ts);
+        CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(ts);
+    """)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='logs_fts'").fetchone():
+        return True
+    try:
+        conn.executescript("""
+            CREATE VIRTUAL TABLE logs_fts USING fts5(
+                action, actor_email, meta_json,
+                content='logs', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+                INSERT INTO logs_fts(rowid, action, actor_email, meta_json)
+                VALUES (new.id, new.action, new.actor_email, new.meta_json);
+            END;
+            CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+                INSERT INTO logs_fts(logs_fts, rowid, action, actor_email, meta_json)
+                VALUES ('delete', old.id, old.action, old.actor_email, old.meta_json);
+            END;
+            CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE ON logs BEGIN
+                INSERT INTO logs_fts(logs_fts, rowid, action, actor_email, meta_json)
+                VALUES ('delete', old.id, old.action, old.actor_email, old.meta_json);
+                INSERT INTO logs_fts(rowid, action, actor_email, meta_json)
+                VALUES (new.id, new.action, new.actor_email, new.meta_json);
+            END;
+            INSERT INTO logs_fts(logs_fts) VALUES ('rebuild');  -- index rows that predate it
+        """)
+    except sqlite3.OperationalError:
+        return False  # no FTS5: api_logs falls back to LIKE
+    return True
+
+
+def fts_query(q: str, prefix: bool = False) -> Optional[str]:
+    """
+    User text -> FTS5 MATCH expression. Each whitespace-separated term must
+    match as a phrase of its word tokens: 'login a@x' -> '"login" AND "a x"'.
+    prefix=True lets each phrase's last token match as a prefix
+    ('"camera_st"*'); that is much slower for short, common prefixes, so
+    search_logs() only uses it when exact tokens don't fill the first page.
+    """
+    phrases = []
+    for term in q.split():
+        tokens = re.findall(r"\w+", term)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"' + ("*" if prefix else ""))
+    return " AND ".join(phrases) or None
+
+
+def _ts_bound(s: str) -> str:
+    # <input type="datetime-local"> sends 2024-05-01T10:00; logs.ts is '2024-05-01 10:00:00'
+    return s.replace("T", " ")
+
+
+def build_logs_query(q: str = "", level: str = "", date_from: str = "", date_to: str = "",
+                     limit: int = 100, fts: bool = True, prefix: bool = False,
+                     before_id: Optional[int] = None, after_id: Optional[int] = None) -> Tuple[str, List]:
+    """
+    Pick an access path for the filters given, newest first:
+      - text search with FTS5: drive from the FTS index in rowid order and
+        stop after `limit` rows that also pass level/time filters;
+      - level (+ time range): walk idx_logs_level_ts backwards;
+      - time range only / nothing: walk idx_logs_ts backwards.
+    Without FTS5, text search falls back to LIKE over the same columns.
+
+    before_id / after_id are keyset cursors: rows strictly older / newer
+    than that log row, entered by an index seek so deep pages cost the same
+    as the first. after_id walks forwards (oldest first); the caller
+    reverses the page.
+    """
+    params: List = []
+    where: List[str] = []
+    if level:
+        where.append("l.level=?"); params.append(level)
+    if date_from:
+        where.append("l.ts>=?"); params.append(_ts_bound(date_from))
+    if date_to:
+        where.append("l.ts<=?"); params.append(_ts_bound(date_to))
+    forward = after_id is not None
+    cursor = after_id if forward else before_id
+    op, order = (">", "ASC") if forward else ("<", "DESC")
+
+    match = fts_query(q, prefix) if (q and fts) else None
+    if match:
+        if cursor is not None:
+            where.append(f"f.rowid{op}?"); params.append(cursor)
+        cols = ", ".join("l." + c.strip() for c in LOG_COLUMNS.split(","))
+        sql = (f"SELECT {cols} FROM logs_fts f JOIN logs l ON l.id=f.rowid "
+               f"WHERE f.logs_fts MATCH ?" + "".join(" AND " + w for w in where) +
+               f" ORDER BY f.rowid {order} LIMIT ?")
+        return sql, [match] + params + [limit]
+
+    if q:
+        where.append("(l.action LIKE ? OR l.meta_json LIKE ? OR l.actor_email LIKE ?)")
+        params += [f"%{q}%"] * 3
+    if cursor is not None:
+        # (ts, id) row-value seek on the index order. A cursor row no longer
+        # in the table was archived, i.e. is older than every hot row.
+        where.append(f"(l.ts, l.id){op}(IFNULL((SELECT ts FROM logs WHERE id=?), ''), ?)")
+        params += [cursor, cursor]
+    index = "idx_logs_level_ts" if level else "idx_logs_ts"
+    sql = (f"SELECT {LOG_COLUMNS} FROM logs l INDEXED BY {index}" +
+           (" WHERE " + " AND ".join(where) if where else "") +
+           f" ORDER BY l.ts {order}, l.id {order} LIMIT ?")
+    return sql, params + [limit]
+
+
+def prefix_needed(conn: sqlite3.Connection, q: str = "", level: str = "", date_from: str = "",
+                  date_to: str = "", limit: int = 100, fts: bool = True) -> bool:
+    """
+    Match mode for a text search: prefixes only when exact tokens don't fill
+    the query's first page. Decided from the first page (no cursor) so every
+    page of one query uses the same mode; deciding per page would change the
+    matching set mid-walk and skip rows.
+    """
+    if not (q and fts):
+        return False
+    sql, params = build_logs_query(q, level, date_from, date_to, limit, fts)
+    if len(conn.execute(sql, params).fetchall()) >= limit:
+        return False
+    return build_logs_query(q, level, date_from, date_to, limit, fts, prefix=True) != (sql, params)
+
+
+def search_logs(conn: sqlite3.Connection, q: str = "", level: str = "", date_from: str = "",
+                date_to: str = "", limit: int = 100, fts: bool = True,
+                before_id: Optional[int] = None, after_id: Optional[int] = None,
+                prefix: Optional[bool] = None) -> List[sqlite3.Row]:
+    """Run build_logs_query; prefix=None picks the match mode with prefix_needed()."""
+    if prefix is None:
+        prefix = prefix_needed(conn, q, level, date_from, date_to, limit, fts)
+    sql, params = build_logs_query(q, level, date_from, date_to, limit, fts, prefix,
+                                   before_id=before_id, after_id=after_id)
+    return conn.execute(sql, params).fetchall()
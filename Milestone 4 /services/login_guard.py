@@ -0,0 +1,160 @@
+# services/login_guard.py
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Dict
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashPoolBusy(Exception):
+    """Every hashing slot (running + queued) is taken, or the wait timed out."""
+
+
+def _lower_priority(nice: int):
+    # Linux applies nice per thread; elsewhere this is a no-op
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except (AttributeError, OSError):
+        pass
+
+
+class HashPool:
+    """
+    Password hashing off the request threads.
+
+    scrypt/PBKDF2 cost ~100+ ms of CPU each; run inline, a burst of logins
+    competes with the threads serving /video and SSE. Here at most
+    `workers` hashes run at once (at a lower scheduling priority), at most
+    `max_pending` more wait, and anything beyond fails fast with
+    HashPoolBusy instead of queueing without bound.
+
+    Use:
+        hashes = HashPool(workers=1, max_pending=8)
+        ok = hashes.check(row["password_hash"], pw)     # raises HashPoolBusy
+        h = hashes.generate(pw)
+        hashes.shutdown()
+    """
+    def __init__(self, workers: int = 1, max_pending: int = 8, *, nice: int = 10, timeout: float = 10.0):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash",
+                                        initializer=_lower_priority, initargs=(nice,))
+        self.rejected = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashPoolBusy()
+        try:
+            fut = self._pool.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _f: self._slots.release())
+        try:
+            return fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashPoolBusy()
+
+    def check(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+    def generate(self, password: str) -> str:
+        return self._run(generate_password_hash, password)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict:
+        return {"rejected": self.rejected}
+
+
+class _Entry:
+    __slots__ = ("tokens", "t", "fails", "locked_until")
+
+    def __init__(self, tokens: float, t: float):
+        self.tokens = tokens
+        self.t = t
+        self.fails = 0
+        self.locked_until = 0.0
+
+
+class LoginThrottle:
+    """
+    Per-key (IP, email) token buckets plus exponential back-off on failures.
+
+    Every attempt takes a token from each of its keys' buckets (`burst`
+    tokens, refilled at `rate` per second). After `free_failures`
+    consecutive failures a key is locked for base_delay * 2^(n - free - 1),
+    capped at max_delay; a success clears the count. Callers answer 429
+    with Retry-After instead of sleeping on a request thread.
+
+    Use:
+        throttle = LoginThrottle(burst=10, rate=10/60)
+        wait = throttle.hit("ip:1.2.3.4", "email:a@x")   # seconds, 0 = go ahead
+        throttle.failure("ip:1.2.3.4", "email:a@x")      # or .success(...)
+    """
+    def __init__(self, *, burst: int = 10, rate: float = 10 / 60, free_failures: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 300.0, max_keys: int = 10_000):
+        self.burst = burst
+        self.rate = rate
+        self.free_failures = free_failures
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._d: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.throttled = 0
+
+    def _entry(self, key: str, now: float) -> _Entry:
+        e = self._d.get(key)
+        if e is None:
+            e = self._d[key] = _Entry(self.burst, now)
+            while len(self._d) > self.max_keys:
+                self._d.popitem(last=False)
+        else:
+            e.tokens = min(self.burst, e.tokens + (now - e.t) * self.rate)
+            e.t = now
+            self._d.move_to_end(key)
+        return e
+
+    def hit(self, *keys: str) -> int:
+        """Take one token per key; returns 0, or seconds to wait (nothing taken)."""
+        now = time.monotonic()
+        with self._lock:
+            entries = [self._entry(k, now) for k in keys]
+            wait = 0.0
+            for e in entries:
+                wait = max(wait, e.locked_until - now, (1 - e.tokens) / self.rate if e.tokens < 1 else 0.0)
+            if wait > 0:
+                self.throttled += 1
+                return math.ceil(wait)
+            for e in entries:
+                e.tokens -= 1
+            return 0
+
+    def failure(self, *keys: str):
+        now = time.monotonic()
+        with self._lock:
+            for k in keys:
+                e = self._entry(k, now)
+                e.fails += 1
+                if e.fails > self.free_failures:
+                    e.locked_until = now + min(self.max_delay,
+                                               self.base_delay * 2 ** (e.fails - self.free_failures - 1))
+
+    def success(self, *keys: str):
+        with self._lock:
+            for k in keys:
+                e = self._d.get(k)
+                if e is not None:
+                    e.fails = 0
+                    e.locked_until = 0.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"keys": len(self._d), "throttled": self.throttled}
@@ -0,0 +1,391 @@
+# services/metrics_store.py
+import json
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services.db import BatchWriter
+
+# Rollup tiers in seconds. Tier 1 is the raw metric_samples table; coarser
+# tiers live in metric_rollups and are updated with every writer batch.
+TIERS = (1, 60, 900, 3600)
+ROLLUP_TIERS = TIERS[1:]
+TOTAL = ""           # zone key used for total_people in metric_rollups
+MAX_POINTS = 2000    # /api/history never returns (or folds) more buckets than this
+
+
+class MetricsStore:
+    """
+    Persistent time series of live snapshots in SQLite (WAL mode).
+
+    Writes: append() only enqueues; a background writer commits buffered
+    samples in one transaction every `flush_interval` seconds (or as soon as
+    `batch_size` are waiting), so the sampler never waits on fsync. The same
+    transaction folds the batch into 1 min / 15 min / 1 h rollups
+    (n, sum, min, max, last per zone).
+    Reads: query() works from any thread/process with its own connection;
+    history() serves bucketed min/max/avg/last from the coarsest tier that
+    still resolves the requested step.
+
+    Gaps: a sample carrying {"gap": reason} (source down, model warming up,
+    sampler stalled) is stored with status=reason. Gap rows never reach the
+    rollups or the count series; gaps() returns them as merged intervals.
+
+    Retention: raw samples (and so gap rows) older than `raw_retain_days`
+    are pruned by the writer, in small batches, every `prune_interval`
+    seconds; the rollups, written in the same transaction as the samples,
+    keep the long history. history()/series() use the 1 min tier for
+    windows reaching past the raw horizon. raw_retain_days=0 keeps
+    everything.
+
+    Use:
+        store = MetricsStore(DB_PATH).start_writer()   # in the process that samples
+        store.append({"timestamp": ..., "total_people": ..., "zones": {...}})
+        rows = store.query(ts_from, ts_to)              # same dict shape back
+        h = store.history(ts_from, ts_to, step=300, zone="Entrance")
+        store.stop()                                    # flushes what is buffered
+    """
+    def __init__(self, db_path: str, *, camera: str = "live",
+                 flush_interval: float = 1.0, batch_size: int = 200, max_pending: int = 100_000,
+                 raw_retain_days: int = 30, prune_interval: float = 3600.0, prune_batch: int = 5000):
+        self.db_path = db_path
+        self.camera = camera
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.raw_retain_days = raw_retain_days
+        self.prune_interval = prune_interval
+        self.prune_batch = prune_batch
+        self.pruned = 0
+        self._next_prune = 0.0
+        self._writer = BatchWriter(db_path, self._write, name="metrics-writer", flush_interval=flush_interval,
+                                   batch_size=batch_size, max_batch=batch_size * 10,
+                                   max_pending=max_pending, idle=self._housekeep)
+        self._ensure_schema()
+
+    @property
+    def written(self) -> int:
+        return self._writer.written
+
+    @property
+    def dropped(self) -> int:
+        return self._writer.dropped
+
+    # ---------------- schema ----------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # persistent on the db file
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS metric_samples (
+                    ts INTEGER NOT NULL,              -- unix seconds
+                    camera TEXT NOT NULL DEFAULT 'live',
+                    total INTEGER NOT NULL,
+                    zones_json TEXT,
+                    status TEXT                       -- NULL = counted; else gap reason
+                );
+                CREATE INDEX IF NOT EXISTS idx_metric_samples_cam_ts ON metric_samples(camera, ts);
+                CREATE TABLE IF NOT EXISTS metric_rollups (
+                    tier INTEGER NOT NULL,            -- bucket width, seconds
+                    camera TEXT NOT NULL,
+                    zone TEXT NOT NULL,               -- '' = total_people
+                    bucket INTEGER NOT NULL,          -- bucket start, unix seconds
+                    n INTEGER NOT NULL,
+                    sum REAL NOT NULL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    last REAL NOT NULL,
+                    last_ts INTEGER NOT NULL,
+                    PRIMARY KEY (tier, camera, zone, bucket)
+                ) WITHOUT ROWID;
+            """)
+            if "status" not in {r["name"] for r in conn.execute("PRAGMA table_info(metric_samples)")}:
+                conn.execute("ALTER TABLE metric_samples ADD COLUMN status TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_metric_samples_gaps "
+                         "ON metric_samples(camera, ts) WHERE status IS NOT NULL")
+            conn.commit()
+            has_rollups = conn.execute("SELECT 1 FROM metric_rollups LIMIT 1").fetchone()
+            has_samples = conn.execute("SELECT 1 FROM metric_samples LIMIT 1").fetchone()
+            if has_samples and not has_rollups:
+                self._backfill_rollups(conn)
+        finally:
+            conn.close()
+
+    def _backfill_rollups(self, conn: sqlite3.Connection, chunk: int = 50_000):
+        # one-off for samples written before rollups existed
+        last_ts, last_cam = -1, ""
+        while True:
+            rows = conn.execute(
+                "SELECT ts, camera, total, zones_json, status FROM metric_samples "
+                "WHERE (ts, camera) > (?, ?) ORDER BY ts, camera LIMIT ?",
+                (last_ts, last_cam, chunk),
+            ).fetchall()
+            if not rows:
+                return
+            with conn:
+                self._upsert_rollups(conn, [tuple(r) for r in rows])
+            last_ts, last_cam = rows[-1]["ts"], rows[-1]["camera"]
+
+    # ---------------- rollups ----------------
+    @staticmethod
+    def _upsert_rollups(conn: sqlite3.Connection, batch: List[tuple]):
+        """Fold sample rows (ts, camera, total, zones_json, status) into every rollup tier."""
+        acc: Dict[tuple, list] = {}
+        for ts, camera, total, zones_json, status in batch:
+            if status is not None:
+                continue  # gap
+            try:
+                zones = json.loads(zones_json or "{}")
+            except ValueError:
+                zones = {}
+            values = [(TOTAL, total)] + [(str(k), v) for k, v in zones.items()
+                                         if isinstance(v, (int, float))]
+            for tier in ROLLUP_TIERS:
+                bucket = ts - ts % tier
+                for zone, v in values:
+                    key = (tier, camera, zone, bucket)
+                    a = acc.get(key)
+                    if a is None:
+                        acc[key] = [1, v, v, v, v, ts]
+                    else:
+                        a[0] += 1; a[1] += v
+                        if v < a[2]: a[2] = v
+                        if v > a[3]: a[3] = v
+                        if ts >= a[5]: a[4], a[5] = v, ts
+        conn.executemany(
+            "INSERT INTO metric_rollups(tier,camera,zone,bucket,n,sum,min,max,last,last_ts) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?) "
+            "ON CONFLICT(tier,camera,zone,bucket) DO UPDATE SET "
+            "n=n+excluded.n, sum=sum+excluded.sum, "
+            "min=MIN(min,excluded.min), max=MAX(max,excluded.max), "
+            "last=CASE WHEN excluded.last_ts>=last_ts THEN excluded.last ELSE last END, "
+            "last_ts=MAX(last_ts,excluded.last_ts)",
+            [k + tuple(a) for k, a in acc.items()],
+        )
+
+    # ---------------- writer ----------------
+    def start_writer(self):
+        self._writer.start()
+        return self
+
+    def stop(self):
+        """Stop the writer after flushing everything queued."""
+        self._writer.stop()
+
+    def append(self, snap: Dict):
+        gap = snap.get("gap")
+        row = (int(snap["timestamp"]), snap.get("camera") or self.camera,
+               0 if gap else int(snap.get("total_people", 0)),
+               None if gap else json.dumps(snap.get("zones") or {}, separators=(",", ":")),
+               gap or None)
+        self._writer.put(row)
+
+    def _write(self, conn: sqlite3.Connection, batch: List[tuple]):
+        conn.executemany("INSERT INTO metric_samples(ts,camera,total,zones_json,status) VALUES(?,?,?,?,?)", batch)
+        self._upsert_rollups(conn, batch)
+
+    def raw_horizon(self) -> Optional[int]:
+        """Raw samples before this ts may have been pruned (None: kept forever). Hour-aligned."""
+        if not self.raw_retain_days:
+            return None
+        t = int(time.time()) - self.raw_retain_days * 86400
+        return t - t % ROLLUP_TIERS[-1]
+
+    def _prune(self, conn: sqlite3.Connection):
+        horizon = self.raw_horizon()
+        if horizon is None:
+            return
+        cameras = [r[0] for r in conn.execute("SELECT DISTINCT camera FROM metric_samples")]
+        for camera in cameras:
+            while not self._writer.stopping:
+                # small transactions: the next flush never waits long behind a prune
+                with conn:
+                    cur = conn.execute(
+                        "DELETE FROM metric_samples WHERE rowid IN (SELECT rowid FROM metric_samples "
+                        "WHERE camera=? AND ts<? LIMIT ?)", (camera, horizon, self.prune_batch))
+                self.pruned += cur.rowcount
+                if cur.rowcount < self.prune_batch:
+                    break
+
+    def _housekeep(self, conn: sqlite3.Connection):
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_interval
+            self._prune(conn)
+
+    # ---------------- reads ----------------
+    def query(self, ts_from: int, ts_to: Optional[int] = None, camera: Optional[str] = None) -> List[Dict]:
+        """Samples with ts_from <= ts <= ts_to, oldest first, as live-snapshot dicts."""
+        return list(self.iter_query(ts_from, ts_to, camera))
+
+    def iter_query(self, ts_from: int, ts_to: Optional[int] = None, camera: Optional[str] = None,
+                   chunk: int = 1000) -> Iterator[Dict]:
+        """Same as query() but streamed `chunk` rows at a time (constant memory)."""
+        ts_to = int(time.time()) if ts_to is None else int(ts_to)
+        conn = self._connect()
+        try:
+            cur = conn.execute(
+                "SELECT ts, total, zones_json FROM metric_samples "
+                "WHERE camera=? AND ts>=? AND ts<=? AND status IS NULL ORDER BY ts",
+                (camera or self.camera, int(ts_from), ts_to),
+            )
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    return
+                for r in rows:
+                    try:
+                        zones = json.loads(r["zones_json"] or "{}")
+                    except ValueError:
+                        zones = {}
+                    yield {"timestamp": r["ts"], "total_people": r["total"], "zones": zones}
+        finally:
+            conn.close()
+
+    def zone_names(self, ts_from: int, ts_to: Optional[int] = None, camera: Optional[str] = None) -> List[str]:
+        """Zones seen in the window, from the hourly rollup (no scan of raw samples)."""
+        ts_to = int(time.time()) if ts_to is None else int(ts_to)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT DISTINCT zone FROM metric_rollups "
+                "WHERE tier=? AND camera=? AND bucket>=? AND bucket<=? AND zone<>? ORDER BY zone",
+                (ROLLUP_TIERS[-1], camera or self.camera, int(ts_from) - int(ts_from) % ROLLUP_TIERS[-1],
+                 ts_to, TOTAL),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [r["zone"] for r in rows]
+
+    @staticmethod
+    def pick_tier(step: int) -> int:
+        """Coarsest tier whose bucket width still resolves `step` seconds."""
+        return max(t for t in TIERS if t <= max(1, step))
+
+    def history(self, ts_from: int, ts_to: Optional[int] = None, step: Optional[int] = None,
+                zone: Optional[str] = None, camera: Optional[str] = None) -> Dict:
+        """
+        Bucketed series for one zone (None = total_people).
+
+        `step` is raised to a whole multiple of the chosen tier and so that the
+        window holds at most MAX_POINTS buckets; the rows read are therefore
+        bounded by the window / tier, not by how many raw samples it spans.
+        """
+        ts_to = int(time.time()) if ts_to is None else int(ts_to)
+        ts_from = int(ts_from)
+        span = max(1, ts_to - ts_from)
+        step = max(int(step or 0), -(-span // MAX_POINTS), 1)
+        horizon = self.raw_horizon()
+        if horizon is not None and ts_from < horizon:
+            step = max(step, TIERS[1])  # raw samples there are gone
+        tier = self.pick_tier(step)
+        step -= step % tier  # buckets must align with the tier's
+        camera = camera or self.camera
+
+        conn = self._connect()
+        try:
+            if tier == 1:
+                rows = self._raw_rows(conn, camera, zone, ts_from, ts_to)
+            else:
+                rows = conn.execute(
+                    "SELECT bucket, n, sum, min, max, last, last_ts FROM metric_rollups "
+                    "WHERE tier=? AND camera=? AND zone=? AND bucket>=? AND bucket<=? ORDER BY bucket",
+                    (tier, camera, zone or TOTAL, ts_from - ts_from % tier, ts_to),
+                ).fetchall()
+        finally:
+            conn.close()
+
+        points: List[Dict] = []
+        for bucket, n, total, lo, hi, last, _last_ts in rows:
+            b = bucket - bucket % step
+            if points and points[-1]["t"] == b:
+                p = points[-1]
+                p["n"] += n; p["_sum"] += total
+                p["min"] = min(p["min"], lo); p["max"] = max(p["max"], hi)
+                p["last"] = last  # rows are ordered by bucket
+            else:
+                points.append({"t": b, "n": n, "_sum": total, "min": lo, "max": hi, "last": last})
+        for p in points:
+            p["avg"] = round(p.pop("_sum") / p["n"], 3) if p["n"] else 0
+        return {"from": ts_from, "to": ts_to, "step": step, "tier": tier,
+                "zone": zone, "camera": camera, "points": points}
+
+    def series(self, ts_from: int, ts_to: Optional[int] = None, zone: Optional[str] = None,
+               camera: Optional[str] = None, max_rows: int = 50_000) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        (t, value, tier) arrays for one zone (None = total), from the finest
+        tier that keeps the window under `max_rows` rows. Rollup tiers give
+        the bucket average.
+        """
+        ts_to = int(time.time()) if ts_to is None else int(ts_to)
+        ts_from = int(ts_from)
+        span = max(1, ts_to - ts_from)
+        tier = next((t for t in TIERS if span / t <= max_rows), TIERS[-1])
+        horizon = self.raw_horizon()
+        if tier == 1 and horizon is not None and ts_from < horizon:
+            tier = TIERS[1]  # raw samples there are gone
+        camera = camera or self.camera
+        conn = self._connect()
+        try:
+            if tier == 1:
+                rows = self._raw_rows(conn, camera, zone, ts_from, ts_to)
+                t = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+                v = np.fromiter((r[2] for r in rows), dtype=np.float64, count=len(rows))
+            else:
+                cur = conn.execute(
+                    "SELECT bucket, sum / n FROM metric_rollups "
+                    "WHERE tier=? AND camera=? AND zone=? AND bucket>=? AND bucket<=? ORDER BY bucket",
+                    (tier, camera, zone or TOTAL, ts_from - ts_from % tier, ts_to),
+                )
+                arr = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 2)
+                t, v = arr[:, 0].astype(np.int64), arr[:, 1]
+        finally:
+            conn.close()
+        return t, v, tier
+
+    @staticmethod
+    def _raw_rows(conn: sqlite3.Connection, camera: str, zone: Optional[str],
+                  ts_from: int, ts_to: int) -> List[Tuple]:
+        # 1 s tier: every sample is its own bucket of n=1
+        if zone:
+            # key lookup, not a '$."zone"' path: SQLite paths can't escape a " in the name
+            sql = ("SELECT ts, (SELECT value FROM json_each(zones_json) WHERE key=?) FROM metric_samples "
+                   "WHERE camera=? AND ts>=? AND ts<=? AND status IS NULL ORDER BY ts")
+            args = (zone, camera, ts_from, ts_to)
+        else:
+            sql = ("SELECT ts, total FROM metric_samples "
+                   "WHERE camera=? AND ts>=? AND ts<=? AND status IS NULL ORDER BY ts")
+            args = (camera, ts_from, ts_to)
+        return [(ts, 1, v, v, v, v, ts) for ts, v in conn.execute(sql, args) if v is not None]
+
+    def gaps(self, ts_from: int, ts_to: Optional[int] = None, camera: Optional[str] = None,
+             limit: int = 1000) -> List[Dict]:
+        """Gap rows in the window merged into [{from, to, reason}] (consecutive seconds, same reason)."""
+        ts_to = int(time.time()) if ts_to is None else int(ts_to)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT ts, status FROM metric_samples INDEXED BY idx_metric_samples_gaps "
+                "WHERE camera=? AND ts>=? AND ts<=? AND status IS NOT NULL ORDER BY ts",
+                (camera or self.camera, int(ts_from), ts_to),
+            )
+            out: List[Dict] = []
+            for ts, reason in rows:
+                last = out[-1] if out else None
+                if last and last["reason"] == reason and ts - last["to"] <= 1:
+                    last["to"] = ts
+                elif len(out) >= limit:
+                    break
+                else:
+                    out.append({"from": ts, "to": ts, "reason": reason})
+            return out
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        return dict(self._writer.stats(), pruned=self.pruned)
@@ -0,0 +1,418 @@
+# services/pipeline.py
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from services.detector import Detector, Track, draw_tracks, tracks_to_boxes, unique_ids_in_zone
+from services.heatmap import DecayedHeatmap
+from services.time_ring import MetricsRing
+from services.video_stream import VideoStream
+from services.zones import is_line_zone, side_of_line
+
+
+class LivePipeline:
+    """
+    Owns everything stateful about the live feed:
+      - the active source (VideoStream / still image / none)
+      - the Detector + line-crossing counters
+      - the metrics buffer + a 1 Hz sampler (optionally persisted via `on_sample`)
+      - a decayed occupancy heatmap (1 min / 15 min / 1 h)
+
+    One background loop reads frames, runs detection and publishes the latest
+    (frame, tracks). Readers (MJPEG, SSE, exports) never drive detection; they
+    only take snapshots, so any number of them see the same counts.
+
+    Use:
+        pipe = LivePipeline(Detector("yolov8n.pt"), lambda: load_zones(DB_PATH)).start()
+        pipe.start_source(0, "webcam")
+        seq, jpeg = pipe.wait_frame(after_seq=0, raw=True)
+        snap = pipe.snapshot()
+    """
+    ZONES_TTL = 1.0  # seconds a loaded zone list is reused
+    STALE_AFTER = 3.0  # seconds without a detection before samples become "stale" gaps
+    MAX_CATCHUP = 3600  # missed ticks back-filled as "stalled" gaps after a freeze
+
+    def __init__(
+        self,
+        detector: Detector,
+        zones_loader: Callable[[], List[Dict]],
+        *,
+        metrics_maxlen: int = 24*60*60,  # a day at 1 point/sec (columnar, a few MB)
+        warmup_runs: int = 2,
+        on_sample: Optional[Callable[[Dict], None]] = None,
+        sample_interval: float = 1.0,
+        camera: str = "live",
+    ):
+        self.detector = detector
+        self.warmup_runs = warmup_runs
+        self._zones_loader = zones_loader
+        self._zones: List[Dict] = []
+        self._zones_at = 0.0
+
+        self._lock = threading.Lock()
+        self._frame_cond = threading.Condition(self._lock)
+
+        # source
+        self._stream: Optional[VideoStream] = None
+        self._still_frame: Optional[np.ndarray] = None
+        self._still_tracks: Optional[List[Track]] = None
+        self.source_mode = "none"
+        self.source_path: Optional[str] = None
+
+        # line-cross state
+        self._prev_centroids: Dict[int, Tuple[int, int]] = {}
+        self._line_counts: Dict[int, int] = {}
+
+        # latest published result
+        self._seq = 0
+        self._frame: Optional[np.ndarray] = None
+        self._tracks: List[Track] = []
+        self._frame_w, self._frame_h = 640, 480
+        self._ready = False
+        self._detected_at: Optional[float] = None  # monotonic time of the last detection result
+        self._jpeg_cache: Dict[bool, Tuple[int, bytes]] = {}
+
+        self.metrics = MetricsRing(metrics_maxlen)
+        self._oneoff: Optional[Detector] = None  # image uploads (detect_image)
+        self._oneoff_lock = threading.Lock()
+        self._metrics_from: Optional[int] = None  # first sampler tick: the ring is complete after it
+        self._on_sample = on_sample
+        self.sample_interval = sample_interval
+        self.camera = camera
+        self.heatmap = DecayedHeatmap(grid=(64, 48), windows=(60, 900, 3600))
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    # ---------------- lifecycle ----------------
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self.ensure_ready()
+        self._thread = threading.Thread(target=self._loop, name="live-pipeline", daemon=True)
+        self._thread.start()
+        self._sampler = threading.Thread(target=self._sample_loop, name="metrics-sampler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.stop_source()
+        for t in (self._thread, self._sampler):
+            if t and t.is_alive():
+                t.join(timeout=1.0)
+
+    # ---------------- readiness ----------------
+    def is_ready(self) -> bool:
+        return self.detector.is_ready()
+
+    def ensure_ready(self) -> bool:
+        """True when the model is usable; otherwise make sure warm-up is running."""
+        if self.detector.is_ready():
+            return True
+        self.detector.load_async(warmup_runs=self.warmup_runs)
+        return False
+
+    def status(self) -> Dict:
+        st = self.detector.status()
+        st["source"] = self.source_mode
+        return st
+
+    # ---------------- source control ----------------
+    def start_source(self, src: Union[int, str], mode: str, path: Optional[str] = None):
+        self.start()
+        self.stop_source()
+        self.heatmap.reset()  # new scene
+        stream = VideoStream(src).start()
+        with self._lock:
+            self._stream = stream
+            self.source_mode = mode
+            self.source_path = path
+
+    def set_image(self, img: np.ndarray):
+        self.start()
+        self.stop_source()
+        self.heatmap.reset()
+        with self._lock:
+            self._still_frame = img
+            self.source_mode = "image"
+
+    def stop_source(self):
+        with self._lock:
+            stream, self._stream = self._stream, None
+            self._still_frame = None
+            self._still_tracks = None
+            self._detected_at = None
+            self.source_mode = "none"
+            self.source_path = None
+        if stream:
+            try: stream.stop()
+            except: pass
+
+    # ---------------- zones ----------------
+    def zones(self) -> List[Dict]:
+        now = time.time()
+        if now - self._zones_at > self.ZONES_TTL:
+            try:
+                self._zones = self._zones_loader()
+            except Exception:
+                pass
+            self._zones_at = now
+        return self._zones
+
+    def invalidate_zones(self):
+        self._zones_at = 0.0
+
+    # ---------------- main loop ----------------
+    def _loop(self):
+        blank = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.putText(blank, "No source. Start camera or upload video/image.",
+                    (22, 240), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255, 255, 255), 2)
+
+        while self._running:
+            with self._lock:
+                stream, still = self._stream, self._still_frame
+
+            frame, live = None, False
+            if stream:
+                try:
+                    frame = stream.read()
+                    live = True
+                except:
+                    frame = None
+            if frame is None:
+                frame = still if still is not None else blank
+
+            ready = self.ensure_ready()
+            tracks: List[Track] = []
+            if ready and (live or still is not None):
+                try:
+                    if live:
+                        tracks = self.detector.detect_and_track(frame)
+                    else:
+                        # still image: detect once, then keep publishing the result
+                        if self._still_tracks is None:
+                            self._still_tracks = self.detector.detect_and_track(frame)
+                        tracks = self._still_tracks
+                    self._update_line_counts(tracks)
+                    self._update_heatmap(frame, tracks)
+                    self._detected_at = time.monotonic()
+                except:
+                    tracks = []
+
+            self._publish(frame, tracks, ready)
+            time.sleep(0.01 if live else 0.1)
+
+    def _sample_loop(self):
+        """
+        One point per `sample_interval` on a monotonic schedule, viewers or not.
+
+        Tick k fires at mono0 + k*interval and is stamped wall0 + k*interval,
+        so timestamps are evenly spaced even if the wall clock is adjusted
+        (re-anchored only when it drifts by more than 5 s). A tick with no
+        fresh detection is still recorded, as {"gap": reason}; ticks missed
+        because the process froze are back-filled as "stalled" gaps.
+        """
+        interval = self.sample_interval
+        wall = time.time()
+        wall0 = float(int(wall) + 1)                 # first tick on a whole second
+        mono0 = time.monotonic() + (wall0 - wall)
+        k = 0
+        if self._metrics_from is None:
+            self._metrics_from = int(wall0)
+        while self._running:
+            delay = mono0 + k * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            behind = int(-delay // interval)
+            if behind:
+                for j in range(k, k + min(behind, self.MAX_CATCHUP)):
+                    self._emit(self._gap(wall0 + j * interval, "stalled"))
+                k += behind
+            ts = wall0 + k * interval
+            if abs(time.time() - ts) > 5.0:  # wall clock stepped: re-anchor
+                wall0 = float(int(time.time()))
+                mono0 = time.monotonic()
+                k, ts = 0, wall0
+            k += 1
+            try:
+                self._emit(self._sample(ts))
+            except:
+                pass
+
+    def _gap(self, ts: float, reason: str) -> Dict:
+        return {"timestamp": int(ts), "camera": self.camera, "gap": reason,
+                "total_people": 0, "zones": {}, "centers": []}
+
+    def _sample(self, ts: float) -> Dict:
+        """The latest published detection state stamped `ts`, or a gap record."""
+        if not self._ready:
+            return self._gap(ts, "warming_up")
+        if self.source_mode == "none":
+            return self._gap(ts, "no_source")
+        seen = self._detected_at
+        if seen is None or time.monotonic() - seen > self.STALE_AFTER:
+            return self._gap(ts, "stale")
+        snap = self.snapshot()
+        snap["timestamp"] = int(ts)
+        snap["camera"] = self.camera
+        return snap
+
+    def _emit(self, snap: Dict):
+        if not snap.get("gap"):
+            self.metrics.append(snap["timestamp"], snap)
+        if self._on_sample:
+            try: self._on_sample(snap)
+            except: pass
+
+    def _update_line_counts(self, tracks: List[Track]):
+        now_centroids = {}
+        for x1, y1, x2, y2, tid, conf in tracks:
+            now_centroids[tid] = (int((x1 + x2) / 2), int((y1 + y2) / 2))
+
+        for z in self.zones():
+            if not is_line_zone(z):
+                continue
+            self._line_counts.setdefault(z["id"], 0)
+            a = (int(z["points"][0]["x"]), int(z["points"][0]["y"]))
+            b = (int(z["points"][1]["x"]), int(z["points"][1]["y"]))
+            for tid, now_c in now_centroids.items():
+                prev_c = self._prev_centroids.get(tid)
+                if prev_c is None:
+                    continue
+                if side_of_line(a, b, prev_c) * side_of_line(a, b, now_c) < 0:
+                    self._line_counts[z["id"]] += 1
+        self._prev_centroids = now_centroids
+
+    def _update_heatmap(self, frame: np.ndarray, tracks: List[Track]):
+        h, w = frame.shape[:2]
+        fw, fh = max(1, w), max(1, h)
+        self.heatmap.update([((x1 + x2) / 2.0 / fw, (y1 + y2) / 2.0 / fh)
+                             for x1, y1, x2, y2, tid, conf in tracks])
+
+    def _publish(self, frame: np.ndarray, tracks: List[Track], ready: bool):
+        h, w = frame.shape[:2]
+        with self._frame_cond:
+            self._seq += 1
+            self._frame = frame
+            self._tracks = list(tracks)
+            self._frame_w, self._frame_h = w, h
+            self._ready = ready
+            self._jpeg_cache.clear()
+            self._frame_cond.notify_all()
+
+    # ---------------- readers ----------------
+    def jpeg(self, raw: bool = False) -> Tuple[int, Optional[bytes]]:
+        """
+        JPEG of the latest frame; encoded at most once per frame and variant
+        no matter how many viewers ask. raw=True skips drawing boxes.
+        """
+        with self._lock:
+            seq, frame, tracks, ready = self._seq, self._frame, self._tracks, self._ready
+            hit = self._jpeg_cache.get(raw)
+        if frame is None:
+            return seq, None
+        if hit and hit[0] == seq:
+            return hit
+
+        if not ready:
+            img = frame.copy()
+            cv2.putText(img, "Model warming up...", (22, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 215, 255), 2)
+        elif not raw and tracks:
+            img = draw_tracks(frame.copy(), tracks)
+        else:
+            img = frame
+        ok, buf = cv2.imencode(".jpg", img)
+        if not ok:
+            return seq, None
+        data = buf.tobytes()
+        with self._lock:
+            if self._seq == seq:
+                self._jpeg_cache[raw] = (seq, data)
+        return seq, data
+
+    def wait_frame(self, after_seq: int, raw: bool = False, timeout: float = 1.0) -> Tuple[int, Optional[bytes]]:
+        """Block until a frame newer than `after_seq` is published (or timeout)."""
+        with self._frame_cond:
+            self._frame_cond.wait_for(lambda: self._seq != after_seq, timeout)
+        return self.jpeg(raw)
+
+    def snapshot(self, with_boxes: bool = False) -> Dict:
+        with self._lock:
+            tracks, fw, fh, ready = self._tracks, self._frame_w, self._frame_h, self._ready
+        zones = self.zones()
+
+        per_zone = {}
+        for z in zones:
+            if len(z["points"]) >= 3:
+                per_zone[z["name"]] = unique_ids_in_zone(z["points"], tracks)
+            else:
+                per_zone[z["name"]] = self._line_counts.get(z["id"], 0)
+
+        fw, fh = max(1, fw), max(1, fh)
+        centers = []
+        for x1, y1, x2, y2, tid, conf in tracks:
+            cx = (x1 + x2) / 2.0
+            cy = (y1 + y2) / 2.0
+            centers.append({"x": float(cx)/fw, "y": float(cy)/fh})
+
+        snap = {"total_people": len(tracks), "zones": per_zone, "centers": centers, "timestamp": int(time.time())}
+        if not ready:
+            snap["status"] = "warming_up"
+        if with_boxes:
+            # normalized boxes + ids for client-side overlays (/video?raw=1)
+            snap["boxes"] = tracks_to_boxes(tracks, fw, fh)
+        return snap
+
+    def live_counts(self) -> Dict:
+        snap = self.snapshot()
+        return {"total": snap["total_people"], "per_zone": snap["zones"], "source": self.source_mode,
+                "status": snap.get("status", "ready")}
+
+    def metrics_series(self, ts_from: int, ts_to: Optional[int] = None,
+                       zone: Optional[str] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        (t, value) for one zone (None = total) at 1 s from the in-memory ring:
+        the same non-gap samples MetricsStore keeps as its raw tier, without
+        the query and up to a flush interval fresher. None when the ring
+        doesn't reach back to ts_from (sampler started later, or wrapped);
+        read the store then.
+        """
+        oldest = self.metrics.oldest_ts()
+        if self._metrics_from is None or ts_from < self._metrics_from or zone in ("timestamp", "total_people"):
+            return None
+        if self.metrics.total > self.metrics.capacity and (oldest is None or ts_from < oldest):
+            return None
+        t, v = self.metrics.columns(ts_from, ts_to, "timestamp", zone or "total_people")
+        v = v.astype(np.float64)
+        if zone:
+            keep = v >= 0  # -1: zone absent from that sample (NULL in the store)
+            t, v = t[keep], v[keep]
+        return t, v
+
+    def heatmap_png(self, window: int) -> bytes:
+        return self.heatmap.as_png(window)
+
+    def heatmap_u8(self, window: int) -> Tuple[int, int, bytes, float]:
+        return self.heatmap.as_uint8(window)
+
+    # ---------------- one-off counting (uploads) ----------------
+    def detect_image(self, img: np.ndarray) -> List[Track]:
+        """
+        Count an uploaded image on a second Detector (same model/conf, loaded
+        on first use) with a fresh tracker per image: the live detector's
+        tracker is only ever fed by the pipeline loop.
+        """
+        with self._oneoff_lock:
+            if self._oneoff is None:
+                self._oneoff = Detector(self.detector.model_path, conf=self.detector.conf)
+            self._oneoff.load()
+            self._oneoff.reset_tracker()
+            return self._oneoff.detect_and_track(img)
@@ -0,0 +1,216 @@
+# services/report_jobs.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from services.db import QueueFull
+
+
+def zone_key(zones: Optional[Iterable[str]]) -> str:
+    """Canonical zone set: sorted, comma-joined; '' means all zones. ValueError unless a list of names."""
+    if zones is None:
+        zones = []
+    if not isinstance(zones, (list, tuple, set)) or not all(isinstance(z, str) for z in zones):
+        raise ValueError("zones must be a list of zone names")
+    return ",".join(sorted({z.strip() for z in zones if z.strip()}))
+
+
+class ReportJobs:
+    """
+    Report generation off the request thread, on a bounded worker pool.
+
+    Job state lives in SQLite (report_jobs) so any web worker can answer a
+    progress poll. A submit for the same (kind, window, zone set) returns
+    either the job already running or the finished row in `reports`
+    instead of rendering the file again.
+
+    Renderers: {kind: (extension, fn)} where
+        fn(fpath, ts_from, ts_to, zones, note, progress) -> rows written
+    and progress(fraction 0..1) may be called as often as convenient.
+
+    Use:
+        jobs = ReportJobs(DB_PATH, REPORT_DIR, {"pdf": ("pdf", render_pdf)})
+        job, created = jobs.submit("pdf", ts_from, ts_to, ["Entrance"], note)
+        jobs.get(job["id"])   # {"state": queued|running|done|error, "progress": ...}
+    """
+    STALE_AFTER = 600  # seconds without a progress update -> treat as lost
+
+    def __init__(self, db_path: str, report_dir: str,
+                 renderers: Dict[str, Tuple[str, Callable]], *,
+                 max_workers: int = 2, max_pending: int = 16,
+                 on_done: Optional[Callable[[Dict], None]] = None):
+        self.db_path = db_path
+        self.report_dir = report_dir
+        self.renderers = renderers
+        self.max_pending = max_pending
+        self.on_done = on_done
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    ts_from INTEGER NOT NULL,
+                    ts_to INTEGER NOT NULL,
+                    zones TEXT NOT NULL DEFAULT '',
+                    note TEXT,
+                    state TEXT NOT NULL,          -- queued|running|done|error
+                    progress REAL NOT NULL DEFAULT 0,
+                    report_id INTEGER,
+                    error TEXT,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_report_jobs_key ON report_jobs(kind, ts_from, ts_to, zones);
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------------- submit ----------------
+    def submit(self, kind: str, ts_from: int, ts_to: int,
+               zones: Optional[Iterable[str]] = None, note: str = "") -> Tuple[Dict, bool]:
+        """(job, created). created=False when an identical job or report already exists."""
+        if kind not in self.renderers:
+            raise ValueError(f"unknown report kind: {kind}")
+        zkey = zone_key(zones)
+        now = int(time.time())
+        with self._lock:
+            conn = self._connect()
+            try:
+                existing = self._find_existing(conn, kind, ts_from, ts_to, zkey, now)
+                if existing:
+                    return existing, False
+                if self._pending >= self.max_pending:
+                    raise QueueFull(f"{self._pending} report jobs pending")
+                job_id = uuid.uuid4().hex
+                with conn:
+                    conn.execute(
+                        "INSERT INTO report_jobs(id,kind,ts_from,ts_to,zones,note,state,created_at,updated_at) "
+                        "VALUES(?,?,?,?,?,?,'queued',?,?)",
+                        (job_id, kind, ts_from, ts_to, zkey, note, now, now),
+                    )
+                self._pending += 1
+            finally:
+                conn.close()
+        self._pool.submit(self._run, job_id)
+        return self.get(job_id), True
+
+    def _find_existing(self, conn, kind, ts_from, ts_to, zkey, now) -> Optional[Dict]:
+        # 1) same job still in flight
+        row = conn.execute(
+            "SELECT * FROM report_jobs WHERE kind=? AND ts_from=? AND ts_to=? AND zones=? "
+            "AND state IN ('queued','running') AND updated_at>=? ORDER BY created_at DESC LIMIT 1",
+            (kind, ts_from, ts_to, zkey, now - self.STALE_AFTER),
+        ).fetchone()
+        if row:
+            return self._job_dict(row)
+        # 2) a finished report for the same window, generated after the window
+        #    closed (so it holds every sample), whose file is still on disk.
+        #    Same file format too: /api/export/csv records kind='csv' for its
+        #    .csv.gz streams as well.
+        ext = self.renderers[kind][0]
+        rep = conn.execute(
+            "SELECT id, path FROM reports WHERE kind=? AND ts_from=? AND ts_to=? AND IFNULL(zones,'')=? "
+            "AND path LIKE ? AND CAST(strftime('%s', created_at) AS INTEGER)>=? ORDER BY id DESC LIMIT 1",
+            (kind, ts_from, ts_to, zkey, "%." + ext, ts_to),
+        ).fetchone()
+        if rep and os.path.exists(rep["path"]):
+            return {"id": f"report-{rep['id']}", "kind": kind, "from": ts_from, "to": ts_to,
+                    "zones": zkey, "state": "done", "progress": 1.0, "report_id": rep["id"],
+                    "error": None, "cached": True}
+        return None
+
+    # ---------------- worker ----------------
+    def _run(self, job_id: str):
+        conn = self._connect()
+        try:
+            job = conn.execute("SELECT * FROM report_jobs WHERE id=?", (job_id,)).fetchone()
+            ext, render = self.renderers[job["kind"]]
+            zones = [z for z in job["zones"].split(",") if z]
+            suffix = "_" + hashlib.sha1(job["zones"].encode("utf-8")).hexdigest()[:8] if zones else ""
+            fpath = os.path.join(self.report_dir, f"crowdcount_{job['ts_from']}_{job['ts_to']}{suffix}.{ext}")
+            self._update(conn, job_id, state="running")
+
+            last = [0.0]
+            def progress(frac: float):
+                t = time.time()
+                if t - last[0] >= 0.5:  # throttle writes
+                    last[0] = t
+                    self._update(conn, job_id, progress=round(min(max(frac, 0.0), 0.99), 3))
+
+            rows = render(fpath, job["ts_from"], job["ts_to"], zones, job["note"] or "", progress)
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO reports(ts_from, ts_to, kind, path, note, zones) VALUES(?,?,?,?,?,?)",
+                    (job["ts_from"], job["ts_to"], job["kind"], fpath, job["note"], job["zones"]),
+                )
+            self._update(conn, job_id, state="done", progress=1.0, report_id=cur.lastrowid)
+            result = {"rows": rows, "path": fpath}
+        except Exception as e:
+            self._update(conn, job_id, state="error", error=str(e))
+            result = {"error": str(e)}
+        finally:
+            with self._lock:
+                self._pending -= 1
+        try:
+            if self.on_done:
+                self.on_done({**self.get(job_id), **result})
+        finally:
+            conn.close()
+
+    def _update(self, conn: sqlite3.Connection, job_id: str, **fields):
+        fields["updated_at"] = int(time.time())
+        cols = ",".join(f"{k}=?" for k in fields)
+        with conn:
+            conn.execute(f"UPDATE report_jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+    # ---------------- reads ----------------
+    def _job_dict(self, row) -> Dict:
+        state = row["state"]
+        error = row["error"]
+        if state in ("queued", "running") and row["updated_at"] < time.time() - self.STALE_AFTER:
+            state, error = "error", "job lost (worker restarted?)"
+        return {"id": row["id"], "kind": row["kind"], "from": row["ts_from"], "to": row["ts_to"],
+                "zones": row["zones"], "state": state, "progress": row["progress"],
+                "report_id": row["report_id"], "error": error, "cached": False}
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        if job_id.startswith("report-"):
+            # cached hit handed out by submit(): just the reports row
+            conn = self._connect()
+            try:
+                rep = conn.execute("SELECT id, kind, ts_from, ts_to, zones FROM reports WHERE id=?",
+                                   (int(job_id[7:]) if job_id[7:].isdigit() else -1,)).fetchone()
+            finally:
+                conn.close()
+            if not rep:
+                return None
+            return {"id": job_id, "kind": rep["kind"], "from": rep["ts_from"], "to": rep["ts_to"],
+                    "zones": rep["zones"] or "", "state": "done", "progress": 1.0,
+                    "report_id": rep["id"], "error": None, "cached": True}
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM report_jobs WHERE id=?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._job_dict(row) if row else None
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
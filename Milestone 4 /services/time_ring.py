@@ -0,0 +1,110 @@
+# services/time_ring.py
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class MetricsRing:
+    """
+    Fixed-capacity columnar ring of live snapshots: int64 timestamp, int32
+    total and one int32 column per zone (-1 = zone absent from that sample).
+    12 bytes per sample plus 4 per zone: a day at 1 Hz is ~1 MB + 0.35 MB/zone.
+
+    Timestamps are kept in order (one that goes backwards, a wall-clock
+    step, is clamped to the previous one), so a window lookup is a binary
+    search over the ring's logical order.
+
+    Use:
+        ring = MetricsRing(24*60*60)          # a day at 1 Hz
+        ring.append(snap["timestamp"], snap)
+        t, n = ring.columns(ts_from, ts_to, "timestamp", "total_people")
+    """
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self._ts = np.zeros(self.capacity, dtype=np.int64)
+        self._people = np.zeros(self.capacity, dtype=np.int32)
+        self._zones: Dict[str, np.ndarray] = {}
+        self._zone_seen: Dict[str, int] = {}  # zone -> last absolute position it had a value
+        self.total = 0  # absolute number of appends; oldest live = total - capacity
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self.total, self.capacity)
+
+    def append(self, ts: float, snap: Dict):
+        cap = self.capacity
+        zones = snap.get("zones") or {}
+        with self._lock:
+            pos = self.total
+            slot = pos % cap
+            if pos:
+                ts = max(ts, int(self._ts[(pos - 1) % cap]))
+            self._ts[slot] = int(ts)
+            self._people[slot] = int(snap.get("total_people", 0))
+            for name, v in zones.items():
+                col = self._zones.get(name)
+                if col is None:
+                    col = self._zones[name] = np.full(cap, -1, dtype=np.int32)
+                col[slot] = int(v)
+                self._zone_seen[name] = pos
+            for name in list(self._zones):
+                if name not in zones:
+                    if self._zone_seen[name] <= pos - cap:  # no live sample mentions it any more
+                        del self._zones[name], self._zone_seen[name]
+                    else:
+                        self._zones[name][slot] = -1
+            self.total = pos + 1
+
+    def _bounds(self) -> Tuple[int, int]:
+        return max(0, self.total - self.capacity), self.total
+
+    def _bisect(self, ts: float, lo: int, hi: int, right: bool) -> int:
+        # first absolute position with timestamp >= ts (> ts when right)
+        cap = self.capacity
+        while lo < hi:
+            mid = (lo + hi) // 2
+            t = self._ts[mid % cap]
+            if t < ts or (right and t == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _slice(self, arr: np.ndarray, a: int, b: int) -> np.ndarray:
+        if b <= a:
+            return arr[:0].copy()
+        sa, sb = a % self.capacity, b % self.capacity
+        if sa < sb:
+            return arr[sa:sb].copy()
+        return np.concatenate([arr[sa:], arr[:sb]])
+
+    def columns(self, ts_from: float, ts_to: Optional[float], *names: str) -> List[np.ndarray]:
+        """
+        Copies of the named columns ("timestamp", "total_people" or a zone)
+        for ts_from <= ts <= ts_to (ts_to=None: up to the newest). A zone no
+        live sample mentions comes back all -1.
+        """
+        with self._lock:
+            lo, hi = self._bounds()
+            a = self._bisect(ts_from, lo, hi, right=False)
+            b = hi if ts_to is None else self._bisect(ts_to, a, hi, right=True)
+            out = []
+            for name in names:
+                arr = {"timestamp": self._ts, "total_people": self._people}.get(name)
+                if arr is None:
+                    arr = self._zones.get(name)
+                if arr is None:
+                    out.append(np.full(max(0, b - a), -1, dtype=np.int32))
+                else:
+                    out.append(self._slice(arr, a, b))
+            return out
+
+    def oldest_ts(self) -> Optional[int]:
+        """Timestamp of the oldest live entry (None while empty)."""
+        with self._lock:
+            lo, hi = self._bounds()
+            return int(self._ts[lo % self.capacity]) if hi > lo else None
+
+    def nbytes(self) -> int:
+        return self._ts.nbytes + self._people.nbytes + sum(c.nbytes for c in self._zones.values())
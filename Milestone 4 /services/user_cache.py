@@ -0,0 +1,64 @@
+# services/user_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class UserCache:
+    """
+    Small TTL + LRU cache in front of a user-row loader.
+
+    Entries live `ttl` seconds, so a role change or deleted account made
+    anywhere (another worker process, the sqlite shell) is picked up within
+    that bound; invalidate() makes it immediate in this process. Misses
+    (unknown user) are cached too, so a stale token can't hammer the DB.
+
+    Use:
+        users = UserCache(lambda uid: load_row(uid), ttl=30, maxsize=1024)
+        row = users.get(uid)          # dict or None
+        users.invalidate(uid)         # after UPDATE users ... WHERE id=uid
+    """
+    def __init__(self, loader: Callable[[Hashable], Optional[Dict]], *,
+                 ttl: float = 30.0, maxsize: int = 1024):
+        self.loader = loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._d: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, row)
+        self._gen = 0  # bumped by invalidate(); a load that raced one isn't stored
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            ent = self._d.get(key)
+            if ent is not None and ent[0] > now:
+                self._d.move_to_end(key)
+                self.hits += 1
+                return ent[1]
+            self.misses += 1
+            gen = self._gen
+        row = self.loader(key)  # outside the lock: a slow query doesn't stall other users
+        with self._lock:
+            if gen != self._gen:
+                return row
+            self._d[key] = (now + self.ttl, row)
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+        return row
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one user (or everyone with key=None)."""
+        with self._lock:
+            self._gen += 1
+            if key is None:
+                self._d.clear()
+            else:
+                self._d.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"size": len(self._d), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
@@ -0,0 +1,358 @@
+# services/video_jobs.py
+import json
+import multiprocessing as mp
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+import cv2
+
+from services import video_segments as vs
+from services.db import QueueFull
+from services.detector import Detector, unique_ids_in_zone
+
+
+class VideoJobs:
+    """
+    Uploaded-video counting as background jobs on a dedicated detector.
+
+    The live stream's detector/tracker is never touched: jobs run one at a
+    time on a Detector built by `detector_factory` (loaded on the first
+    job), with its tracker reset per video.
+
+    Job state lives in SQLite (video_jobs), which is also the queue: the
+    process that calls start() claims queued jobs, any process can
+    submit/poll/cancel. With INFERENCE_SOCKET the web tier only submits
+    and inference_service.py does the work.
+
+    Progress (frames done/total, fps, ETA) and a partial result are written
+    every `progress_interval` seconds; cancel() is honoured within one
+    interval (immediately in the worker's own process). The result is
+    accumulated in the same pass over the frames: unique IDs overall and
+    per zone, peak occupancy and a per-second occupancy timeline; events()
+    follows a job as it goes (the NDJSON stream).
+
+    Videos of at least 2 * `min_segment_frames` frames are split into up to
+    `segments` time segments counted in a spawned process pool and
+    stitched (services/video_segments.py). That needs a picklable
+    detector_factory (functools.partial(Detector, model, conf=...)) and a
+    __main__ that is cheap to import in the children, so only
+    inference_service.py turns it on; the web process keeps segments=1.
+
+    Use:
+        jobs = VideoJobs(DB_PATH, lambda: Detector("yolov8n.pt")).start()
+        job = jobs.submit(path, zones)            # {"id", "state": "queued", ...}
+        jobs.get(job["id"])                       # progress + partial/final result
+        for ev in jobs.events(job["id"]): ...     # progress/second/result dicts until finished
+        jobs.cancel(job["id"])
+        jobs.stop()
+    """
+    STALE_AFTER = 120  # running without a progress write for this long -> lost
+
+    def __init__(self, db_path: str, detector_factory: Optional[Callable[[], Detector]] = None, *,
+                 max_pending: int = 8, progress_interval: float = 0.5, poll_interval: float = 1.0,
+                 segments: int = 1, min_segment_frames: int = 1500, overlap: int = 26,
+                 on_done: Optional[Callable[[Dict], None]] = None):
+        self.db_path = db_path
+        self.detector_factory = detector_factory
+        self.segments = segments
+        self.min_segment_frames = min_segment_frames
+        self.overlap = overlap  # frames; must exceed the tracker's max_age (12)
+        self.max_pending = max_pending
+        self.progress_interval = progress_interval
+        self.poll_interval = poll_interval
+        self.on_done = on_done
+        self._detector: Optional[Detector] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._cancelled = set()
+        self._thread: Optional[threading.Thread] = None
+        self._ensure_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS video_jobs (
+                    id TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    zones_json TEXT NOT NULL,     -- zones as of submit
+                    state TEXT NOT NULL,          -- queued|running|done|error|cancelled
+                    frames_done INTEGER NOT NULL DEFAULT 0,
+                    frames_total INTEGER,         -- from the container; may be 0/unknown
+                    fps REAL,
+                    result_json TEXT,             -- partial while running, final when done
+                    cancel INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_video_jobs_state ON video_jobs(state, created_at);
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------------- client side ----------------
+    def submit(self, path: str, zones: List[Dict]) -> Dict:
+        """Queue a video (zones as [{name, points}]); QueueFull when max_pending are waiting."""
+        now = int(time.time())
+        conn = self._connect()
+        try:
+            with conn:
+                waiting = conn.execute("SELECT COUNT(*) FROM video_jobs WHERE state='queued' "
+                                       "OR (state='running' AND updated_at>=?)", (now - self.STALE_AFTER,)).fetchone()[0]
+                if waiting >= self.max_pending:
+                    raise QueueFull(f"{waiting} video jobs pending")
+                job_id = uuid.uuid4().hex
+                conn.execute("INSERT INTO video_jobs(id,path,zones_json,state,created_at,updated_at) "
+                             "VALUES(?,?,?,'queued',?,?)", (job_id, path, json.dumps(zones), now, now))
+        finally:
+            conn.close()
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM video_jobs WHERE id=?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._job_dict(row) if row else None
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Queued jobs are cancelled at once; a running one stops at its next progress check."""
+        now = int(time.time())
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE video_jobs SET state='cancelled', cancel=1, updated_at=? "
+                             "WHERE id=? AND state='queued'", (now, job_id))
+                conn.execute("UPDATE video_jobs SET cancel=1 WHERE id=? AND state='running'", (job_id,))
+        finally:
+            conn.close()
+        self._cancelled.add(job_id)
+        return self.get(job_id)
+
+    def _job_dict(self, row) -> Dict:
+        state, error = row["state"], row["error"]
+        if state == "running" and row["updated_at"] < time.time() - self.STALE_AFTER:
+            state, error = "error", "job lost (worker restarted?)"
+        done, total, fps = row["frames_done"], row["frames_total"] or 0, row["fps"] or 0.0
+        eta = round((total - done) / fps, 1) if state == "running" and fps > 0 and total > done else None
+        return {"id": row["id"], "state": state, "cancelling": bool(row["cancel"]) and state == "running",
+                "frames_done": done, "frames_total": total or None,
+                "progress": round(min(done / total, 1.0), 3) if total else None,
+                "fps": round(fps, 2), "eta_s": eta,
+                "result": json.loads(row["result_json"]) if row["result_json"] else None,
+                "error": error}
+
+    def events(self, job_id: str, interval: float = 0.5, heartbeat: float = 10.0) -> Iterator[Dict]:
+        """
+        Follow a job until it finishes, polling its row every `interval`:
+        {"type": "progress", ...} when it changes (or every `heartbeat` s),
+        {"type": "second", "t", "avg", "max", "per_zone"} once per completed
+        second of video, in order, then {"type": "result", "state", "error",
+        "result"} (the result without the timeline already sent).
+        """
+        sent_t, last_progress, last_at = -1, None, 0.0
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            res = job["result"] or {}
+            finished = job["state"] not in ("queued", "running")
+            timeline = res.get("timeline") or []
+            # while running the newest second may still be filling up
+            for sec in (timeline if finished else timeline[:-1]):
+                if sec["t"] > sent_t:
+                    sent_t = sec["t"]
+                    yield {"type": "second", **sec}
+            progress = {"type": "progress", "state": job["state"], "cancelling": job["cancelling"],
+                        **{k: job[k] for k in ("frames_done", "frames_total", "progress", "fps", "eta_s")},
+                        **{k: res.get(k) for k in ("unique_total", "unique_per_zone", "peak")}}
+            now = time.monotonic()
+            if progress != last_progress or now - last_at >= heartbeat:
+                last_progress, last_at = progress, now
+                yield progress
+            if finished:
+                yield {"type": "result", "state": job["state"], "error": job["error"],
+                       "result": {k: v for k, v in res.items() if k != "timeline"} if res else None}
+                return
+            time.sleep(interval)
+
+    # ---------------- worker side ----------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="video-jobs", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[sqlite3.Row]:
+        now = int(time.time())
+        with conn:
+            row = conn.execute("SELECT * FROM video_jobs WHERE state='queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            cur = conn.execute("UPDATE video_jobs SET state='running', updated_at=? WHERE id=? AND state='queued'",
+                               (now, row["id"]))
+        return row if cur.rowcount else None
+
+    def _loop(self):
+        conn = self._connect()
+        try:
+            while not self._stop.is_set():
+                job = self._claim(conn)
+                if job is None:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                self._run(conn, job)
+        finally:
+            conn.close()
+
+    def _job_detector(self) -> Detector:
+        if self._detector is None:
+            self._detector = self.detector_factory()
+            self._detector.load()
+        return self._detector
+
+    def _cancel_requested(self, conn: sqlite3.Connection, job_id: str) -> bool:
+        return job_id in self._cancelled or bool(
+            conn.execute("SELECT cancel FROM video_jobs WHERE id=?", (job_id,)).fetchone()[0])
+
+    def _run(self, conn: sqlite3.Connection, job: sqlite3.Row):
+        job_id, path = job["id"], job["path"]
+        zones = json.loads(job["zones_json"])
+        state, error = "done", None
+        try:
+            cap = cv2.VideoCapture(path)
+            opened = cap.isOpened()
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0) if opened else 0
+            fps = (cap.get(cv2.CAP_PROP_FPS) if opened else 0) or 25.0  # timeline buckets
+            cap.release()
+            if not opened:
+                raise ValueError("cannot open video")
+            self._update(conn, job_id, frames_total=total)
+            n = min(self.segments, total // self.min_segment_frames)
+            t0 = time.perf_counter()
+            if n > 1:
+                parts, state = self._run_segments(conn, job_id, path, zones, fps, total, n, t0)
+            else:
+                parts, state = self._run_sequential(conn, job_id, path, zones, fps, t0)
+            if self._stop.is_set():
+                state, error = "error", "worker stopped"
+            frames = sum(p["frames"] for p in parts)
+            elapsed = time.perf_counter() - t0
+            self._update(conn, job_id, frames_done=frames, fps=frames / elapsed if elapsed > 0 else 0.0,
+                         result_json=json.dumps(self._result(path, zones, fps, parts, partial=state != "done")))
+        except Exception as e:
+            state, error = "error", str(e)
+        finally:
+            self._cancelled.discard(job_id)
+        self._update(conn, job_id, state=state, error=error)
+        if self.on_done:
+            try:
+                self.on_done(self.get(job_id))
+            except Exception:
+                pass
+
+    def _run_sequential(self, conn, job_id, path, zones, fps, t0):
+        det = self._job_detector()
+        last = [t0]
+        cancelled = [False]
+
+        def progress(st):
+            now = time.perf_counter()
+            if now - last[0] >= self.progress_interval:
+                last[0] = now
+                self._update(conn, job_id, frames_done=st["frames"], fps=st["frames"] / (now - t0),
+                             result_json=json.dumps(self._result(path, zones, fps, [st], partial=True)))
+                cancelled[0] = self._cancel_requested(conn, job_id)
+
+        part = vs.count_segment(det, path, 0, 0, None, zones, keep=0, fps=fps, progress=progress,
+                                stop=lambda: cancelled[0] or job_id in self._cancelled or self._stop.is_set())
+        return [part], ("cancelled" if part["stopped"] else "done")
+
+    def _run_segments(self, conn, job_id, path, zones, fps, total, n, t0):
+        # spawn, not fork: forking a process with live torch/OpenMP and server
+        # threads can leave a child holding a lock nobody will release
+        ctx = mp.get_context("spawn")
+        counters = ctx.Array("q", n, lock=False)
+        cancel = ctx.Event()
+        plan = vs.plan_segments(total, n, self.overlap)
+        state = "done"
+        with ProcessPoolExecutor(max_workers=n, mp_context=ctx, initializer=vs.init_worker,
+                                 initargs=(self.detector_factory, counters, cancel, vs.worker_threads(n))) as pool:
+            futs = [pool.submit(vs.run_worker, i, path, seg, zones, self.overlap, fps) for i, seg in enumerate(plan)]
+            while True:
+                finished, pending = wait(futs, timeout=self.progress_interval)
+                frames = sum(counters)
+                done_prefix = []
+                for f in futs:  # partial result: the finished segments from the start of the video
+                    if f not in finished or f.exception():
+                        break
+                    done_prefix.append(f.result())
+                self._update(conn, job_id, frames_done=frames, fps=frames / (time.perf_counter() - t0),
+                             result_json=json.dumps(self._result(path, zones, fps, done_prefix, partial=True))
+                             if done_prefix else None)
+                if not pending:
+                    break
+                if self._stop.is_set() or self._cancel_requested(conn, job_id):
+                    cancel.set()
+                    state = "cancelled"
+                    wait(futs)
+                    break
+        parts = [f.result() for f in futs]  # re-raises a segment's error
+        if any(p["stopped"] for p in parts):
+            state = "cancelled"
+            k = next(i for i, p in enumerate(parts) if p["stopped"])
+            parts = parts[:k + 1]  # later segments don't connect to a stopped one
+        return parts, state
+
+    @staticmethod
+    def _result(path: str, zones: List[Dict], fps: float, parts: List[Dict], partial: bool) -> Dict:
+        """
+        total/per_zone/tracks: the last frame processed (as the synchronous
+        endpoint returned); unique_*: distinct track IDs over the whole video;
+        peak: most people on one frame (t in video seconds) and per-zone
+        maxima; timeline: per second of video, avg/max people and zone maxima.
+        """
+        unique, per_zone, ids = vs.stitch(parts, zones)
+        peak, timeline = vs.occupancy(parts, zones, fps)
+        tracks = parts[-1]["last"] if parts else []
+        return {
+            "mode": "video",
+            "path": path,
+            "partial": partial,
+            "segments": len(parts),
+            "total": len(tracks),
+            "per_zone": {z["name"]: unique_ids_in_zone(z["points"], tracks) for z in zones},
+            "tracks": [{"id": ids.get(t[4], t[4]), "bbox": [t[0], t[1], t[2], t[3]]} for t in tracks],
+            "unique_total": len(unique),
+            "unique_per_zone": {name: len(s) for name, s in per_zone.items()},
+            "peak": peak,
+            "video_fps": round(fps, 3),
+            "timeline": timeline,
+        }
+
+    def _update(self, conn: sqlite3.Connection, job_id: str, **fields):
+        fields["updated_at"] = int(time.time())
+        cols = ",".join(f"{k}=?" for k in fields)
+        with conn:
+            conn.execute(f"UPDATE video_jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
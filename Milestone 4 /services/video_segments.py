@@ -0,0 +1,226 @@
+# services/video_segments.py
+"""
+Counting one video file as N time segments in parallel processes.
+
+Each segment seeks (CAP_PROP_POS_FRAMES) to `overlap` frames before its own
+start and runs its own Detector + tracker from there; the overlap frames
+only warm the tracker up. The previous segment processed the same frames
+as its tail, so a track present in both is paired by box overlap (IoU,
+voted over the window) and keeps the earlier segment's global ID. With
+overlap > the tracker's max_age, every track alive at the seam has been
+re-seen inside the window.
+
+The seek is not frame-accurate for every codec (H.264 lands near a
+keyframe), and two processes need not produce bit-identical boxes, so
+pairing tolerates small shifts in both; counts then match a sequential
+pass up to people the two trackers disagree on right at a seam.
+
+    plan = plan_segments(total_frames, n=4, overlap=26)
+    parts = [count_segment(det, path, *seg, zones, keep=26, fps=25) for seg in plan]   # or in a pool
+    unique, per_zone, last_ids = stitch(parts, zones)
+    peak, timeline = occupancy(parts, zones, fps=25)
+"""
+import os
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set, Tuple
+
+import cv2
+
+if TYPE_CHECKING:
+    from services.detector import Detector
+
+Segment = Tuple[int, int, Optional[int]]  # (first frame read, first frame owned, end) ; end None = EOF
+
+
+def plan_segments(total: int, n: int, overlap: int) -> List[Segment]:
+    bounds = [round(total * i / n) for i in range(n + 1)]
+    bounds[-1] = None  # last segment reads to EOF (frame counts can be estimates)
+    return [(max(0, lo - overlap), lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def count_segment(det: "Detector", path: str, start: int, own_from: int, end: Optional[int],
+                  zones: List[Dict], *, keep: int, fps: float = 25.0,
+                  progress: Optional[Callable[[Dict], None]] = None,
+                  stop: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Detect + track frames [start, end) with a fresh tracker. For owned
+    frames (>= own_from) collect the local track IDs seen, overall and per
+    zone, the peak occupancy and per-second occupancy buckets (second ->
+    [frames, sum, max, per-zone maxes], second = frame // fps); keep the
+    tracks of the warm-up frames ("head") and of the last `keep` owned
+    frames ("tail") for stitching. progress(state) runs after every owned
+    frame; stop() returning True ends the segment early.
+    """
+    # here, not at module level: the stitching helpers below don't need the
+    # YOLO stack (ultralytics) to import
+    from services.detector import ids_in_zone
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError("cannot open video")
+    det.reset_tracker()
+    st = {"frames": 0, "seen": set(), "zone_seen": {z["name"]: set() for z in zones},
+          "head": [], "tail": deque(maxlen=keep), "last": [], "stopped": False,
+          "peak": [0, None, [0] * len(zones)],  # [total, frame, per-zone maxes]
+          "seconds": {}}
+    peak, seconds = st["peak"], st["seconds"]
+    try:
+        if start:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        f = start
+        while end is None or f < end:
+            if stop and stop():
+                st["stopped"] = True
+                break
+            ok, frame = cap.read()
+            if not ok:
+                break
+            tracks = det.detect_and_track(frame)
+            if f < own_from:
+                st["head"].append(tracks)
+            else:
+                st["frames"] += 1
+                st["seen"].update(t[4] for t in tracks)
+                occ = []
+                for z in zones:
+                    ids = ids_in_zone(z["points"], tracks)
+                    st["zone_seen"][z["name"]] |= ids
+                    occ.append(len(ids))
+                n = len(tracks)
+                if n > peak[0] or peak[1] is None:
+                    peak[0], peak[1] = n, f
+                peak[2] = [max(a, b) for a, b in zip(peak[2], occ)]
+                b = seconds.get(int(f // fps))
+                if b is None:
+                    seconds[int(f // fps)] = [1, n, n, occ]
+                else:
+                    b[0] += 1; b[1] += n; b[2] = max(b[2], n)
+                    b[3] = [max(x, y) for x, y in zip(b[3], occ)]
+                st["tail"].append(tracks)
+                st["last"] = tracks
+                if progress:
+                    progress(st)
+            f += 1
+    finally:
+        cap.release()
+    st["tail"] = list(st["tail"])
+    return st
+
+
+def _iou(a, b) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def seam_pairs(tail: List[List], head: List[List], iou_thresh: float = 0.5) -> Dict[int, int]:
+    """
+    Pair local IDs across a seam: {head ID: tail ID}. The window's frames
+    are lined up from the end of `tail`; on each frame boxes are matched
+    greedily by IoU >= iou_thresh, and each head ID takes the tail ID it
+    matched on most frames (one to one, most votes first).
+    """
+    votes: Dict[Tuple[int, int], int] = {}
+    for a_tracks, b_tracks in zip(tail[-len(head):] if head else [], head):
+        cand = sorted(((_iou(a, b), b[4], a[4]) for a in a_tracks for b in b_tracks), reverse=True)
+        used_a, used_b = set(), set()
+        for iou, bid, aid in cand:
+            if iou < iou_thresh:
+                break
+            if aid in used_a or bid in used_b:
+                continue
+            used_a.add(aid); used_b.add(bid)
+            votes[(bid, aid)] = votes.get((bid, aid), 0) + 1
+    pairs: Dict[int, int] = {}
+    taken = set()
+    for (bid, aid), _n in sorted(votes.items(), key=lambda kv: -kv[1]):
+        if bid not in pairs and aid not in taken:
+            pairs[bid] = aid
+            taken.add(aid)
+    return pairs
+
+
+def stitch(parts: List[Dict], zones: List[Dict],
+           iou_thresh: float = 0.5) -> Tuple[Set[int], Dict[str, Set[int]], Dict[int, int]]:
+    """
+    Global IDs across consecutive segments. Returns (unique IDs, per-zone
+    ID sets, local->global map of the last part).
+    """
+    unique: Set[int] = set()
+    per_zone: Dict[str, Set[int]] = {z["name"]: set() for z in zones}
+    next_gid, prev_map = 1, {}
+    for i, p in enumerate(parts):
+        m: Dict[int, int] = {}
+        if i and p["head"]:
+            # same frames on both sides: prev's last owned frames, p's warm-up
+            for bid, aid in seam_pairs(parts[i - 1]["tail"], p["head"], iou_thresh).items():
+                if aid in prev_map:
+                    m[bid] = prev_map[aid]
+        for lid in sorted(p["seen"]):
+            if lid not in m:
+                m[lid], next_gid = next_gid, next_gid + 1
+        unique.update(m[lid] for lid in p["seen"])
+        for name, ids in p["zone_seen"].items():
+            per_zone.setdefault(name, set()).update(m[lid] for lid in ids)
+        prev_map = m
+    return unique, per_zone, prev_map
+
+
+def occupancy(parts: List[Dict], zones: List[Dict], fps: float) -> Tuple[Dict, List[Dict]]:
+    """
+    Peak occupancy and the per-second timeline over consecutive parts (a
+    second split across a segment boundary is merged). Returns
+    ({"total", "t", "per_zone"}, [{"t", "avg", "max", "per_zone"}, ...]).
+    """
+    names = [z["name"] for z in zones]
+    total, frame, zmax = 0, None, [0] * len(zones)
+    seconds: Dict[int, list] = {}
+    for p in parts:
+        pk = p["peak"]
+        if pk[1] is not None and (frame is None or pk[0] > total):
+            total, frame = pk[0], pk[1]
+        zmax = [max(a, b) for a, b in zip(zmax, pk[2])]
+        for sec, b in p["seconds"].items():
+            m = seconds.get(sec)
+            if m is None:
+                seconds[sec] = [b[0], b[1], b[2], list(b[3])]
+            else:
+                m[0] += b[0]; m[1] += b[1]; m[2] = max(m[2], b[2])
+                m[3] = [max(x, y) for x, y in zip(m[3], b[3])]
+    peak = {"total": total, "t": round(frame / fps, 2) if frame is not None else None,
+            "per_zone": dict(zip(names, zmax))}
+    timeline = [{"t": sec, "avg": round(b[1] / b[0], 2), "max": b[2], "per_zone": dict(zip(names, b[3]))}
+                for sec, b in sorted(seconds.items())]
+    return peak, timeline
+
+
+# ---------------- process-pool side ----------------
+_worker: Dict = {}
+
+
+def init_worker(detector_factory: Callable[[], "Detector"], counters, cancel, threads: int):
+    """ProcessPoolExecutor initializer (spawn context): one detector per process."""
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(max(1, threads))  # N processes x all cores would oversubscribe
+    except ImportError:
+        pass
+    det = detector_factory()
+    det.load()
+    _worker.update(det=det, counters=counters, cancel=cancel)
+
+
+def run_worker(i: int, path: str, seg: Segment, zones: List[Dict], keep: int, fps: float) -> Dict:
+    counters = _worker["counters"]
+
+    def progress(st):
+        counters[i] = st["frames"]
+    return count_segment(_worker["det"], path, *seg, zones, keep=keep, fps=fps, progress=progress,
+                         stop=_worker["cancel"].is_set)
+
+
+def worker_threads(n: int) -> int:
+    return max(1, (os.cpu_count() or 1) // n)
@@ -0,0 +1,61 @@
+# services/zones.py
+import json
+import sqlite3
+from typing import Dict, List
+
+
+def normalize_points(pts_raw) -> List[Dict[str, int]]:
+    """Return list of {'x':int,'y':int} from either [{'x','y'}] or [[x,y]]."""
+    out = []
+    if not isinstance(pts_raw, list):
+        return out
+    for p in pts_raw:
+        if isinstance(p, dict) and 'x' in p and 'y' in p:
+            try:
+                out.append({'x': int(p['x']), 'y': int(p['y'])})
+            except:
+                pass
+        elif isinstance(p, (list, tuple)) and len(p) >= 2:
+            try:
+                out.append({'x': int(p[0]), 'y': int(p[1])})
+            except:
+                pass
+    return out
+
+
+def zones_from_rows(rows) -> List[Dict]:
+    """rows of (id, name, points-json) -> [{id, name, points:[{x,y}]}]"""
+    zones = []
+    for r in rows:
+        try:
+            raw = json.loads(r["points"])
+        except:
+            raw = []
+        zones.append({
+            "id": r["id"],
+            "name": r["name"],
+            "points": normalize_points(raw)  # << always {x,y}
+        })
+    return zones
+
+
+def load_zones(db_path: str) -> List[Dict]:
+    """Read zones with a short-lived connection (usable outside Flask app context)."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute("SELECT id,name,points FROM zones ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    return zones_from_rows(rows)
+
+
+# for line-cross logic
+def is_line_zone(z) -> bool:
+    return isinstance(z.get("points"), list) and len(z["points"]) == 2
+
+
+def side_of_line(a, b, p) -> float:
+    (x1, y1), (x2, y2) = a, b
+    (x, y) = p
+    return (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
@@ -196,6 +196,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // NEW: live per-zone counts (from /api/live)
     let liveZoneCounts = {};   // { zoneName: number }
+    // live person boxes (normalized 0..1) — feed is requested with ?raw=1
+    let liveBoxes = [];        // [{ id, x1, y1, x2, y2 }]
 
     function resizeCanvas() {
       canvas.width = img.clientWidth;
@@ -270,10 +272,26 @@ document.addEventListener("DOMContentLoaded", () => {
       poly.forEach(pt => { ctx.beginPath(); ctx.arc(pt.x, pt.y, 3, 0, Math.PI * 2); ctx.fill(); });
     }
 
+    // ---------- person boxes + IDs (server sends clean frames) ----------
+    function drawBoxes(boxes) {
+      ctx.lineWidth = 2;
+      ctx.strokeStyle = "rgb(0,255,0)";
+      ctx.fillStyle = "rgb(0,255,0)";
+      ctx.font = "12px system-ui, -apple-system, Segoe UI, Roboto, Arial";
+      boxes.forEach(b => {
+        const x = b.x1 * canvas.width, y = b.y1 * canvas.height;
+        const w = (b.x2 - b.x1) * canvas.width, h = (b.y2 - b.y1) * canvas.height;
+        ctx.strokeRect(x, y, w, h);
+        ctx.fillText(`ID ${b.id}`, x, Math.max(10, y - 4));
+      });
+    }
+
     // ---------- REPLACED: redraw to use live counts + colors ----------
     function redraw() {
       ctx.clearRect(0,0,canvas.width,canvas.height);
 
+      drawBoxes(liveBoxes);
+
       zones.forEach(z => {
         const ptsDisp = z.points.map(scaleToDisplay);
 
@@ -516,15 +534,34 @@ document.addEventListener("DOMContentLoaded", () => {
       }
     }
 
+    // line chart: last 2 h of history (LTTB-downsampled server-side), then live points
+    const CHART_MAX_POINTS = 600;
+    let lastChartTs = 0;
+    async function bootstrapHistory(){
+      const { ok, data } = await getJSON("/api/history/lttb?points=300");
+      if (!ok || !data?.points?.length) return;
+      ensureCharts();
+      const ds = lineChart.data.datasets[0].data;
+      const hist = data.points.filter(p => !lastChartTs || p[0] < lastChartTs);
+      lineChart.data.labels.unshift(...hist.map(p => new Date(p[0] * 1000).toLocaleTimeString()));
+      ds.unshift(...hist.map(p => p[1]));
+      lastChartTs = Math.max(lastChartTs, data.points[data.points.length - 1][0]);
+      lineChart.update('none');
+    }
+    bootstrapHistory();
+
     function updateCharts(payload){
       ensureCharts();
       const t = new Date(payload.timestamp * 1000).toLocaleTimeString();
       const total = payload.total_people || 0;
 
-      lineChart.data.labels.push(t);
-      lineChart.data.datasets[0].data.push(total);
-      if (lineChart.data.labels.length > 120){ lineChart.data.labels.shift(); lineChart.data.datasets[0].data.shift(); }
-      lineChart.update('none');
+      if (payload.timestamp >= lastChartTs){
+        lastChartTs = payload.timestamp;
+        lineChart.data.labels.push(t);
+        lineChart.data.datasets[0].data.push(total);
+        if (lineChart.data.labels.length > CHART_MAX_POINTS){ lineChart.data.labels.shift(); lineChart.data.datasets[0].data.shift(); }
+        lineChart.update('none');
+      }
 
       const zonesObj = payload.zones || {};
       barChart.data.labels = Object.keys(zonesObj);
@@ -532,12 +569,28 @@ document.addEventListener("DOMContentLoaded", () => {
       barChart.update('none');
     }
 
-    // compact heat scatter
+    // accumulated heatmap (server-side, decayed) + current positions on top
     const heatCtx = heatmapEl ? heatmapEl.getContext('2d') : null;
+    const heatWindowSel = document.getElementById("heatmapWindow");
+    let heatImg = null;
+    async function refreshHeatmap(){
+      if (!heatCtx) return;
+      const win = heatWindowSel?.value || "900";
+      const im = new Image();
+      im.onload = () => { heatImg = im; };
+      im.src = `/api/heatmap?window=${encodeURIComponent(win)}&format=png&ts=${Date.now()}`;
+    }
+    if (heatCtx){ refreshHeatmap(); setInterval(refreshHeatmap, 2000); }
+    heatWindowSel?.addEventListener("change", refreshHeatmap);
+
     function drawHeatmap(centersNorm){
       if (!heatCtx || !heatmapEl) return;
-      heatCtx.fillStyle = "rgba(14,22,52,0.35)";
+      heatCtx.fillStyle = "rgb(14,22,52)";
       heatCtx.fillRect(0,0,heatmapEl.width,heatmapEl.height);
+      if (heatImg){
+        heatCtx.imageSmoothingEnabled = true;
+        heatCtx.drawImage(heatImg, 0, 0, heatmapEl.width, heatmapEl.height);
+      }
       centersNorm.forEach(pt=>{
         const x = Math.round(pt.x * heatmapEl.width);
         const y = Math.round(pt.y * heatmapEl.height);
@@ -553,6 +606,7 @@ document.addEventListener("DOMContentLoaded", () => {
     function updateStats(payload){
       if (!liveStats) return;
       const rows = [`<span class="pill">Total: <b>${payload.total_people ?? 0}</b></span>`];
+      if (payload.status === "warming_up") rows.unshift(`<span class="pill">⏳ Model warming up…</span>`);
       if (payload.zones){ for (const [k,v] of Object.entries(payload.zones)){ rows.push(`<span class="pill">${k}: <b>${v}</b></span>`); } }
       liveStats.innerHTML = rows.join(" ");
     }
@@ -564,16 +618,49 @@ document.addEventListener("DOMContentLoaded", () => {
       else alertBanner.classList.add("hidden");
     }
 
+    // ---------- live state from keyframes ("t":"k") + deltas ("t":"d") ----------
+    // EventSource resends Last-Event-ID on reconnect; the server replays missed deltas.
+    const live = { total_people: 0, zones: {}, boxes: {}, status: "ready", timestamp: 0 };
+    function applyLiveEvent(msg){
+      if (msg.t === "k"){
+        live.total_people = msg.total_people || 0;
+        live.zones = Object.assign({}, msg.zones || {});
+        live.boxes = {};
+        (msg.boxes || []).forEach(b => { live.boxes[b.id] = [b.x1, b.y1, b.x2, b.y2]; });
+        live.status = msg.status || "ready";
+      } else {
+        if ("total_people" in msg) live.total_people = msg.total_people;
+        Object.assign(live.zones, msg.zones || {});
+        (msg.zones_del || []).forEach(k => { delete live.zones[k]; });
+        Object.assign(live.boxes, msg.boxes || {});
+        (msg.boxes_del || []).forEach(id => { delete live.boxes[id]; });
+        if ("status" in msg) live.status = msg.status;
+      }
+      live.timestamp = msg.timestamp || live.timestamp;
+
+      // same shape the widgets always consumed
+      const boxes = Object.entries(live.boxes).map(([id, b]) => ({ id: Number(id), x1: b[0], y1: b[1], x2: b[2], y2: b[3] }));
+      return {
+        total_people: live.total_people,
+        zones: Object.assign({}, live.zones),
+        boxes,
+        centers: boxes.map(b => ({ x: (b.x1 + b.x2) / 2, y: (b.y1 + b.y2) / 2 })),
+        status: live.status,
+        timestamp: live.timestamp,
+      };
+    }
+
     // SSE (fallback to polling)
     function startLive(){
       if (window.EventSource){
         const es = new EventSource("/api/live");
         es.onmessage = (ev)=>{
           try{
-            const payload = JSON.parse(ev.data);
+            const payload = applyLiveEvent(JSON.parse(ev.data));
 
             // NEW: store live per-zone counts and repaint overlay
             liveZoneCounts = payload.zones || {};
+            liveBoxes = payload.boxes || [];
             if (ctx) redraw();
 
             updateCharts(payload);
@@ -611,9 +698,33 @@ document.addEventListener("DOMContentLoaded", () => {
       const mins = exportWindowSel?.value || "15";
       window.location.href = `/api/export/csv?minutes=${encodeURIComponent(mins)}`;
     });
-    exportPDFBtn?.addEventListener("click", ()=>{
+    // PDF renders on a server worker: enqueue, poll, then download
+    exportPDFBtn?.addEventListener("click", async ()=>{
       const mins = exportWindowSel?.value || "15";
-      window.location.href = `/api/export/pdf?minutes=${encodeURIComponent(mins)}`;
+      const { ok, status, data } = await postJSON("/api/reports/jobs", { kind: "pdf", minutes: mins });
+      if (!ok || !data?.job){
+        showToast(status === 429 ? "⏳ Too many reports running, try again shortly" : "❌ Export failed", 2500);
+        return;
+      }
+      let job = data.job;
+      exportPDFBtn.disabled = true;
+      try{
+        while (job.state === "queued" || job.state === "running"){
+          exportPDFBtn.textContent = `⏳ PDF ${Math.round((job.progress || 0) * 100)}%`;
+          await new Promise(r => setTimeout(r, 1000));
+          const res = await getJSON(job.status_url);
+          if (!res.ok || !res.data?.job) break;
+          job = res.data.job;
+        }
+      } finally {
+        exportPDFBtn.disabled = false;
+        exportPDFBtn.textContent = "⬇️ Export PDF";
+      }
+      if (job.state === "done" && job.download_url){
+        window.location.href = job.download_url;
+      } else {
+        showToast(`❌ PDF failed${job.error ? ": " + job.error : ""}`, 3000);
+      }
     });
   }
 
@@ -630,7 +741,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   btnStartCam?.addEventListener("click", async () => {
     const { ok, data } = await postJSON("/api/camera/start");
-    if (ok) { showToast("Camera Started ✅"); feed.src = "/video?ts=" + Date.now(); }
+    if (ok) { showToast("Camera Started ✅"); feed.src = "/video?raw=1&ts=" + Date.now(); }
     else showToast(data?.message || "Failed to start");
   });
 
@@ -646,7 +757,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const fd = new FormData(); fd.append("file", file);
     const res = await fetch("/api/upload/video", { method: "POST", credentials: "include", body: fd });
     let data={}; try { data=await res.json(); } catch(_){}
-    if (res.ok) { showToast("Video Loaded ✅"); feed.src = "/video?ts=" + Date.now(); }
+    if (res.ok) { showToast("Video Loaded ✅"); feed.src = "/video?raw=1&ts=" + Date.now(); }
     else showToast(data?.message || "Upload fail ❌");
   });
 
@@ -656,7 +767,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const fd = new FormData(); fd.append("file", file);
     const res = await fetch("/api/upload/image", { method: "POST", credentials: "include", body: fd });
     let data={}; try { data=await res.json(); } catch(_){}
-    if (res.ok) { showToast("Image Loaded 🖼✅"); feed.src = "/video?ts=" + Date.now(); }
+    if (res.ok) { showToast("Image Loaded 🖼✅"); feed.src = "/video?raw=1&ts=" + Date.now(); }
     else showToast(data?.message || "Image upload failed ❌");
   });
 
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# services/ is imported as a top-level package (python app.py runs from this folder)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
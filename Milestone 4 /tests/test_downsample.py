@@ -0,0 +1,21 @@
+# tests/test_downsample.py
+import numpy as np
+
+from services.downsample import lttb
+
+
+def test_short_series_unchanged():
+    x, y = np.arange(5), np.arange(5.0)
+    xs, ys = lttb(x, y, 10)
+    assert list(xs) == list(x) and list(ys) == list(y)
+
+
+def test_keeps_endpoints_and_spikes():
+    x = np.arange(10_000)
+    y = np.zeros(10_000)
+    y[1234], y[8765] = 50, -40
+    xs, ys = lttb(x, y, 100)
+    assert len(xs) == 100
+    assert xs[0] == 0 and xs[-1] == 9_999
+    assert 1234 in xs and 8765 in xs
+    assert np.all(np.diff(xs) > 0)
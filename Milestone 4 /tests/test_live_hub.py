@@ -0,0 +1,47 @@
+# tests/test_live_hub.py
+from services.live_hub import make_delta, make_keyframe
+
+
+def apply(state, msg):
+    """What static/script.js does with a keyframe / delta."""
+    if msg["t"] == "k":
+        return {"total_people": msg["total_people"], "zones": dict(msg["zones"]),
+                "boxes": {str(b["id"]): [b["x1"], b["y1"], b["x2"], b["y2"]] for b in msg.get("boxes", [])},
+                "status": msg.get("status", "ready")}
+    state = {**state, "zones": dict(state["zones"]), "boxes": dict(state["boxes"])}
+    if "total_people" in msg:
+        state["total_people"] = msg["total_people"]
+    state["zones"].update(msg.get("zones", {}))
+    for k in msg.get("zones_del", []):
+        state["zones"].pop(k, None)
+    state["boxes"].update(msg.get("boxes", {}))
+    for k in msg.get("boxes_del", []):
+        state["boxes"].pop(str(k), None)
+    state["status"] = msg.get("status", state["status"])
+    return state
+
+
+def snap(total, zones, boxes, status=None):
+    s = {"timestamp": 1, "total_people": total, "zones": zones, "centers": [],
+         "boxes": [{"id": i, "x1": b[0], "y1": b[1], "x2": b[2], "y2": b[3]} for i, b in boxes.items()]}
+    if status:
+        s["status"] = status
+    return s
+
+
+def test_deltas_replay_to_the_same_state():
+    frames = [
+        snap(0, {}, {}, status="warming_up"),
+        snap(2, {"Gate": 1}, {1: (0, 0, .1, .1), 2: (.5, .5, .6, .6)}),
+        snap(2, {"Gate": 1}, {1: (0, 0, .1, .1), 2: (.5, .5, .6, .7)}),
+        snap(1, {"Hall": 1}, {2: (.5, .5, .6, .7)}),
+    ]
+    state = apply(None, make_keyframe(frames[0]))
+    for prev, cur in zip(frames, frames[1:]):
+        state = apply(state, make_delta(prev, cur))
+        assert state == apply(None, make_keyframe(cur))
+
+
+def test_unchanged_tick_is_minimal():
+    s = snap(1, {"Gate": 1}, {1: (0, 0, .1, .1)})
+    assert make_delta(s, s) == {"t": "d", "timestamp": 1}
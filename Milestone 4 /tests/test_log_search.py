@@ -0,0 +1,70 @@
+# tests/test_log_search.py
+import sqlite3
+
+import pytest
+
+from services.log_search import ensure_log_indexes, prefix_needed, search_logs
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts DATETIME DEFAULT CURRENT_TIMESTAMP,
+            level TEXT NOT NULL,
+            actor_email TEXT,
+            action TEXT NOT NULL,
+            meta_json TEXT
+        )
+    """)
+    if not ensure_log_indexes(conn):
+        pytest.skip("SQLite built without FTS5")
+    # ids 3..18: "cam" (exact token) and "camera_start" (prefix only), interleaved
+    conn.execute("INSERT INTO logs(level, action, ts) VALUES ('INFO', 'boot', '2024-01-01 00:00:00')")
+    conn.execute("INSERT INTO logs(level, action, ts) VALUES ('INFO', 'boot', '2024-01-01 00:00:01')")
+    for i in range(16):
+        conn.execute("INSERT INTO logs(level, action, ts) VALUES ('INFO', ?, ?)",
+                     ("cam" if i % 2 else "camera_start", f"2024-01-01 00:01:{i:02d}"))
+    return conn
+
+
+def walk(conn, limit, **filters):
+    """All pages newest first, following before_id like a client of /api/logs."""
+    prefix = prefix_needed(conn, limit=limit, **filters)
+    ids, before = [], None
+    while True:
+        rows = search_logs(conn, limit=limit, before_id=before, prefix=prefix, **filters)
+        ids += [r["id"] for r in rows]
+        if len(rows) < limit:
+            return ids
+        before = rows[-1]["id"]
+
+
+def test_exact_mode_is_kept_on_every_page(conn):
+    # first page fills with exact "cam" hits; the short last page must not
+    # switch to prefixes and pull in camera_start rows (ids 3..17 odd)
+    assert not prefix_needed(conn, q="cam", limit=5)
+    assert walk(conn, 5, q="cam") == [18, 16, 14, 12, 10, 8, 6, 4]
+
+
+def test_auto_mode_matches_first_page_on_later_pages(conn):
+    first = search_logs(conn, q="cam", limit=5)
+    later = search_logs(conn, q="cam", limit=5, before_id=first[-1]["id"])
+    assert [r["id"] for r in later] == [8, 6, 4]
+
+
+def test_prefix_mode_is_kept_on_every_page(conn):
+    assert prefix_needed(conn, q="cam", limit=10)
+    assert walk(conn, 10, q="cam") == list(range(18, 2, -1))
+
+
+def test_index_path_keyset_forward_and_back(conn):
+    newest = search_logs(conn, limit=3)
+    assert [r["id"] for r in newest] == [18, 17, 16]
+    older = search_logs(conn, limit=3, before_id=16)
+    assert [r["id"] for r in older] == [15, 14, 13]
+    newer = search_logs(conn, limit=3, after_id=13)
+    assert [r["id"] for r in newer] == [14, 15, 16]
@@ -0,0 +1,75 @@
+# tests/test_login_guard.py
+import threading
+
+import pytest
+
+from services import login_guard
+from services.login_guard import HashPool, HashPoolBusy, LoginThrottle
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(login_guard.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_refill(clock):
+    th = LoginThrottle(burst=3, rate=1.0)
+    assert [th.hit("ip:a") for _ in range(3)] == [0, 0, 0]
+    assert th.hit("ip:a") == 1
+    clock[0] += 1.0
+    assert th.hit("ip:a") == 0
+    assert th.hit("ip:b") == 0  # keys are independent
+
+
+def test_throttled_hit_takes_no_token(clock):
+    th = LoginThrottle(burst=1, rate=0.5)
+    assert th.hit("ip:a", "email:x") == 0
+    assert th.hit("ip:a", "email:y") == 2  # ip bucket empty: email:y is not charged
+    assert th.hit("email:y") == 0
+
+
+def test_failures_back_off_exponentially(clock):
+    th = LoginThrottle(burst=100, rate=1.0, free_failures=2, base_delay=1, max_delay=5)
+    waits = []
+    for _ in range(6):
+        th.failure("email:x")
+        waits.append(th.hit("email:x"))
+    assert waits == [0, 0, 1, 2, 4, 5]
+
+
+def test_success_clears_lock(clock):
+    th = LoginThrottle(burst=100, rate=1.0, free_failures=0)
+    th.failure("email:x")
+    assert th.hit("email:x") > 0
+    th.success("email:x")
+    assert th.hit("email:x") == 0
+
+
+def test_oldest_keys_evicted(clock):
+    th = LoginThrottle(max_keys=2)
+    th.hit("a"); th.hit("b"); th.hit("c")
+    assert th.stats()["keys"] == 2
+
+
+def test_hash_pool_rejects_beyond_pending():
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+    pool = HashPool(workers=1, max_pending=0, timeout=5)
+    try:
+        t = threading.Thread(target=pool._run, args=(slow,))
+        t.start()
+        assert started.wait(5)  # the only slot is now held
+        with pytest.raises(HashPoolBusy):
+            pool.generate("pw")
+        release.set()
+        t.join()
+        assert pool.check(pool.generate("pw"), "pw")
+        assert pool.stats()["rejected"] == 1
+    finally:
+        release.set()
+        pool.shutdown()
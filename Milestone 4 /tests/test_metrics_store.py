@@ -0,0 +1,55 @@
+# tests/test_metrics_store.py
+import sqlite3
+import time
+
+from services.metrics_store import MetricsStore
+
+
+def wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_raw_retention_prunes_old_samples_keeps_rollups(tmp_path):
+    db = str(tmp_path / "m.db")
+    store = MetricsStore(db, flush_interval=0.05, raw_retain_days=1, prune_interval=0.05, prune_batch=7)
+    now = int(time.time())
+    old = now - 3 * 86400
+    old -= old % 3600
+    for i in range(120):
+        store.append({"timestamp": old + i, "total_people": 2, "zones": {"a": 1}})
+        store.append({"timestamp": now - 60 + i // 2, "total_people": 4, "zones": {"a": 3}})
+    store.start_writer()
+    try:
+        wait_for(lambda: store.written == 240 and store.pruned == 120)
+    finally:
+        store.stop()
+
+    conn = sqlite3.connect(db)
+    try:
+        assert conn.execute("SELECT MIN(ts) FROM metric_samples").fetchone()[0] >= store.raw_horizon()
+    finally:
+        conn.close()
+
+    # past the raw horizon the 1 min rollups answer instead of the (pruned) raw tier
+    h = store.history(old, old + 119, step=1)
+    assert h["tier"] == 60 and [p["n"] for p in h["points"]] == [60, 60]
+    assert all(p["avg"] == 2 for p in h["points"])
+    t, v, tier = store.series(old, old + 119, zone="a")
+    assert tier == 60 and list(v) == [1.0, 1.0]
+    # recent windows still read raw samples
+    assert store.history(now - 60, now, step=1)["tier"] == 1
+
+
+def test_zero_retention_keeps_everything(tmp_path):
+    store = MetricsStore(str(tmp_path / "m.db"), flush_interval=0.05, raw_retain_days=0, prune_interval=0.05)
+    assert store.raw_horizon() is None
+    store.append({"timestamp": 1000, "total_people": 1})
+    store.start_writer()
+    try:
+        wait_for(lambda: store.written == 1)
+    finally:
+        store.stop()
+    assert store.pruned == 0 and len(store.query(0, 2000)) == 1
@@ -0,0 +1,24 @@
+# tests/test_time_ring.py
+from services.time_ring import MetricsRing
+
+
+def test_window_across_wrap_and_zone_columns():
+    ring = MetricsRing(5)
+    for ts in range(100, 108):
+        zones = {"a": ts - 100} if ts % 2 else {}
+        ring.append(ts, {"total_people": ts - 100, "zones": zones})
+    assert len(ring) == 5 and ring.oldest_ts() == 103
+    t, n, a = ring.columns(104, 106, "timestamp", "total_people", "a")
+    assert list(t) == [104, 105, 106] and list(n) == [4, 5, 6]
+    assert list(a) == [-1, 5, -1]
+    t, missing = ring.columns(0, None, "timestamp", "nope")
+    assert list(t) == [103, 104, 105, 106, 107] and list(missing) == [-1] * 5
+
+
+def test_backwards_timestamp_is_clamped():
+    ring = MetricsRing(4)
+    ring.append(10, {"total_people": 1})
+    ring.append(8, {"total_people": 2})
+    (t,) = ring.columns(10, 10, "timestamp")
+    assert list(t) == [10, 10]
+    assert ring.columns(11, None, "timestamp")[0].size == 0
@@ -0,0 +1,65 @@
+# tests/test_user_cache.py
+import pytest
+
+from services import user_cache
+from services.user_cache import UserCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(user_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def counting_loader(rows):
+    calls = []
+
+    def load(uid):
+        calls.append(uid)
+        return rows.get(uid)
+    return load, calls
+
+
+def test_hit_miss_and_ttl(clock):
+    load, calls = counting_loader({1: {"id": 1}})
+    cache = UserCache(load, ttl=30)
+    assert cache.get(1) == {"id": 1}
+    assert cache.get(1) == {"id": 1}
+    assert cache.get(2) is None and cache.get(2) is None  # misses are cached too
+    assert calls == [1, 2]
+    clock[0] += 31
+    cache.get(1)
+    assert calls == [1, 2, 1]
+
+
+def test_invalidate(clock):
+    rows = {1: {"role": "user"}}
+    load, calls = counting_loader(rows)
+    cache = UserCache(load)
+    cache.get(1)
+    rows[1] = {"role": "admin"}
+    cache.invalidate(1)
+    assert cache.get(1) == {"role": "admin"}
+
+
+def test_load_racing_invalidate_is_not_stored(clock):
+    cache = None
+    rows = {1: {"role": "user"}}
+
+    def load(uid):
+        row = dict(rows[uid])
+        rows[uid] = {"role": "admin"}
+        cache.invalidate(uid)  # the UPDATE lands while this load is in flight
+        return row
+    cache = UserCache(load)
+    assert cache.get(1) == {"role": "user"}
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_bound(clock):
+    load, _ = counting_loader({})
+    cache = UserCache(load, maxsize=2)
+    for uid in (1, 2, 1, 3):
+        cache.get(uid)
+    assert list(cache._d) == [1, 3]
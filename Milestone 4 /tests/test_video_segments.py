@@ -0,0 +1,62 @@
+# tests/test_video_segments.py
+from services.video_segments import occupancy, plan_segments, seam_pairs, stitch
+
+ZONES = [{"name": "left", "points": [{"x": 0, "y": 0}, {"x": 100, "y": 0},
+                                      {"x": 100, "y": 500}, {"x": 0, "y": 500}]}]
+
+
+def track(x, tid, y=100):
+    return (x, y, x + 40, y + 80, tid, 0.9)
+
+
+def part(frames, own_from=0, keep=26):
+    """A count_segment() result from per-frame track lists (first own_from are warm-up)."""
+    owned = frames[own_from:]
+    seen = {t[4] for tr in owned for t in tr}
+    return {"frames": len(owned), "seen": seen,
+            "zone_seen": {"left": {t[4] for tr in owned for t in tr if t[0] + 20 < 100}},
+            "head": frames[:own_from], "tail": owned[-keep:], "last": owned[-1] if owned else [],
+            "peak": [max((len(tr) for tr in owned), default=0), 0 if owned else None, [0]],
+            "seconds": {}, "stopped": False}
+
+
+def test_plan_segments_overlap_and_eof():
+    assert plan_segments(1000, 4, 26) == [(0, 0, 250), (224, 250, 500), (474, 500, 750), (724, 750, None)]
+
+
+def test_seam_pairs_tolerates_jitter_and_offset():
+    # the same two people seen by both segments, boxes a few px apart and the
+    # head window starting two frames late (a keyframe seek that overshot)
+    tail = [[track(10 + f, 7), track(300 - f, 8)] for f in range(30)]
+    head = [[track(12 + f + 3, 1), track(298 - f - 2, 2)] for f in range(2, 28)]
+    assert seam_pairs(tail, head) == {1: 7, 2: 8}
+
+
+def test_seam_pairs_ignores_far_boxes():
+    tail = [[track(10, 7)] for _ in range(5)]
+    head = [[track(200, 1)] for _ in range(5)]
+    assert seam_pairs(tail, head) == {}
+
+
+def test_stitch_keeps_ids_across_seam():
+    # person A walks through the seam, person B only appears in part 2
+    a = part([[track(10 + f, 3)] for f in range(40)])
+    head = [[track(10 + f + 1, 5)] for f in range(14, 40)]
+    b = part(head + [[track(50 + f, 5), track(400, 6)] for f in range(20)], own_from=len(head))
+    unique, per_zone, last = stitch([a, b], ZONES)
+    assert len(unique) == 2
+    assert per_zone["left"] == {1}
+    assert last == {5: 1, 6: 2}
+
+
+def test_occupancy_merges_second_split_by_seam():
+    a = part([[track(0, 1)]])
+    a["seconds"] = {0: [10, 10, 1, [1]]}
+    a["peak"] = [1, 3, [1]]
+    b = part([[track(0, 1), track(50, 2)]])
+    b["seconds"] = {0: [15, 30, 2, [2]], 1: [25, 25, 1, [0]]}
+    b["peak"] = [2, 17, [2]]
+    peak, timeline = occupancy([a, b], ZONES, fps=25)
+    assert peak == {"total": 2, "t": 0.68, "per_zone": {"left": 2}}
+    assert timeline == [{"t": 0, "avg": 1.6, "max": 2, "per_zone": {"left": 2}},
+                        {"t": 1, "avg": 1.0, "max": 1, "per_zone": {"left": 0}}]